@@ -2,15 +2,56 @@
 ASGI config for authentification project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The HTTP requests go to Django, and the live telemetry WebSocket (real_time.websocket) is served
+by the same application, on the event loop of the ASGI server.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
+import asyncio
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "authentification.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+if settings.DEBUG:
+    # Serves the static files, as runserver does
+    django_application = ASGIStaticFilesHandler(django_application)
+
+# Imported once Django is set up, as they use the settings and the auth app
+from real_time import views, websocket
+
+# The stations are created here rather than at the first HTTP request (when the URLconf imports
+# the views), so that the WebSocket clients of every station are accepted and heard from the start
+websocket.hub.stations = set(views.stations)
+websocket.hub.on_message = views.handle_message
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        await websocket.application(scope, receive, send)
+    elif scope["type"] == "lifespan":
+        await lifespan(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
+
+
+async def lifespan(scope, receive, send):
+    """
+    Gives the event loop of the server to the telemetry hub at startup, so that the
+    broadcaster can run on it before the first client connects.
+    """
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            websocket.hub.attach(asyncio.get_running_loop())
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
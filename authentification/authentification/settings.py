@@ -81,6 +81,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "real_time.context_processors.station",
             ],
         },
     },
@@ -142,3 +143,66 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR,'static'),]
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Real-time measurement
+# Number of frames per second sent to the real-time page through the WebSocket server.
+
+REAL_TIME_BROADCAST_RATE = 60
+
+# Maximum number of captured shots waiting to be written to the database.
+
+REAL_TIME_WRITER_QUEUE = 64
+
+# Shot detection on the microphone of the sensors: amplitude threshold, minimum time between
+# two shots (seconds) and fraction of the threshold from which the rising edge is dated.
+
+REAL_TIME_TRIGGER_THRESHOLD = 1000
+REAL_TIME_TRIGGER_REFRACTORY = 10
+REAL_TIME_TRIGGER_ONSET = 0.5
+
+# Transport to the Wiiboard and the ESP32: "bluetooth" for the real devices, "simulator" for
+# synthetic devices (options: rate, sensor_rate, mass, sway, sway_frequency, noise, shot_interval,
+# seed) or "replay" to replay a capture (options: path, speed, loop). If REAL_TIME_RECORD is a
+# path, every byte received from the devices is recorded there, to be replayed later.
+
+REAL_TIME_TRANSPORT = 'bluetooth'
+REAL_TIME_TRANSPORT_OPTIONS = {}
+REAL_TIME_RECORD = None
+
+# Directory of the recordings of the raw streams: every sample of the Wiiboard and the sensors is
+# appended to memory-mapped files, one directory per user and session (None disables it), e.g.
+# BASE_DIR / 'recordings'. Nothing is ever deleted: each session preallocates about 6 MB for the
+# Wiiboard and 10 MB for the sensors, then as much again every 43 minutes of measurement, so the
+# old sessions must be removed by hand.
+
+REAL_TIME_RECORDINGS = None
+
+# File caching the address of each device and the calibration of each Wiiboard, so a reconnection
+# skips the Bluetooth inquiry and the calibration read (None keeps nothing between restarts). It is
+# only used with the "bluetooth" transport: simulated and replayed devices are never cached.
+
+REAL_TIME_DEVICE_CACHE = BASE_DIR / 'devices.json'
+
+# Stations (firing points) served at once, by ID: each one has its own Wiiboard and sensors, and
+# its pages under /station/<id>/. A station can pin its devices to their addresses ("wiiboard",
+# "sensors"), which is needed as soon as several Wiiboards are in range, give the Bluetooth name
+# of its ESP32 ("sensors_name"), and use its own "transport", "transport_options" and "record".
+# The device cache of a station other than "default" is devices-<id>.json.
+
+REAL_TIME_STATIONS = {
+    'default': {},
+}
+
+# Unix socket of the acquisition daemon (manage.py acquisition_daemon). When set, the stations run
+# in the daemon, which writes their telemetry to shared memory rings named <ring>-<station>, and
+# the Django workers only broadcast it and send it their commands. None runs the stations in the
+# Django process, which then must be a single worker.
+
+REAL_TIME_DAEMON_SOCKET = None
+REAL_TIME_DAEMON_RING = 'realtime'
+
+# Data visualisation
+# Number of decoded shots kept in memory for each user, and number of users kept.
+
+VISUALISATION_CACHE_SHOTS = 8
+VISUALISATION_CACHE_USERS = 32
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+import threading
+
+class ShotCache:
+    """
+    Bounded least-recently-used cache of decoded shots, kept separately for each user.
+
+    Each user has at most `shots_per_user` shots in the cache and at most `users` users are
+    kept, so the memory used by a worker process stays bounded whatever the number of viewers.
+
+    Attributes:
+    shots_per_user (int): Maximum number of shots kept for one user.
+    users (int): Maximum number of users kept.
+
+    Methods:
+    get(user_id, key, load): Returns the cached value of a shot, loading it on a miss.
+    """
+
+    def __init__(self, shots_per_user=8, users=32):
+        self.shots_per_user = shots_per_user
+        self.users = users
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id, key, load):
+        """
+        Returns the cached value of a shot, loading it on a miss.
+
+        Args:
+        user_id (int): ID of the user viewing the shot.
+        key (hashable): Identifies the shot for this user, for example (session_id, shot_id).
+        load (callable): Called without argument to build the value when it is not cached.
+
+        Returns:
+        object: The value returned by `load`, now or on a previous call.
+        """
+
+        with self.lock:
+            shots = self.entries.get(user_id)
+            if shots is not None and key in shots:
+                self.entries.move_to_end(user_id)
+                shots.move_to_end(key)
+                return shots[key]
+
+        value = load()
+
+        with self.lock:
+            shots = self.entries.setdefault(user_id, OrderedDict())
+            self.entries.move_to_end(user_id)
+            shots[key] = value
+            if len(shots) > self.shots_per_user:
+                shots.popitem(last=False)
+            if len(self.entries) > self.users:
+                self.entries.popitem(last=False)
+        return value
@@ -1,10 +1,11 @@
 from django.shortcuts import render
-from real_time.models import Data
+from real_time.models import Data, ShotSummary
 import json
 from django.contrib import messages
 from django.http import HttpResponse, JsonResponse, HttpResponseNotFound
 from django.db.models import Max
-from real_time.models import Data
+from django.conf import settings
+from data_visualisation.cache import ShotCache
 
 def data_visualisation(request):
     """
@@ -25,57 +26,82 @@ def data_visualisation(request):
     lastID = Data.objects.filter(user=request.user).aggregate(Max('session_id'))['session_id__max']
     return render(request,"data_visualisation/main_page.html",{'lastID': lastID})
 
-data = None
-gravity_center = []
+shot_cache = ShotCache(getattr(settings, 'VISUALISATION_CACHE_SHOTS', 8), getattr(settings, 'VISUALISATION_CACHE_USERS', 32))
 
-qua = []
-sliders_value = []
+def load_shot(user, sessionID, shotID):
+    """
+    Returns the decoded series of a shot, from the cache of the user if possible.
+
+    Parameters:
+    user (User): The user owning the shot.
+    sessionID (int): ID of the session of the shot.
+    shotID (int): ID of the shot in the session.
+
+    Returns:
+    dict: The following data of the shot:
+          - gravity_center: Array of shape (n, 2) of the gravity center.
+          - quaternion: Array of shape (n, 4) of the quaternion.
+          - sliders_value: Values of the sliders when the shot was recorded.
+
+    Raises:
+    Data.DoesNotExist: If the user has no such shot.
+    """
 
-globalData = []
+    def load():
+        data = Data.objects.get(user=user, session_id=sessionID, shot_id=shotID)
+        return {
+            'gravity_center': data.gravity_center_array(),
+            'quaternion': data.quaternion_array(),
+            'sliders_value': data.sliders_value,
+        }
 
-shotID = 0
-SessionID = 0
+    return shot_cache.get(user.pk, (sessionID, shotID), load)
+
+def get_shot_parameters(request):
+    """
+    Reads the session ID and the shot ID given in the query string of a request.
+
+    Parameters:
+    request (HttpRequest): The HTTP request received by the server.
+
+    Returns:
+    tuple: (sessionID, shotID) as integers.
+
+    Raises:
+    KeyError: If one of the parameters is missing.
+    ValueError: If one of the parameters is not an integer.
+    """
+
+    return int(request.GET['sessionID']), int(request.GET['shotID'])
 
 
 def get_visualisation(request):
     """
     Handle the data visualization request.
 
-    This function processes a POST request to retrieve visualization data
-    based on the provided session ID and shot ID. It fetches the corresponding
-    data from the Data model and prepares it for rendering the visualization page.
+    This function processes a POST request (or a GET request when the page is reloaded)
+    giving a session ID and a shot ID. It checks that the shot exists and renders the
+    visualization page, which then requests the data of this shot from the other endpoints.
     If the session ID and shot ID do not match, it displays an error message.
 
     Parameters:
     request (HttpRequest): The HTTP request received by the server.
 
     Returns:
-    HttpResponse: The HTTP response rendering the visualization page if the data
-                  is successfully retrieved or redirecting back to the main page
-                  with an error message if the session ID and shot ID do not match.
+    HttpResponse: The HTTP response rendering the visualization page with the session ID
+                  and the shot ID in its context if the shot exists, or redirecting back to
+                  the main page with an error message if the session ID and shot ID do not match.
     """
 
-    global data, gravity_center, qua, shotID, sessionID, globalData, sliders_value
-
-    if request.method == "POST" : 
-        shotID = request.POST['shotID']
-        sessionID = request.POST['sessionID']
+    parameters = request.POST if request.method == "POST" else request.GET
 
     try : 
 
-        globalData = []
-        gdata = Data.objects.filter(user=request.user, session_id= sessionID)
-        for elem in gdata : 
-            globalData.append(elem.gravity_center)
-
-        data = Data.objects.get(user=request.user, session_id=sessionID, shot_id=shotID)
-        gravity_center = data.gravity_center
+        sessionID = int(parameters['sessionID'])
+        shotID = int(parameters['shotID'])
+        load_shot(request.user, sessionID, shotID)
 
-        qua = data.quaternion
-
-        sliders_value = data.sliders_value
-
-        return render(request,"data_visualisation/visu.html")
+        return render(request,"data_visualisation/visu.html", {'sessionID': sessionID, 'shotID': shotID})
 
     except Exception as e:
         print(e)
@@ -88,9 +114,10 @@ def visu_gravityCenter(request):
     """
     Handle the request for visualizing the gravity center data.
 
-    This function processes the gravity center data and prepares it for 
-    visualization by extracting the X and Y coordinates of the gravity centers 
-    and the midpoints of the global data. It then returns this data as a JSON response.
+    This function loads the gravity center data of the shot given by the 'sessionID' and
+    'shotID' GET parameters and prepares it for visualization by extracting the X and Y
+    coordinates of the gravity centers and the trigger-instant points of the session.
+    It then returns this data as a JSON response.
 
     Parameters:
     request (HttpRequest): The HTTP request received by the server.
@@ -99,26 +126,26 @@ def visu_gravityCenter(request):
     JsonResponse: A JSON response containing the following data:
                   - X_tab: List of X coordinates of the gravity centers.
                   - Y_tab: List of Y coordinates of the gravity centers.
-                  - X_total_points: List of X coordinates of the midpoints of the global data.
-                  - Y_total_points: List of Y coordinates of the midpoints of the global data.
-                  - sessionID: The current session ID.
-                  - shotID: The current shot ID.
+                  - X_total_points: List of X coordinates of the trigger-instant points of the session.
+                  - Y_total_points: List of Y coordinates of the trigger-instant points of the session.
+                  - sessionID: The requested session ID.
+                  - shotID: The requested shot ID.
+    HttpResponseNotFound: If the parameters do not match a shot of the user.
     """
 
-    X_tab = []
-    Y_tab = []
-    X_total_points = []
-    Y_total_points = []
+    try:
+        sessionID, shotID = get_shot_parameters(request)
+        gravity_center = load_shot(request.user, sessionID, shotID)['gravity_center']
+    except (KeyError, ValueError, Data.DoesNotExist):
+        return HttpResponseNotFound("Unknown shot")
 
-    for elem in gravity_center : 
-        X_tab.append(elem[0])
-        Y_tab.append(elem[1])
+    sessionPoints = ShotSummary.objects.filter(user=request.user, session_id=sessionID).values_list('trigger_x', 'trigger_y')
 
-    LEN_globalData_DIV2 =len(globalData[0])//2 - 1
+    X_tab = gravity_center[:, 0].tolist()
+    Y_tab = gravity_center[:, 1].tolist()
 
-    for elem in globalData : 
-        X_total_points.append(elem[LEN_globalData_DIV2][0])
-        Y_total_points.append(elem[LEN_globalData_DIV2][1])
+    X_total_points = [point[0] for point in sessionPoints]
+    Y_total_points = [point[1] for point in sessionPoints]
 
     
     return JsonResponse({'X_tab': X_tab, 'Y_tab': Y_tab, 'X_total_points': X_total_points, 'Y_total_points': Y_total_points, 'sessionID': sessionID, 'shotID': shotID})
@@ -128,10 +155,10 @@ def visu_rifle(request):
     """
     Handle the request for visualizing rifle data.
 
-    This function processes the quaternion data (representing orientation) 
-    and slider values related to sensitivity. It extracts the quaternion 
-    components (q0, q1, q2, q3) and the slider values, and returns them as a 
-    JSON response.
+    This function loads the quaternion data (representing orientation) and the slider
+    values related to sensitivity of the shot given by the 'sessionID' and 'shotID' GET
+    parameters. It extracts the quaternion components (q0, q1, q2, q3) and the slider
+    values, and returns them as a JSON response.
 
     Parameters:
     request (HttpRequest): The HTTP request received by the server.
@@ -144,19 +171,22 @@ def visu_rifle(request):
                   - q3: List of q3 components from the quaternion data.
                   - sliderSensitivityStabilityValue: Value of the first slider related to sensitivity.
                   - sliderSensitivityValue: Value of the second slider related to sensitivity.
+    HttpResponseNotFound: If the parameters do not match a shot of the user.
     """
-    
-    q0 = []
-    q1 = []
-    q2 = []
-    q3 = []
 
-    for elem in qua : 
+    try:
+        sessionID, shotID = get_shot_parameters(request)
+        shot = load_shot(request.user, sessionID, shotID)
+    except (KeyError, ValueError, Data.DoesNotExist):
+        return HttpResponseNotFound("Unknown shot")
 
-        q0.append(elem[0])
-        q1.append(elem[1])
-        q2.append(elem[2])
-        q3.append(elem[3])
+    qua = shot['quaternion']
+    sliders_value = shot['sliders_value']
+
+    q0 = qua[:, 0].tolist()
+    q1 = qua[:, 1].tolist()
+    q2 = qua[:, 2].tolist()
+    q3 = qua[:, 3].tolist()
 
     return JsonResponse({'q0':q0, 'q1': q1, 'q2': q2, 'q3': q3, 'sliderSensitivityStabilityValue': sliders_value[0], 'sliderSensitivityValue': sliders_value[1]})
        
@@ -164,27 +194,32 @@ def addTail(request):
     """
     Handle the request to add tail coordinates.
 
-    This function retrieves coordinates from the globalData based on the index 
-    provided in the request GET parameters. It extracts X and Y coordinates 
-    from the specified index of globalData and returns them as a JSON response.
+    This function loads the shot at the index provided in the request GET parameters
+    among the shots of the session (latest shot first). It extracts X and Y coordinates 
+    from its gravity center and returns them as a JSON response.
 
     Parameters:
     request (HttpRequest): The HTTP request received by the server. It should 
-                           contain a 'ind' parameter in the GET request to specify 
-                           the index of globalData to retrieve coordinates from.
+                           contain a 'sessionID' parameter and a 'ind' parameter in the
+                           GET request to specify the index of the shot in the session
+                           to retrieve coordinates from.
 
     Returns:
     JsonResponse: A JSON response containing the following data:
-                  - X_tail: List of X coordinates from the specified index of globalData.
-                  - Y_tail: List of Y coordinates from the specified index of globalData.
+                  - X_tail: List of X coordinates of the gravity center of the specified shot.
+                  - Y_tail: List of Y coordinates of the gravity center of the specified shot.
+    HttpResponseNotFound: If the parameters do not match a shot of the user.
     """
     
-    X_tail = []
-    Y_tail = []
-    ind = int(request.GET.get('ind'))
-
-    for coordinates in globalData[ind]:
-        X_tail.append(coordinates[0])
-        Y_tail.append(coordinates[1])
-
-    return JsonResponse({'X_tail' : X_tail, 'Y_tail': Y_tail})
\ No newline at end of file
+    try:
+        sessionID = int(request.GET['sessionID'])
+        ind = int(request.GET['ind'])
+        shotID = ShotSummary.objects.filter(user=request.user, session_id=sessionID).values_list('shot_id', flat=True)[ind]
+        tail = load_shot(request.user, sessionID, shotID)['gravity_center']
+    except (KeyError, ValueError, IndexError, AssertionError, Data.DoesNotExist):
+        return HttpResponseNotFound("Unknown shot")
+
+    X_tail = tail[:, 0].tolist()
+    Y_tail = tail[:, 1].tolist()
+
+    return JsonResponse({'X_tail' : X_tail, 'Y_tail': Y_tail})
@@ -0,0 +1,13 @@
+from real_time import websocket
+
+def station(request):
+    """
+    Adds to the context of the templates the station of the page (from the station_id of its URL,
+    the default station otherwise) and the IDs of every station.
+    """
+
+    from real_time import views
+
+    match = request.resolver_match
+    station_id = match.kwargs.get('station_id', websocket.DEFAULT_STATION) if match is not None else websocket.DEFAULT_STATION
+    return {'station': station_id, 'stations': sorted(views.stations)}
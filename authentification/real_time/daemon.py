@@ -0,0 +1,390 @@
+"""
+Acquisition daemon: the stations run in their own process, apart from the Django workers.
+
+The daemon (manage.py acquisition_daemon) reads the devices, detects the shots and captures
+them, so the load of the web server never delays a sample, and a worker can be recycled
+without stopping a measurement. It writes the telemetry rows of each station to a shared
+memory ring (see SharedRing), read by every worker to broadcast them to its own WebSocket
+clients, and it takes the commands of the workers (connect, start, stop...) as JSON lines on a
+local Unix socket.
+
+When REAL_TIME_DAEMON_SOCKET is set, the views use a RemoteStation for each station, with the
+same methods as a Station, instead of running the stations in the Django process.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from real_time.scripts.broadcaster import Broadcaster
+from real_time.scripts.sharedRing import SharedRing, ring_name
+from real_time.scripts.telemetry import SAMPLE_FIELDS
+from real_time.station import reference_values
+from real_time import websocket
+
+# Rows kept in the ring of a station: about 20 seconds of the two devices at 100 Hz
+RING_CAPACITY = 4096
+# Publications of the state of the stations per second
+PUBLISH_RATE = 100
+# Time after which the ring of a station is opened again, if the daemon was restarted, in seconds
+RING_TIMEOUT = 2
+
+class DaemonError(Exception):
+    """
+    Error of a command of the acquisition daemon, or daemon not running.
+    """
+
+class DaemonClient:
+    """
+    Sends commands to the acquisition daemon, one connection per command.
+
+    Attributes:
+    path (str): Path of the Unix socket of the daemon.
+    timeout (float): Maximum time to wait for an answer, in seconds.
+
+    Methods:
+    request(command, **arguments): Sends a command and returns the answer.
+    """
+
+    def __init__(self, path, timeout=5):
+        self.path = str(path)
+        self.timeout = timeout
+
+    def request(self, command, **arguments):
+        """
+        Sends a command and returns the answer.
+
+        Args:
+        command (str): Name of the command (see AcquisitionDaemon.COMMANDS).
+        **arguments: Arguments of the command.
+
+        Returns:
+        dict: The answer of the daemon.
+
+        Raises:
+        DaemonError: If the daemon is not running or the command failed.
+        """
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.settimeout(self.timeout)
+                connection.connect(self.path)
+                connection.sendall(json.dumps(dict(arguments, command=command)).encode() + b"\n")
+                line = connection.makefile('rb').readline()
+        except OSError as e:
+            raise DaemonError("The acquisition daemon is not running (%s)" % e)
+        if not line:
+            raise DaemonError("The acquisition daemon closed the connection")
+        answer = json.loads(line)
+        if 'error' in answer:
+            raise DaemonError(answer['error'])
+        return answer
+
+class RemoteStation:
+    """
+    A station run by the acquisition daemon, seen from a Django worker.
+
+    The commands are sent to the daemon, and the broadcaster of the worker sends the rows of
+    the ring of the station to the WebSocket clients of the worker.
+
+    Attributes:
+    id (str): ID of the station.
+    client (DaemonClient): Client of the daemon.
+    ring_name (str): Name of the shared memory ring of the station.
+    ring (SharedRing or None): The ring, once opened.
+    cursor (int): Count of the ring up to which the rows were broadcast.
+    lost (int): Number of rows overwritten in the ring before being broadcast.
+    epoch (float): Monotonic time subtracted from the sample timestamps.
+    broadcaster (Broadcaster): Sends the frames of the station to the clients of this worker.
+    """
+
+    def __init__(self, station_id, client, prefix, broadcast_rate=60):
+        self.id = station_id
+        self.client = client
+        self.ring_name = ring_name(prefix, station_id)
+        self.ring = None
+        self.opened = 0
+        self.cursor = 0
+        self.lost = 0
+        self.epoch = time.monotonic()
+        self.shot = None
+        self.last_stale = 0
+        self.broadcaster = Broadcaster(self.send_to_all_clients, self.update_Measure, rate=broadcast_rate)
+
+    def __repr__(self):
+        return "<RemoteStation %s>" % self.id
+
+    def group(self):
+        return websocket.station_group(self.id)
+
+    def request(self, command, **arguments):
+        return self.client.request(command, station=self.id, **arguments)
+
+    def connect(self, wiiboard_wanted, sensors_wanted):
+        return self.request('connect', wiiboard=wiiboard_wanted, sensors=sensors_wanted)['job']
+
+    def job_status(self, number):
+        return self.request('job', job=number)['status']
+
+    def connected(self):
+        return self.request('status')['connected']
+
+    def status(self):
+        return self.request('status')
+
+    def link_stats(self):
+        return self.request('links')
+
+    def writer_stats(self):
+        return self.request('writer')
+
+    def start_session(self, user):
+        self.request('start', user=user.pk)
+        self.start_broadcaster()
+
+    def start_measure(self, user):
+        self.request('measure', user=user.pk)
+        self.start_broadcaster()
+
+    def stop(self):
+        self.request('stop')
+        self.broadcaster.stop()
+
+    def start_broadcast_loop(self, loop):
+        if not self.broadcaster.is_running():
+            self.broadcaster.start(loop)
+
+    def start_broadcaster(self):
+        websocket.hub.when_ready(self.start_broadcast_loop)
+
+    def handle_message(self, connection, latest_value):
+        """
+        Sends the reference values of a client to the daemon, from a thread of the event loop
+        of the ASGI server so that the loop does not wait for the daemon. Invalid messages are
+        ignored here, and the daemon only applies the values of the user measuring (see
+        Station.set_references).
+        """
+
+        if reference_values(latest_value) is None:
+            return
+
+        def send():
+            try:
+                self.request('reference', user=connection.user_id, message=latest_value)
+            except DaemonError as e:
+                print("Reference values of station %s not sent:" % self.id, e)
+
+        asyncio.get_running_loop().run_in_executor(None, send)
+
+    async def send_to_all_clients(self, data):
+        await websocket.hub.send(self.group(), data)
+
+    def open_ring(self):
+        """
+        Returns the ring of the station, opened again if the daemon stopped publishing to it.
+
+        Returns:
+        SharedRing or None: The ring, None if the daemon did not create it.
+        """
+
+        now = time.monotonic()
+        if self.ring is not None:
+            age = self.ring.state()['age']
+            if age is None or age < RING_TIMEOUT or now - self.opened < RING_TIMEOUT:
+                return self.ring
+            # The daemon stopped or was restarted with a new ring
+            self.ring.close()
+            self.ring = None
+        elif now - self.opened < RING_TIMEOUT:
+            return None
+        self.opened = now
+        try:
+            self.ring = SharedRing.attach(self.ring_name)
+        except (FileNotFoundError, ValueError):
+            return None
+        self.cursor = self.ring.count()
+        self.shot = None
+        return self.ring
+
+    def update_Measure(self):
+        """
+        Builds the next frame sent to the clients of the station, from the rows of its ring.
+
+        Returns:
+        dict or None: Same frame as Station.update_Measure, CoG being set when the shot number
+                      changed, or None if nothing changed since the last frame.
+        """
+
+        ring = self.open_ring()
+        if ring is None:
+            return None
+        samples, self.cursor, lost = ring.since(self.cursor)
+        self.lost += lost
+        state = ring.state()
+        CoG = 1 if self.shot is not None and state['shot'] != self.shot else 0
+        self.shot = state['shot']
+        if not len(samples) and not CoG and state['stale'] == self.last_stale:
+            return None
+        self.last_stale = state['stale']
+
+        samples[:, 0] -= self.epoch
+        return {
+            'samples': samples,
+            'CoG': CoG,
+            'stale': state['stale'],
+            'sessionID': state['session'],
+            'shotID': state['shot'],
+        }
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            command = json.loads(line)
+            answer = self.server.acquisition.execute(command)
+        except Exception as e:
+            answer = {'error': str(e)}
+        self.wfile.write(json.dumps(answer).encode() + b"\n")
+
+class CommandServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class AcquisitionDaemon:
+    """
+    Runs the stations and serves the commands of the Django workers.
+
+    Attributes:
+    stations (dict): The stations, by ID (see station.create_stations).
+    path (str): Path of the Unix socket of the commands.
+    rings (dict): Shared memory ring of each station, by ID.
+    running (bool): False once the daemon is asked to stop.
+
+    Methods:
+    execute(command): Runs a command and returns its answer.
+    serve(): Serves the commands until stop() is called.
+    stop(): Stops serving.
+    close(): Stops the stations, disconnects their devices and removes the rings and the socket.
+    """
+
+    COMMANDS = ('stations', 'status', 'connect', 'job', 'start', 'measure', 'stop', 'links', 'writer', 'reference')
+
+    def __init__(self, stations, path, prefix, capacity=RING_CAPACITY):
+        self.stations = stations
+        self.path = str(path)
+        self.rings = {}
+        for station_id, station in stations.items():
+            self.rings[station_id] = SharedRing.create(ring_name(prefix, station_id), capacity, len(SAMPLE_FIELDS))
+            station.ring = self.rings[station_id]
+        self.running = True
+        self.server = None
+        self.publisher = threading.Thread(target=self.publish, name="ring-publisher", daemon=True)
+
+    def publish(self):
+        """
+        Publishes the state of every station to its ring, PUBLISH_RATE times per second.
+        """
+
+        while self.running:
+            for station_id, station in self.stations.items():
+                self.rings[station_id].publish(station.session_id, station.shot_id, station.stale_flags())
+            time.sleep(1.0 / PUBLISH_RATE)
+
+    def station(self, command):
+        station = self.stations.get(command.get('station'))
+        if station is None:
+            raise DaemonError("Unknown station %r" % command.get('station'))
+        return station
+
+    def user(self, command):
+        close_old_connections()
+        return get_user_model().objects.get(pk=command['user'])
+
+    def execute(self, command):
+        """
+        Runs a command and returns its answer.
+
+        Args:
+        command (dict): Name of the command ('command') and its arguments, 'station' being the ID
+                        of the station for every command but 'stations'.
+
+        Returns:
+        dict: The answer.
+
+        Raises:
+        DaemonError: If the command or the station is unknown.
+        """
+
+        name = command.get('command')
+        if name not in self.COMMANDS:
+            raise DaemonError("Unknown command %r" % name)
+        if name == 'stations':
+            return {station_id: station.status() for station_id, station in self.stations.items()}
+
+        station = self.station(command)
+        if name == 'status':
+            return dict(station.status(), connected=station.connected())
+        if name == 'connect':
+            return {'job': station.connect(command.get('wiiboard', True), command.get('sensors', True))}
+        if name == 'job':
+            return {'status': station.job_status(command['job'])}
+        if name == 'start':
+            station.start_session(self.user(command))
+        elif name == 'measure':
+            station.start_measure(self.user(command))
+        elif name == 'stop':
+            station.stop()
+        elif name == 'links':
+            return station.link_stats()
+        elif name == 'writer':
+            return station.writer_stats()
+        elif name == 'reference':
+            values = reference_values(command.get('message'))
+            if values is None:
+                raise DaemonError("Invalid reference values")
+            return {'ok': station.set_references(command.get('user'), values)}
+        return {'ok': True}
+
+    def serve(self):
+        """
+        Serves the commands until stop() is called.
+        """
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.server = CommandServer(self.path, CommandHandler)
+        self.server.acquisition = self
+        # Only the user running the daemon and the web server (same group) may send commands
+        os.chmod(self.path, 0o660)
+        self.publisher.start()
+        self.server.serve_forever(poll_interval=0.5)
+
+    def stop(self):
+        self.running = False
+        if self.server is not None:
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def close(self):
+        """
+        Stops the stations, disconnects their devices and removes the rings and the socket.
+        """
+
+        self.running = False
+        for station in self.stations.values():
+            station.stop()
+            station.reader.finish = True
+            station.board.disconnect()
+            station.reader.disconnect()
+            station.ring = None
+        if self.publisher.is_alive():
+            self.publisher.join(1)
+        for ring in self.rings.values():
+            ring.close()
+        if self.server is not None:
+            self.server.server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,42 @@
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from real_time.daemon import AcquisitionDaemon
+from real_time.station import create_stations
+from real_time.writer import ShotWriter
+
+class Command(BaseCommand):
+    help = ("Runs the stations in their own process: reads their devices, detects and saves the shots, "
+            "writes the telemetry to shared memory for the web server and takes its commands on a Unix socket.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=getattr(settings, 'REAL_TIME_DAEMON_SOCKET', None),
+                            help="Path of the Unix socket of the commands (REAL_TIME_DAEMON_SOCKET by default).")
+        parser.add_argument('--ring', default=getattr(settings, 'REAL_TIME_DAEMON_RING', 'realtime'),
+                            help="Prefix of the names of the shared memory rings (REAL_TIME_DAEMON_RING by default).")
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError("No socket: set REAL_TIME_DAEMON_SOCKET or give --socket")
+
+        shot_writer = ShotWriter(getattr(settings, 'REAL_TIME_WRITER_QUEUE', 64))
+        stations = create_stations(shot_writer)
+        daemon = AcquisitionDaemon(stations, options['socket'], options['ring'])
+
+        def stop(signum, frame):
+            daemon.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write("Acquisition daemon of %s listening on %s" % (", ".join(stations), options['socket']))
+        try:
+            daemon.serve()
+        finally:
+            daemon.close()
+            # Leaves the writer thread time to save the last shots
+            deadline = time.monotonic() + 5
+            while shot_writer.queue.unfinished_tasks and time.monotonic() < deadline:
+                time.sleep(0.05)
+        self.stdout.write("Acquisition daemon stopped")
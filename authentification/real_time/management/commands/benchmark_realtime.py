@@ -0,0 +1,268 @@
+import asyncio
+import json
+import threading
+import time
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from real_time.models import Data
+from real_time import websocket
+from real_time.station import Station
+from real_time.scripts import transports
+from real_time.scripts import devices
+from real_time.scripts.telemetry import PROTOCOL_BINARY, decode_batch
+
+PERCENTILES = [50, 90, 99]
+BENCHMARK_USER = "realtime-benchmark"
+
+def summarise(latencies):
+    """
+    Summarises latencies given in seconds.
+
+    Returns:
+    dict: count, mean, p50, p90, p99 and max, in milliseconds (only count when there is no value).
+    """
+
+    values = 1000 * np.asarray(latencies, dtype=np.float64)
+    if len(values) == 0:
+        return {'count': 0}
+    summary = {'count': int(len(values)), 'mean': float(values.mean())}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary['p%d' % percentile] = float(value)
+    summary['max'] = float(values.max())
+    return summary
+
+def thread_cpu_times():
+    """
+    Returns the CPU time used by each running thread so far.
+
+    Returns:
+    dict: CPU time in seconds, by thread ident, with the thread name.
+    """
+
+    times = {}
+    for thread in threading.enumerate():
+        try:
+            clock = time.pthread_getcpuclockid(thread.ident)
+            times[thread.ident] = (thread.name, time.clock_gettime(clock))
+        except (OSError, TypeError):
+            pass
+    return times
+
+class HubClient:
+    """
+    Client of the telemetry hub, measuring the latency of every sample it receives.
+
+    It joins the hub in process, as the WebSocket route of the ASGI application does, so the
+    frames go through the same encoding and fan-out without a server. If no ASGI server runs in
+    this process, the client runs the event loop of the hub in its own thread.
+
+    Attributes:
+    epoch (float): Monotonic time to which the sample times of the frames are relative.
+    latencies (list): Time between the reception of each sample from its device and its reception by the client, in seconds.
+    frames (int): Number of frames received.
+    samples (int): Number of samples received.
+    missing (int): Number of frames missing from the sequence numbers.
+    connection (websocket.Connection or None): Connection of the client to the hub, with its queue.
+    """
+
+    def __init__(self, station, epoch):
+        self.station = station
+        self.epoch = epoch
+        self.latencies = []
+        self.frames = 0
+        self.samples = 0
+        self.missing = 0
+        self.sequence = None
+        self.loop = None
+        self.connection = None
+        self.thread = threading.Thread(target=self.run, name="benchmark-client", daemon=True)
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def receive(self, message):
+        received = time.monotonic()
+        frame = decode_batch(message['bytes'])
+        if self.sequence is not None:
+            self.missing += max(frame['seq'] - self.sequence - 1, 0)
+        self.sequence = frame['seq']
+        self.frames += 1
+        self.samples += len(frame['samples'])
+        self.latencies.extend((received - self.epoch - frame['samples'][:, 0]).tolist())
+
+    async def join(self):
+        self.connection = websocket.Connection(self.receive, None, self.station, PROTOCOL_BINARY)
+        self.connection.start()
+        websocket.hub.join(self.connection)
+
+    async def leave(self):
+        websocket.hub.leave(self.connection)
+        self.connection.stop()
+
+    def start(self):
+        if websocket.hub.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.thread.start()
+            websocket.hub.attach(self.loop)
+        asyncio.run_coroutine_threadsafe(self.join(), websocket.hub.loop).result(5)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.leave(), websocket.hub.loop).result(5)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(2)
+
+class Command(BaseCommand):
+    help = (
+        "Drives the real-time pipeline (readers, capture, shot writer, broadcaster and a WebSocket "
+        "client) from simulated or replayed devices, and reports the latency of each stage, the "
+        "achieved rates, the dropped samples and the CPU used by each thread."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=30, help="Duration of the measurement, in seconds.")
+        parser.add_argument('--transport', choices=['simulator', 'replay'], default='simulator')
+        parser.add_argument('--rate', type=float, default=100, help="Reports per second of the simulated Wiiboard.")
+        parser.add_argument('--sensor-rate', type=float, default=100, help="Frames per second of the simulated ESP32.")
+        parser.add_argument('--shot-interval', type=float, default=12, help="Time between two simulated shots, in seconds.")
+        parser.add_argument('--path', help="Capture replayed by the replay transport.")
+        parser.add_argument('--speed', type=float, default=1, help="Replay speed.")
+        parser.add_argument('--output', default='benchmark_realtime.json', help="Path of the JSON results.")
+        parser.add_argument('--keep', action='store_true', help="Keep the shots written during the benchmark.")
+        parser.add_argument('--station', default=websocket.DEFAULT_STATION, help="Station whose pipeline is measured.")
+
+    def handle(self, *args, **options):
+        # Imported here, as it creates the stations and their devices
+        from real_time import views
+
+        if options['transport'] == 'replay':
+            transport = transports.create('replay', path=options['path'], speed=options['speed'])
+        else:
+            transport = transports.create('simulator', rate=options['rate'], sensor_rate=options['sensor_rate'], shot_interval=options['shot_interval'])
+        station = views.stations.get(options['station'])
+        if station is None:
+            raise CommandError("Unknown station %r, expected one of %s" % (options['station'], ", ".join(views.stations)))
+        if not isinstance(station, Station):
+            raise CommandError("The stations run in the acquisition daemon: unset REAL_TIME_DAEMON_SOCKET to measure their pipeline")
+        station.transport = transport
+        station.board.transport = transport
+        station.reader.transport = transport
+        # The simulated devices must not be written to the device cache of the real ones
+        station.cache = devices.DeviceCache()
+        station.board.cache = station.cache
+        station.reader.cache = station.cache
+
+        user, created = get_user_model().objects.get_or_create(username=BENCHMARK_USER, defaults={'is_active': False})
+        station.session_id = (Data.objects.filter(user=user).aggregate(Max('session_id'))['session_id__max'] or 0) + 1
+
+        # Time between the reception of a sample and its consumption by the capture loop
+        capture_latencies = []
+        captured = [0]
+        collect_samples = station.collect_samples
+
+        def measured_collect_samples(gc, qua):
+            now = time.monotonic()
+            capture_latencies.extend((now - gc[:, 0]).tolist())
+            capture_latencies.extend((now - qua[:, 0]).tolist())
+            captured[0] += len(gc) + len(qua)
+            collect_samples(gc, qua)
+
+        station.collect_samples = measured_collect_samples
+
+        board = station.board
+        reader = station.reader
+        board.connect(board.discover())
+        reader.connect()
+        reader_thread = threading.Thread(target=reader.read, name="sensors-reader", daemon=True)
+        reader_thread.start()
+
+        station.stop_measure = False
+        measure_thread = threading.Thread(target=station.save_Measure, args=(user,), name="save-measure", daemon=True)
+        measure_thread.start()
+        client = HubClient(station.id, station.sample_batch.epoch)
+        client.start()
+        station.start_broadcaster()
+
+        pushed = {'wiiboard': board.samples.pushed, 'sensors': reader.samples.pushed}
+        frames = station.broadcaster.frames
+        cpu_start = thread_cpu_times()
+        start = time.monotonic()
+        time.sleep(options['duration'])
+        duration = time.monotonic() - start
+        cpu_end = thread_cpu_times()
+
+        station.stop_measure = True
+        measure_thread.join(5)
+        station.broadcaster.stop()
+        client.stop()
+        board.disconnect()
+        reader.finish = True
+        reader_thread.join(5)
+        reader.disconnect()
+        reader.finish = False
+        del station.collect_samples
+
+        deadline = time.monotonic() + 10
+        while station.shot_writer.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        cpu = {}
+        for ident, (name, used) in cpu_end.items():
+            if ident in cpu_start:
+                used -= cpu_start[ident][1]
+            cpu[name] = {'seconds': used, 'percent': 100 * used / duration}
+
+        results = {
+            'config': {key: options[key] for key in ('duration', 'transport', 'rate', 'sensor_rate', 'shot_interval', 'path', 'speed')},
+            'duration': duration,
+            'latency_ms': {
+                'capture': summarise(capture_latencies),
+                'broadcast': summarise(client.latencies),
+                'trigger': summarise(reader.detector.latencies),
+                'persist': summarise(station.shot_writer.latencies),
+            },
+            'rates': {
+                'wiiboard': (board.samples.pushed - pushed['wiiboard']) / duration,
+                'sensors': (reader.samples.pushed - pushed['sensors']) / duration,
+                'captured': captured[0] / duration,
+                'broadcast_frames': (station.broadcaster.frames - frames) / duration,
+                'client_samples': client.samples / duration,
+            },
+            'dropped': {
+                'wiiboard_stream': board.samples.dropped,
+                'sensors_stream': reader.samples.dropped,
+                'sensors_skipped_bytes': reader.skipped,
+                'telemetry_batch': station.sample_batch.dropped,
+                'client_frames': client.missing,
+                'client_queue': client.connection.dropped,
+                'shots': station.shot_writer.dropped,
+            },
+            'shots': {
+                'detected': reader.detector.shots,
+                'written': station.shot_writer.written,
+            },
+            'cpu': cpu,
+        }
+
+        with open(options['output'], 'w') as file:
+            json.dump(results, file, indent=2)
+
+        for stage, summary in results['latency_ms'].items():
+            if summary['count']:
+                self.stdout.write("%-10s n=%-7d p50 %8.2f ms  p90 %8.2f ms  p99 %8.2f ms  max %8.2f ms" % (
+                    stage, summary['count'], summary['p50'], summary['p90'], summary['p99'], summary['max']))
+            else:
+                self.stdout.write("%-10s no sample" % stage)
+        for name, rate in results['rates'].items():
+            self.stdout.write("%-18s %8.1f /s" % (name, rate))
+        for name, count in results['dropped'].items():
+            self.stdout.write("dropped %-20s %d" % (name, count))
+        for name, usage in sorted(cpu.items(), key=lambda item: -item[1]['seconds']):
+            self.stdout.write("cpu %-40s %6.1f %%" % (name, usage['percent']))
+        self.stdout.write(self.style.SUCCESS("Results written to %s" % options['output']))
+
+        if not options['keep']:
+            Data.objects.filter(user=user, session_id=station.session_id).delete()
@@ -0,0 +1,107 @@
+import numpy as np
+from django.db import migrations, models
+
+# Copy of the packing of real_time.series as of this migration, so that later changes to the
+# app module do not change what the migration writes
+
+SERIES_DTYPE = "<f4"
+
+SERIES = (
+    ("gravity_center", ["x", "y"]),
+    ("quaternion", ["q0", "q1", "q2", "q3"]),
+)
+
+
+def pack_series(values, columns):
+    table = np.asarray(values, dtype=SERIES_DTYPE).reshape(-1, len(columns))
+    packed = np.ascontiguousarray(table.T)
+    meta = {"dtype": SERIES_DTYPE, "shape": list(packed.shape), "columns": list(columns)}
+    return packed.tobytes(), meta
+
+
+def unpack_series(blob, meta):
+    return np.frombuffer(blob, dtype=meta["dtype"]).reshape(meta["shape"])
+
+
+def pack_json_series(apps, schema_editor):
+    Data = apps.get_model("real_time", "Data")
+    for data in Data.objects.all().iterator():
+        meta = {}
+        for name, columns in SERIES:
+            blob, meta[name] = pack_series(getattr(data, name), columns)
+            setattr(data, name + "_packed", blob)
+        data.series_meta = meta
+        data.save(update_fields=["gravity_center_packed", "quaternion_packed", "series_meta"])
+
+
+def unpack_json_series(apps, schema_editor):
+    Data = apps.get_model("real_time", "Data")
+    for data in Data.objects.all().iterator():
+        for name, columns in SERIES:
+            values = unpack_series(getattr(data, name + "_packed"), data.series_meta[name])
+            setattr(data, name, values.T.tolist())
+        data.save(update_fields=["gravity_center", "quaternion"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("real_time", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="data",
+            name="gravity_center_packed",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name="data",
+            name="quaternion_packed",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name="data",
+            name="series_meta",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AlterField(
+            model_name="data",
+            name="gravity_center",
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="data",
+            name="quaternion",
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(pack_json_series, unpack_json_series),
+        migrations.RemoveField(
+            model_name="data",
+            name="gravity_center",
+        ),
+        migrations.RemoveField(
+            model_name="data",
+            name="quaternion",
+        ),
+        migrations.RenameField(
+            model_name="data",
+            old_name="gravity_center_packed",
+            new_name="gravity_center",
+        ),
+        migrations.RenameField(
+            model_name="data",
+            old_name="quaternion_packed",
+            new_name="quaternion",
+        ),
+        migrations.AlterField(
+            model_name="data",
+            name="gravity_center",
+            field=models.BinaryField(),
+        ),
+        migrations.AlterField(
+            model_name="data",
+            name="quaternion",
+            field=models.BinaryField(),
+        ),
+    ]
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import numpy as np
+
+SAMPLE_PERIOD = 0.01
+
+# Copy of the reading and summary of real_time.series as of this migration, so that later
+# changes to the app module do not change what the migration writes
+
+
+def unpack_series(blob, meta):
+    return np.frombuffer(blob, dtype=meta["dtype"]).reshape(meta["shape"])
+
+
+def summarise_gravity_center(gravity_center, trigger_index):
+    minimum = gravity_center.min(axis=0)
+    maximum = gravity_center.max(axis=0)
+    return {
+        "trigger_x": float(gravity_center[trigger_index, 0]),
+        "trigger_y": float(gravity_center[trigger_index, 1]),
+        "min_x": float(minimum[0]),
+        "max_x": float(maximum[0]),
+        "min_y": float(minimum[1]),
+        "max_y": float(maximum[1]),
+    }
+
+
+def summarise_shots(apps, schema_editor):
+    Data = apps.get_model("real_time", "Data")
+    ShotSummary = apps.get_model("real_time", "ShotSummary")
+    summaries = []
+    for data in Data.objects.all().iterator():
+        gravity_center = unpack_series(data.gravity_center, data.series_meta["gravity_center"]).T
+        trigger_index = len(gravity_center) // 2 - 1
+        sliders = data.sliders_value or [None, None]
+        summaries.append(
+            ShotSummary(
+                data_id=data.pk,
+                user_id=data.user_id,
+                session_id=data.session_id,
+                shot_id=data.shot_id,
+                window_before=(trigger_index + 1) * SAMPLE_PERIOD,
+                window_after=(len(gravity_center) - trigger_index - 1) * SAMPLE_PERIOD,
+                slider_stability_sensitivity=sliders[0],
+                slider_sensitivity=sliders[1],
+                **summarise_gravity_center(gravity_center, trigger_index),
+            )
+        )
+    ShotSummary.objects.bulk_create(summaries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("real_time", "0002_packed_series"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShotSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("session_id", models.IntegerField()),
+                ("shot_id", models.IntegerField()),
+                ("trigger_x", models.FloatField()),
+                ("trigger_y", models.FloatField()),
+                ("min_x", models.FloatField()),
+                ("max_x", models.FloatField()),
+                ("min_y", models.FloatField()),
+                ("max_y", models.FloatField()),
+                ("window_before", models.FloatField()),
+                ("window_after", models.FloatField()),
+                ("slider_stability_sensitivity", models.FloatField(null=True)),
+                ("slider_sensitivity", models.FloatField(null=True)),
+                (
+                    "data",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="summary",
+                        to="real_time.data",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-shot_id"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "session_id"],
+                        name="real_time_s_user_id_5d6d62_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(summarise_shots, migrations.RunPython.noop),
+    ]
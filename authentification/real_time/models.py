@@ -1,5 +1,7 @@
 from django.db import models
+import numpy as np
 from django.contrib.auth import get_user_model
+from real_time.series import pack_series, unpack_series, summarise_gravity_center, GRAVITY_CENTER_COLUMNS, QUATERNION_COLUMNS
 
 class Data(models.Model):
     """
@@ -10,25 +12,202 @@ class Data(models.Model):
     - session_id (IntegerField): ID representing the session during which the data was collected.
     - shot_id (IntegerField): ID representing the shot or measurement within the session.
     - measurement_date (DateTimeField): Date and time when the data was recorded (auto-generated on creation).
-    - gravity_center (JSONField): JSON data field storing coordinates of the gravity center.
-    - quaternion (JSONField): JSON data field storing quaternion values representing orientation.
+    - gravity_center (BinaryField): Packed float32 columns (t, x, y) of the gravity center.
+    - quaternion (BinaryField): Packed float32 columns (t, q0, q1, q2, q3) of the quaternion representing orientation.
+      The t column holds the time of each sample relative to the trigger, in seconds; shots recorded
+      before samples were timestamped only have the value columns.
+    - series_meta (JSONField): dtype, shape and column names of each packed series, by field name.
     - sliders_value (JSONField): JSON data field storing values of sliders used in measurements.
 
     Meta:
     - ordering: Default ordering of instances by measurement_date in descending order.
 
     Methods:
-    This model primarily serves as a data container with fields representing various measurements 
-    and associated metadata. No specific methods are defined within the model itself.
+    - set_series(name, values): Packs a table of samples into one of the series fields.
+    - get_series(name, columns): Returns columns of a series as a NumPy array.
+    - gravity_center_array(): Returns the gravity center as an array of shape (n, 2).
+    - quaternion_array(): Returns the quaternion as an array of shape (n, 4).
+    - gravity_center_times(): Returns the time of each gravity center sample.
+    - quaternion_times(): Returns the time of each quaternion sample.
     """
-    
+
+    SERIES_COLUMNS = {
+        'gravity_center': ['t'] + GRAVITY_CENTER_COLUMNS,
+        'quaternion': ['t'] + QUATERNION_COLUMNS,
+    }
+
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     session_id = models.IntegerField(default=1)
     shot_id = models.IntegerField(default=1)
     measurement_date = models.DateTimeField(auto_now_add=True)
-    gravity_center = models.JSONField()
-    quaternion = models.JSONField()
+    gravity_center = models.BinaryField()
+    quaternion = models.BinaryField()
+    series_meta = models.JSONField(default=dict)
     sliders_value = models.JSONField()
 
     class Meta:
         ordering = ['-measurement_date']
+
+    def set_series(self, name, values):
+        """
+        Packs a table of samples into one of the series fields.
+
+        Args:
+        name (str): 'gravity_center' or 'quaternion'.
+        values (array-like): Samples of shape (n, number of columns of the series), time first.
+        """
+
+        blob, meta = pack_series(values, self.SERIES_COLUMNS[name])
+        setattr(self, name, blob)
+        self.series_meta[name] = meta
+
+    def get_series(self, name, columns=None):
+        """
+        Returns columns of a series as a NumPy array, without copying the stored bytes.
+
+        Args:
+        name (str): 'gravity_center' or 'quaternion'.
+        columns (list or None): Names of the columns to return, in their stored order; all the columns when None.
+
+        Returns:
+        numpy.ndarray: Read-only array with one row per column (for example x and y).
+
+        Raises:
+        ValueError: If one of the columns is not stored for this shot.
+        """
+
+        meta = self.series_meta[name]
+        series = unpack_series(getattr(self, name), meta)
+        if columns is None:
+            return series
+        first = meta['columns'].index(columns[0])
+        return series[first:first + len(columns)]
+
+    def get_times(self, name):
+        """
+        Returns the time column of a series.
+
+        Args:
+        name (str): 'gravity_center' or 'quaternion'.
+
+        Returns:
+        numpy.ndarray or None: Read-only array of the sample times relative to the trigger, in seconds,
+                               or None for a shot recorded without timestamps.
+        """
+
+        if 't' not in self.series_meta[name]['columns']:
+            return None
+        return self.get_series(name, ['t'])[0]
+
+    def gravity_center_array(self):
+        """
+        Returns the gravity center samples.
+
+        Returns:
+        numpy.ndarray: Read-only view of shape (n, 2), one [x, y] row per sample.
+        """
+
+        return self.get_series('gravity_center', GRAVITY_CENTER_COLUMNS).T
+
+    def quaternion_array(self):
+        """
+        Returns the quaternion samples.
+
+        Returns:
+        numpy.ndarray: Read-only view of shape (n, 4), one [q0, q1, q2, q3] row per sample.
+        """
+
+        return self.get_series('quaternion', QUATERNION_COLUMNS).T
+
+    def gravity_center_times(self):
+        """
+        Returns the time of each gravity center sample relative to the trigger, or None for an untimed shot.
+        """
+
+        return self.get_times('gravity_center')
+
+    def quaternion_times(self):
+        """
+        Returns the time of each quaternion sample relative to the trigger, or None for an untimed shot.
+        """
+
+        return self.get_times('quaternion')
+
+class ShotSummary(models.Model):
+    """
+    Model holding the few values of a shot needed by the session views, so that they do not load the full series.
+
+    Attributes:
+    - data (OneToOneField): The shot summarised.
+    - user (ForeignKey): The user associated with the shot.
+    - session_id (IntegerField): ID of the session of the shot.
+    - shot_id (IntegerField): ID of the shot within the session.
+    - trigger_x, trigger_y (FloatField): Gravity center at the trigger instant.
+    - min_x, max_x, min_y, max_y (FloatField): Extents of the sway of the gravity center during the window.
+    - window_before, window_after (FloatField): Duration of the window before and after the trigger, in seconds.
+    - slider_stability_sensitivity, slider_sensitivity (FloatField): Slider settings when the shot was recorded.
+
+    Meta:
+    - ordering: Latest shot first, like the shots of a session in Data.
+    - indexes: Index on (user, session_id) for the session queries.
+
+    Methods:
+    - from_data(data, trigger_index, sample_period): Builds the summary of a shot.
+    """
+
+    data = models.OneToOneField(Data, on_delete=models.CASCADE, related_name='summary')
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    session_id = models.IntegerField()
+    shot_id = models.IntegerField()
+    trigger_x = models.FloatField()
+    trigger_y = models.FloatField()
+    min_x = models.FloatField()
+    max_x = models.FloatField()
+    min_y = models.FloatField()
+    max_y = models.FloatField()
+    window_before = models.FloatField()
+    window_after = models.FloatField()
+    slider_stability_sensitivity = models.FloatField(null=True)
+    slider_sensitivity = models.FloatField(null=True)
+
+    class Meta:
+        ordering = ['-shot_id']
+        indexes = [models.Index(fields=['user', 'session_id'])]
+
+    @classmethod
+    def from_data(cls, data, trigger_index=None, sample_period=0.01):
+        """
+        Builds the summary of a shot.
+
+        Args:
+        data (Data): The shot, with its series already set.
+        trigger_index (int or None): Index of the gravity center sample taken at the trigger instant,
+                                     the middle of the window when None.
+        sample_period (float): Time between two samples of the gravity center, in seconds.
+
+        For a timestamped shot, the trigger sample is the last one received before the trigger
+        and the windows are measured on the sample times, so trigger_index and sample_period are
+        only used for shots recorded without timestamps.
+
+        Returns:
+        ShotSummary: The unsaved summary.
+        """
+
+        gravity_center = data.gravity_center_array()
+        times = data.gravity_center_times()
+        if times is not None:
+            trigger_index = max(int(np.searchsorted(times, 0, side='right')) - 1, 0)
+            window_before = -float(times[0])
+            window_after = float(times[-1])
+        else:
+            if trigger_index is None:
+                trigger_index = len(gravity_center) // 2 - 1
+            window_before = (trigger_index + 1) * sample_period
+            window_after = (len(gravity_center) - trigger_index - 1) * sample_period
+        sliders = data.sliders_value or [None, None]
+        return cls(
+            data=data, user_id=data.user_id, session_id=data.session_id, shot_id=data.shot_id,
+            window_before=window_before, window_after=window_after,
+            slider_stability_sensitivity=sliders[0], slider_sensitivity=sliders[1],
+            **summarise_gravity_center(gravity_center, trigger_index),
+        )
@@ -0,0 +1,78 @@
+"""
+Micro-benchmark of the decoding of the Wiiboard reports.
+
+Compares the report by report path (Wiiboard.decodeReport and centerOfMass, one calcMass
+call per sensor) with the batch decoder used by the receive thread (ReportDecoder), on
+random reports and a typical calibration, and checks that both give the same samples.
+
+Run from the authentification directory:
+    python -m real_time.scripts.benchmarkDecoder [number of reports]
+"""
+
+import sys
+import timeit
+import numpy as np
+import real_time.scripts.wiiboard as wiiboard
+from real_time.scripts.wiiboardDecoder import ReportDecoder, SENSOR_BYTES
+
+CALIBRATION = [4950, 17030, 3370, 6600, 6720, 18790, 5160, 8380, 8500, 20570, 6970, 10190]
+BATCH_SIZES = [1, 8, 32]
+
+def makeReports(count, seed=0):
+    """
+    Builds random 0x32 payloads (buttons then sensors) covering the whole calibration curve.
+
+    Returns:
+    list: `count` payloads of 10 bytes.
+    """
+
+    rng = np.random.default_rng(seed)
+    low = np.array(CALIBRATION[0:4]) - 500
+    high = np.array(CALIBRATION[8:12]) + 500
+    raw = rng.integers(low, high, size=(count, 4)).astype('>u2')
+    return [b"\x00\x00" + row.tobytes() for row in raw]
+
+def perReport(board, payloads):
+    """
+    Decodes the reports one by one, as the receive thread did before the batch decoder.
+    """
+
+    for payload in payloads:
+        topLeft, topRight, bottomLeft, bottomRight = board.decodeReport(payload, 0)
+        CoMx, CoMy = wiiboard.centerOfMass(topLeft, topRight, bottomLeft, bottomRight)
+        total = topLeft + topRight + bottomLeft + bottomRight
+
+def batched(decoder, sensors, size):
+    """
+    Decodes the reports by batches of `size` reports.
+    """
+
+    step = size * SENSOR_BYTES
+    for start in range(0, len(sensors), step):
+        decoder.decode(sensors[start:start + step])
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 6400
+    payloads = makeReports(count)
+    sensors = memoryview(b"".join(payload[2:10] for payload in payloads))
+
+    board = wiiboard.Wiiboard(headless=True)
+    board.calibration = CALIBRATION
+    decoder = ReportDecoder(CALIBRATION, max(BATCH_SIZES))
+
+    expected = []
+    for payload in payloads[:max(BATCH_SIZES)]:
+        masses = board.decodeReport(payload, 0)
+        expected.append(masses + (sum(masses),) + wiiboard.centerOfMass(*masses))
+    decoded = decoder.decode(sensors[:max(BATCH_SIZES) * SENSOR_BYTES])
+    print("Max difference with the per-report path: %.2e" % np.abs(decoded - np.array(expected)).max())
+
+    repeat = 5
+    reference = min(timeit.repeat(lambda: perReport(board, payloads), number=1, repeat=repeat)) / count
+    print("per report          %8.2f us/report" % (reference * 1e6))
+    for size in BATCH_SIZES:
+        duration = min(timeit.repeat(lambda: batched(decoder, sensors, size), number=1, repeat=repeat)) / count
+        print("batch of %-4d       %8.2f us/report  (x%.1f)" % (size, duration * 1e6, reference / duration))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+class Broadcaster:
+    """
+    Sends frames to the WebSocket clients at a fixed rate from the server's own event loop.
+
+    A frame is requested from `sample` once per period and is only sent when the callable
+    returns something, so no message is emitted while no new sample has arrived.
+
+    Attributes:
+    send (coroutine function): Coroutine sending one frame to every connected client.
+    sample (callable): Returns the next frame, or None when nothing new arrived since the last one.
+    rate (float): Target number of frames per second.
+    report_interval (float): Number of seconds over which the rate and CPU usage are measured.
+    running (bool): Indicates if the broadcast loop is active.
+    frames (int): Number of frames sent since the broadcaster was started.
+    skipped (int): Number of periods without a new sample.
+    achieved_rate (float): Frames per second measured over the last report interval.
+    cpu_usage (float): CPU time spent collecting, encoding and queuing the frames over the last report
+    interval, in percent of one core (the other coroutines of the event loop are not counted).
+
+    Methods:
+    start(loop): Schedules the broadcast loop on the given event loop.
+    stop(): Stops the broadcast loop and waits for it to finish.
+    is_running(): Checks if the broadcast loop is active.
+    stats(): Returns the current statistics.
+    run(): Coroutine sending the frames at the target rate.
+    """
+
+    def __init__(self, send, sample, rate=60, report_interval=5):
+        self.send = send
+        self.sample = sample
+        self.rate = rate
+        self.report_interval = report_interval
+        self.running = False
+        self.future = None
+
+        self.frames = 0
+        self.skipped = 0
+        self.achieved_rate = 0.0
+        self.cpu_usage = 0.0
+
+    def start(self, loop):
+        """
+        Schedules the broadcast loop on the given event loop.
+
+        Args:
+        loop (asyncio.AbstractEventLoop): Event loop of the WebSocket server, running in another thread.
+
+        Returns:
+        concurrent.futures.Future: Future completed when the broadcast loop ends.
+        """
+
+        self.running = True
+        self.frames = 0
+        self.skipped = 0
+        self.future = asyncio.run_coroutine_threadsafe(self.run(), loop)
+        return self.future
+
+    def stop(self, timeout=2):
+        """
+        Stops the broadcast loop and waits for it to finish.
+
+        Args:
+        timeout (float): Maximum number of seconds to wait for the loop to end.
+        """
+
+        self.running = False
+        if self.future is not None:
+            try:
+                self.future.result(timeout)
+            except Exception as e:
+                print("Broadcaster stopped with error:", e)
+            self.future = None
+
+    def is_running(self):
+        """
+        Checks if the broadcast loop is active.
+
+        Returns:
+        bool: True if the loop is scheduled and not finished, False otherwise.
+        """
+
+        return self.running and self.future is not None and not self.future.done()
+
+    def stats(self):
+        """
+        Returns the current statistics.
+
+        Returns:
+        dict: Target and achieved rates, CPU usage, number of sent frames and skipped periods.
+        """
+
+        return {
+            'rate': self.rate,
+            'achieved_rate': self.achieved_rate,
+            'cpu_usage': self.cpu_usage,
+            'frames': self.frames,
+            'skipped': self.skipped,
+        }
+
+    async def run(self):
+        """
+        Sends the frames at the target rate until the broadcaster is stopped.
+
+        The next deadline is computed from the previous one rather than from the end of the
+        send, so the rate does not drift. If a send took longer than a period, the schedule is
+        reset instead of sending a burst of late frames.
+        """
+
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.rate
+        deadline = loop.time()
+
+        window_start = time.monotonic()
+        window_cpu = 0.0
+        window_frames = 0
+
+        while self.running:
+            # Only the broadcaster's own work is timed, not the rest of the loop's thread
+            started = time.thread_time()
+            frame = self.sample()
+            if frame is not None:
+                try:
+                    await self.send(frame)
+                except Exception as e:
+                    print("Error broadcasting frame:", e)
+                self.frames += 1
+                window_frames += 1
+            else:
+                self.skipped += 1
+            window_cpu += time.thread_time() - started
+
+            now = time.monotonic()
+            if now - window_start >= self.report_interval:
+                self.achieved_rate = window_frames / (now - window_start)
+                self.cpu_usage = 100 * window_cpu / (now - window_start)
+                window_start = now
+                window_cpu = 0.0
+                window_frames = 0
+
+            deadline += period
+            delay = deadline - loop.time()
+            if delay < 0:
+                deadline = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
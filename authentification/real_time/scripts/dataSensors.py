@@ -1,17 +1,49 @@
-import bluetooth
 import time
 import struct
+import numpy as np
+from real_time.scripts.sampleStream import SampleStream
+from real_time.scripts.triggerDetector import TriggerDetector
+from real_time.scripts.transports import BluetoothTransport
+from real_time.scripts.deviceLink import DeviceLink
 
-find = True
-finish = False
-trigger = False
+# Frame sent by the ESP32 (sendData): microphone peak-to-peak amplitude, then the quaternion q0..q3
+FRAME = struct.Struct('<I4f')
+FRAME_SIZE = FRAME.size
+FRAME_DTYPE = np.dtype([('microphone', '<u4'), ('q', '<f4', 4)])
+BUFFER_SIZE = 4096
+# From this number of complete frames, they are decoded with NumPy instead of struct
+BURST_FRAMES = 8
+# The microphone is read with a 10 bits range and the quaternion is normalised by the Mahony filter
+MICROPHONE_RANGE = 1024
+NORM_TOLERANCE = 0.1
 
-data_microphone = 0
-q0 = 0
-q1 = 0
-q2 = 0
-q3 = 0
-CoG = 0
+def validFrame(microphone, q0, q1, q2, q3):
+    """
+    Checks that decoded values can come from a frame of the ESP32.
+
+    Used to find the frame boundaries again when the stream is misaligned: the microphone
+    amplitude must be in the range of the ADC and the quaternion must have a norm close to 1.
+
+    Returns:
+    bool: True if the values are plausible.
+    """
+
+    return microphone < MICROPHONE_RANGE and abs(q0*q0 + q1*q1 + q2*q2 + q3*q3 - 1) < NORM_TOLERANCE
+
+def validFrames(frames):
+    """
+    Vectorized version of validFrame.
+
+    Args:
+    frames (numpy.ndarray): Frames of dtype FRAME_DTYPE.
+
+    Returns:
+    numpy.ndarray: Boolean array, True for the plausible frames.
+    """
+
+    q = frames['q']
+    norm = np.einsum('ij,ij->i', q, q)
+    return (frames['microphone'] < MICROPHONE_RANGE) & (np.abs(norm - 1) < NORM_TOLERANCE)
 
 class BluetoothReader:
     """
@@ -19,98 +51,220 @@ class BluetoothReader:
 
     Attributes:
     BLUETOOTH_NAME (str): The name of the Bluetooth device to connect to.
-    socket (bluetooth.BluetoothSocket or None): The Bluetooth socket object for communication.
-    connected (bool): Indicates if the device is currently connected.
+    transport: Transport used to discover the device and open its socket (see real_time.scripts.transports).
+    socket (socket or None): The socket object for communication.
+    address (str or None): Address of the device, once connected.
+    connected (bool): Indicates if the device is currently connected (it stays True while the link is recovered).
+    link (DeviceLink): State of the link: stale while it is down, and the gaps of the samples.
+    samples (SampleStream): Timestamped quaternion (q0, q1, q2, q3) of every frame received, the last one
+                            being read at once with samples.snapshot().
+    buffer (bytearray): Reusable receive buffer, holding the bytes of the incomplete frame between two reads.
+    frames (int): Number of frames decoded.
+    skipped (int): Number of bytes skipped to find the frame boundaries again.
+    detector (TriggerDetector): Detects the shots in the microphone amplitude of the frames.
+    cache (DeviceCache or None): Cache of the address of the device.
+    finish (bool): Set to stop reading.
 
     Methods:
-    connect(): Tries to connect to the Bluetooth device with the specified name.
+    connect(address): Tries to connect to the Bluetooth device with the specified name, or at the given address.
     read(): Reads data continuously from the Bluetooth device when connected.
-    getData(data): Processes the raw data received from Bluetooth and updates global variables.
+    reconnect(error): Reopens the link after a loss, with backoff.
+    decodeFrames(view, start, end, received): Decodes the complete frames of the receive buffer.
+    resync(view, start, end): Finds the next frame boundary in the receive buffer.
+    handleFrame(received, microphone, q0, q1, q2, q3): Pushes a decoded frame to the samples and the detector.
     disconnect(): Closes the Bluetooth connection.
     """
 
-    def __init__(self, bluetooth_name):
+    def __init__(self, bluetooth_name, transport=None):
         self.BLUETOOTH_NAME = bluetooth_name
+        self.transport = transport or BluetoothTransport()
         self.socket = None
+        self.address = None
         self.connected = False
+        self.link = DeviceLink("Sensors")
+        self.samples = SampleStream(4)
+        self.buffer = bytearray(BUFFER_SIZE)
+        self.frames = 0
+        self.skipped = 0
+        self.detector = TriggerDetector()
+        self.cache = None
+        self.finish = False
 
-    def connect(self):
+    def connect(self, address=None):
         """
-        Connects to the Bluetooth device with the specified name.
+        Connects to the device with the specified name, through the transport.
+
+        Args:
+        address (str or None): Address of the device, known from a previous connection. The
+                               device is discovered by its name when None.
+
+        Returns:
+        bool: True if the device is connected.
 
         Raises:
         Exception: If an error occurs while connecting to the Bluetooth device.
         """
          
-        global find
         try:
-            devices = bluetooth.discover_devices(duration=3,lookup_names=True)
-            for addr, name in devices:
-                if name == self.BLUETOOTH_NAME:
-                    self.socket = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
-                    self.socket.connect((addr, 1))
-                    self.socket.settimeout(2)
-                    self.connected = True
-                    break
-            find = False
+            addr = address if address is not None else self.transport.discover(self.BLUETOOTH_NAME)
+            if addr is not None:
+                self.socket = self.transport.openSensors(addr)
+                self.address = addr
+                self.connected = True
+                self.link.restore()
         except Exception as e:
-            find = False
             print("Error connecting to Bluetooth device:", e)
+        return self.connected
 
     def read(self):
         """
         Reads data continuously from the Bluetooth device.
 
-        This method continuously reads data from the Bluetooth socket 
-        and updates global variables based on the received data.
-
-        Raises:
-        Exception: If an error occurs while reading from the Bluetooth device.
+        The stream is read into the reusable `buffer` with recv_into, whatever the number of
+        bytes returned by each read: a frame split over two reads is completed by the next one
+        and several frames received at once are all decoded, in one pass (see decodeFrames).
+        The bytes of an incomplete frame are moved to the start of the buffer for the next read.
+        Each frame is timestamped with the monotonic time at which it was received, its
+        quaternion is pushed to `samples` and its microphone amplitude is given to `detector`.
+        If the link is lost (an error or 2 seconds without data), the same thread reconnects
+        (see reconnect) and reading goes on, the bytes of the incomplete frame being dropped.
         """
 
-        global target, trigger, CoG, data_microphone, finish, q0, q1, q2, q3
-        time_before = 0
-        i = 0
-        try:
-            while self.connected and not finish:
-                
-                data = self.socket.recv(20)
+        view = memoryview(self.buffer)
+        filled = 0
+        while self.connected and not self.finish:
+            try:
+                size = self.socket.recv_into(view[filled:], BUFFER_SIZE - filled)
+                received = time.monotonic()
+                if size == 0:
+                    raise ConnectionError("connection closed by the device")
+                filled += size
 
                 try : 
-                    self.getData(data)
-
-                    if(data_microphone > 1000 and time.time() - time_before > 10):
-                        trigger = True
-                        CoG = 1
-                        time_before = time.time()
-                        
+                    start = self.decodeFrames(view, 0, filled, received)
                 except Exception as e : 
                     print(e)
+                    start = filled
 
-        except Exception as e:
-            print("Error reading from Bluetooth device:", e)
-            self.connected = False
-        
-    def getData(self, data):
+                # Keep the incomplete frame for the next read
+                filled -= start
+                self.buffer[:filled] = self.buffer[start:start + filled]
+
+            except Exception as e:
+                if not self.connected or self.finish:
+                    break
+                print("Error reading from Bluetooth device:", e)
+                if not self.reconnect(e):
+                    self.connected = False
+                    break
+                filled = 0
+
+    def reconnect(self, error):
         """
-        Processes the raw data received from Bluetooth.
+        Reopens the link to the device after a loss, with backoff (see DeviceLink.recover).
+
+        The dead socket is closed and the device is opened again at the same address. Its
+        frames go on being pushed to the same `samples`, so the capture continues in the same
+        session.
 
         Args:
-        data (bytes): Raw data received from Bluetooth.
+        error (Exception): Cause of the loss.
 
-        Updates:
-        global variables data_microphone, q0, q1, q2, q3 based on the processed data.
+        Returns:
+        bool: True if the link is recovered, False if the reader was stopped meanwhile or the reconnection gave up.
         """
 
-        global data_microphone, q0, q1, q2, q3
+        self.link.lose(error)
+        try:
+            self.socket.close()
+        except Exception:
+            pass
 
-        data_microphone = data[0] + 16**2*data[1]
+        def attempt():
+            self.socket = self.transport.openSensors(self.address)
+            return True
 
-        q0 = struct.unpack('f', data[4:8])[0]
-        q1 = struct.unpack('f', data[8:12])[0]
-        q2 = struct.unpack('f', data[12:16])[0]
-        q3 = struct.unpack('f', data[16:20])[0]
+        return self.link.recover(attempt, lambda: self.finish or not self.connected)
 
+    def decodeFrames(self, view, start, end, received):
+        """
+        Decodes the complete frames of the receive buffer.
+
+        A few frames are unpacked with one FRAME.iter_unpack call, a burst of at least
+        BURST_FRAMES frames with one numpy.frombuffer call. If a frame is not plausible
+        (see validFrame), the stream is misaligned: the following bytes are searched for the
+        next frame boundary and decoding continues from there.
+
+        Args:
+        view (memoryview): View of the receive buffer.
+        start (int): Offset of the first byte to decode.
+        end (int): Offset after the last byte received.
+        received (float): Monotonic time at which the bytes were received, in seconds.
+
+        Returns:
+        int: Offset of the first byte that was not decoded (the start of an incomplete frame).
+        """
+
+        while end - start >= FRAME_SIZE:
+            count = (end - start) // FRAME_SIZE
+            decoded = 0
+
+            if count >= BURST_FRAMES:
+                frames = np.frombuffer(view, dtype=FRAME_DTYPE, count=count, offset=start)
+                valid = validFrames(frames)
+                decoded = count if valid.all() else int(valid.argmin())
+                if decoded:
+                    frames = frames[:decoded]
+                    times = [received] * decoded
+                    self.samples.extend(times, frames['q'])
+                    self.detector.extend(times, frames['microphone'])
+            else:
+                for microphone, q0_, q1_, q2_, q3_ in FRAME.iter_unpack(view[start:start + count * FRAME_SIZE]):
+                    if not validFrame(microphone, q0_, q1_, q2_, q3_):
+                        break
+                    self.handleFrame(received, microphone, q0_, q1_, q2_, q3_)
+                    decoded += 1
+
+            self.frames += decoded
+            start += decoded * FRAME_SIZE
+            if decoded < count:
+                boundary = self.resync(view, start + 1, end)
+                self.skipped += boundary - start
+                start = boundary
+
+        return start
+
+    def resync(self, view, start, end):
+        """
+        Finds the next frame boundary in the receive buffer.
+
+        Args:
+        view (memoryview): View of the receive buffer.
+        start (int): Offset from which to search.
+        end (int): Offset after the last byte received.
+
+        Returns:
+        int: Offset of the first plausible frame, or of the last bytes that may still start
+             one when the rest of the buffer does not contain any.
+        """
+
+        for offset in range(start, end - FRAME_SIZE + 1):
+            if validFrame(*FRAME.unpack_from(view, offset)):
+                return offset
+        return max(start, end - FRAME_SIZE + 1)
+
+    def handleFrame(self, received, microphone, q0_, q1_, q2_, q3_):
+        """
+        Pushes a decoded frame to `samples` and gives its microphone amplitude to `detector`.
+
+        Args:
+        received (float): Monotonic time at which the frame was received, in seconds.
+        microphone (int): Peak-to-peak amplitude of the microphone.
+        q0_, q1_, q2_, q3_ (float): Quaternion of the frame.
+        """
+
+        self.samples.push(received, q0_, q1_, q2_, q3_)
+        self.detector.update(received, microphone)
 
     def disconnect(self):
         """
@@ -123,20 +277,5 @@ class BluetoothReader:
             self.connected = False
             print("Disconnected from Bluetooth device")
 
-bluetooth_name = "ESP32"
-reader = BluetoothReader(bluetooth_name)
-
 
-def main():
-    """
-    Main function to connect to and read data from a Bluetooth device.
-
-    Connects to the Bluetooth device using reader.connect().
-    If connected (reader.connected is True), starts reading data (reader.read()).
-    After reading, disconnects from the Bluetooth device (reader.disconnect()).
-    """
-    
-    reader.connect()
-    if reader.connected:
-        reader.read()
-        reader.disconnect()
+bluetooth_name = "ESP32"
@@ -0,0 +1,121 @@
+import time
+
+# Waits between two reconnection attempts, in seconds (the last one is repeated)
+BACKOFF = (0.5, 1, 2, 4, 8)
+# Longest sleep between two checks of the stop condition while waiting to reconnect
+STOP_CHECK = 0.25
+
+class DeviceLink:
+    """
+    State of the link to a device, kept by its reader thread and read by the capture stage.
+
+    When the reader loses the link, it calls lose(), then recover() with a function reopening
+    the device: the attempts are spaced by an exponential backoff until one succeeds or the
+    reader is stopped. While the link is down, the device is `stale`: its last values are no
+    longer live. Each loss is kept as a gap [start, end] of monotonic times.
+
+    Attributes:
+    name (str): Name of the device.
+    delays (tuple): Waits between two reconnection attempts, in seconds.
+    give_up (float or None): Time after which the reader stops trying to reconnect, in seconds (never when None).
+    stale (bool): True while the link is down.
+    gaps (list): [start, end] monotonic times of every loss, end being None while the link is down.
+    losses (int): Number of times the link was lost.
+    reconnections (int): Number of times the link was recovered.
+    attempts (int): Number of reconnection attempts that failed.
+    error (str or None): Last error of the link.
+
+    Methods:
+    lose(error): Marks the link as down.
+    restore(): Marks the link as up again and closes the current gap.
+    recover(attempt, stopped): Reconnects with backoff.
+    stats(): Returns the state of the link.
+    """
+
+    def __init__(self, name, delays=BACKOFF, give_up=None):
+        self.name = name
+        self.delays = delays
+        self.give_up = give_up
+        self.stale = False
+        self.gaps = []
+        self.losses = 0
+        self.reconnections = 0
+        self.attempts = 0
+        self.error = None
+
+    def lose(self, error):
+        """
+        Marks the link as down, opening a gap.
+
+        Args:
+        error (Exception or str): Cause of the loss.
+        """
+
+        if not self.stale:
+            self.stale = True
+            self.gaps.append([time.monotonic(), None])
+            self.losses += 1
+        self.error = str(error)
+        print("Link to %s lost:" % self.name, error)
+
+    def restore(self):
+        """
+        Marks the link as up again and closes the current gap.
+        """
+
+        if self.stale:
+            self.gaps[-1][1] = time.monotonic()
+            self.stale = False
+            self.reconnections += 1
+            print("Link to %s recovered after %.1f s" % (self.name, self.gaps[-1][1] - self.gaps[-1][0]))
+
+    def recover(self, attempt, stopped):
+        """
+        Reconnects with backoff.
+
+        Args:
+        attempt (callable): Reopens the device, returns True on success (an exception is a failure).
+        stopped (callable): Returns True when the reader is stopped, to stop trying.
+
+        Returns:
+        bool: True if the link is recovered, False if the reader was stopped or gave up.
+        """
+
+        start = time.monotonic()
+        number = 0
+        while not stopped():
+            try:
+                if attempt():
+                    self.restore()
+                    return True
+            except Exception as e:
+                self.error = str(e)
+            self.attempts += 1
+            if self.give_up is not None and time.monotonic() - start > self.give_up:
+                print("Giving up reconnecting to %s after %.0f s" % (self.name, time.monotonic() - start))
+                return False
+
+            # Sleep by small steps, so that a stop is not delayed by the backoff
+            wake = time.monotonic() + self.delays[min(number, len(self.delays) - 1)]
+            while not stopped() and time.monotonic() < wake:
+                time.sleep(max(min(STOP_CHECK, wake - time.monotonic()), 0))
+            number += 1
+        return False
+
+    def stats(self):
+        """
+        Returns the state of the link.
+
+        Returns:
+        dict: stale, losses, reconnections, attempts, error, and down (total time without link, in seconds).
+        """
+
+        now = time.monotonic()
+        return {
+            'stale': self.stale,
+            'losses': self.losses,
+            'reconnections': self.reconnections,
+            'attempts': self.attempts,
+            'error': self.error,
+            'down': sum((end if end is not None else now) - start for start, end in self.gaps),
+        }
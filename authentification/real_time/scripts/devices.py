@@ -0,0 +1,410 @@
+"""
+Connection of the devices, with a local cache of the devices met before.
+
+The cache is a small JSON file holding the last address of each device name and the
+calibration block read from each Wiiboard (by address). The calibration of a Wiiboard is
+written in the board at the factory, so it never needs to be read twice from the same board.
+connectDevices first tries the cached addresses, then runs a single Bluetooth inquiry for all
+the devices still missing, and opens the devices concurrently. ConnectionJobs runs it in the
+background, so that the views return at once and the page polls the state of each device.
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+
+class DeviceCache:
+    """
+    Addresses of the known devices and calibration of the known Wiiboards, persisted to a JSON file.
+
+    Every change is written immediately (to a temporary file then renamed), so the cache survives
+    a crash of the server. A missing or unreadable file is an empty cache.
+
+    A device can be pinned to an address, for example when several stations have Wiiboards of
+    the same name: it is then only ever connected at that address, never discovered.
+
+    Attributes:
+    path (str or None): Path of the JSON file, nothing is persisted when None.
+    pinned (dict): Fixed address of some devices, by Bluetooth name.
+    addresses (dict): Last address of each device, by Bluetooth name.
+    calibrations (dict): Calibration block of each Wiiboard, by address.
+
+    Methods:
+    address(name): Returns the pinned or last address of a device.
+    isPinned(name): Checks if a device is pinned to an address.
+    remember(name, address): Records the address of a device.
+    forget(name): Removes the address of a device.
+    calibration(address): Returns the calibration of a Wiiboard.
+    storeCalibration(address, calibration): Records the calibration of a Wiiboard.
+    """
+
+    def __init__(self, path=None, pinned=None):
+        self.path = path
+        self.pinned = dict(pinned or {})
+        self.addresses = {}
+        self.calibrations = {}
+        self.lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as file:
+                    content = json.load(file)
+                self.addresses = content.get('addresses', {})
+                self.calibrations = content.get('calibrations', {})
+            except (OSError, ValueError) as e:
+                print("Device cache %s ignored:" % path, e)
+
+    def address(self, name):
+        """
+        Returns the pinned or last address of a device.
+
+        Args:
+        name (str): Bluetooth name of the device.
+
+        Returns:
+        str or None: Its address, None if it is not pinned and was never connected.
+        """
+
+        if name in self.pinned:
+            return self.pinned[name]
+        return self.addresses.get(name)
+
+    def isPinned(self, name):
+        return name in self.pinned
+
+    def remember(self, name, address):
+        """
+        Records the address of a device.
+
+        Args:
+        name (str): Bluetooth name of the device.
+        address (str): Its address.
+        """
+
+        if self.addresses.get(name) != address:
+            with self.lock:
+                self.addresses[name] = address
+                self.save()
+
+    def forget(self, name):
+        """
+        Removes the address of a device.
+
+        Args:
+        name (str): Bluetooth name of the device.
+        """
+
+        if name in self.addresses:
+            with self.lock:
+                self.addresses.pop(name, None)
+                self.save()
+
+    def calibration(self, address):
+        """
+        Returns the calibration of a Wiiboard.
+
+        Args:
+        address (str): Address of the Wiiboard.
+
+        Returns:
+        list or None: The 12 raw calibration values, None if they were never read.
+        """
+
+        return self.calibrations.get(address)
+
+    def storeCalibration(self, address, calibration):
+        """
+        Records the calibration of a Wiiboard.
+
+        Args:
+        address (str): Address of the Wiiboard.
+        calibration (list): The 12 raw calibration values.
+        """
+
+        with self.lock:
+            self.calibrations[address] = list(calibration)
+            self.save()
+
+    def save(self):
+        if self.path is None:
+            return
+        try:
+            with open(str(self.path) + '.tmp', 'w') as file:
+                json.dump({'addresses': self.addresses, 'calibrations': self.calibrations}, file, indent=2)
+            os.replace(str(self.path) + '.tmp', self.path)
+        except OSError as e:
+            print("Device cache %s not saved:" % self.path, e)
+
+def connectAll(connections):
+    """
+    Opens several devices concurrently, one thread per device.
+
+    Args:
+    connections (dict): (connect function, address) by device name. The function takes the
+                        address and returns True once the device is connected.
+
+    Returns:
+    dict: True or False by device name.
+    """
+
+    results = {}
+
+    def attempt(name, connect, address):
+        try:
+            results[name] = bool(connect(address))
+        except Exception as e:
+            print("Could not connect to %s at address %s:" % (name, address), e)
+            results[name] = False
+
+    threads = [threading.Thread(target=attempt, args=(name, connect, address), daemon=True) for name, (connect, address) in connections.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def connectDevices(connectors, transport, cache=None, duration=3, progress=None):
+    """
+    Connects several devices, trying their cached addresses before a Bluetooth inquiry.
+
+    The devices with a cached address are opened directly. The inquiry (the 3 seconds spent in
+    discover_devices) only runs when a device has no cached address or could not be opened at
+    it, once for all these devices, except the devices pinned to their address. The addresses of
+    the devices connected are cached.
+
+    Args:
+    connectors (dict): Function connecting each device to an address, by Bluetooth name (see connectAll).
+    transport: Transport to the devices, used for the inquiry (see real_time.scripts.transports).
+    cache (DeviceCache or None): Cache of the addresses.
+    duration (int): Duration of the inquiry, in seconds.
+    progress (callable or None): Called as progress(name, state) when a device starts being
+                                 discovered ("discovering") or opened ("connecting").
+
+    Returns:
+    dict: True or False by device name.
+    """
+
+    def report(names, state):
+        if progress is not None:
+            for name in names:
+                progress(name, state)
+
+    start = time.monotonic()
+    results = {}
+    addresses = {}
+    if cache is not None:
+        addresses = {name: cache.address(name) for name in connectors if cache.address(name) is not None}
+        report(addresses, 'connecting')
+        results.update(connectAll({name: (connectors[name], address) for name, address in addresses.items()}))
+
+    missing = [name for name in connectors if not results.get(name) and not (cache is not None and cache.isPinned(name))]
+    if missing:
+        print("Searching for %s" % ", ".join(missing))
+        report(missing, 'discovering')
+        found = transport.discoverAll(missing, duration)
+        addresses.update(found)
+        report(found, 'connecting')
+        results.update(connectAll({name: (connectors[name], address) for name, address in found.items()}))
+        for name in missing:
+            results.setdefault(name, False)
+            if name not in found:
+                print("%s not found" % name)
+    for name in connectors:
+        if not results.setdefault(name, False) and cache is not None and cache.isPinned(name):
+            print("%s not reachable at its address %s" % (name, cache.address(name)))
+
+    if cache is not None:
+        for name, connected in results.items():
+            if connected:
+                cache.remember(name, addresses[name])
+
+    print("Devices connected in %.1f s: %s" % (time.monotonic() - start, ", ".join("%s %s" % (name, "ok" if connected else "failed") for name, connected in results.items())))
+    return results
+
+class ConnectionJob:
+    """
+    Background attempt to connect several devices, with the state of each one.
+
+    The state of a device goes from "pending" to "discovering" (only when it is not reached at
+    its cached address), "connecting", then its setup state if it has one (for example
+    "calibrating"), and ends as "connected" or "failed". The time spent in each state is kept.
+
+    Attributes:
+    number (int): Number of the job, used in the status URL.
+    devices (list): Names of the devices.
+    states (dict): (state, monotonic time at which it was entered) by device name.
+    timings (dict): Time spent in each state left, in seconds, by device name.
+    started (float): Wall-clock time at which the job was created.
+    done (threading.Event): Set when every device is connected or failed.
+
+    Methods:
+    start(): Starts the thread of the job.
+    update(name, state): Moves a device to a new state.
+    status(): Returns the states and timings, for the status endpoint.
+    """
+
+    def __init__(self, number, connectors, transport, cache=None, setup=None, duration=3):
+        """
+        Args:
+        number (int): Number of the job.
+        connectors (dict): Function connecting each device to an address, by Bluetooth name (see connectAll).
+        transport: Transport to the devices.
+        cache (DeviceCache or None): Cache of the addresses.
+        setup (dict or None): (state, function) by device name, for the devices that need more than
+                              being opened: the function is called once the device is open and
+                              returns True when it is ready, the device being in `state` meanwhile
+                              (or in its current state when `state` is None).
+        duration (int): Duration of the inquiry, in seconds.
+        """
+
+        self.number = number
+        self.connectors = connectors
+        self.transport = transport
+        self.cache = cache
+        self.setup = setup or {}
+        self.duration = duration
+        self.devices = list(connectors)
+        now = time.monotonic()
+        self.states = {name: ('pending', now) for name in connectors}
+        self.timings = {name: {} for name in connectors}
+        self.started = time.time()
+        self.created = now
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def update(self, name, state):
+        """
+        Moves a device to a new state, adding the time spent in the previous one to its timings.
+
+        Args:
+        name (str): Bluetooth name of the device.
+        state (str): The new state.
+        """
+
+        now = time.monotonic()
+        with self.lock:
+            previous, since = self.states[name]
+            self.timings[name][previous] = self.timings[name].get(previous, 0.0) + now - since
+            self.states[name] = (state, now)
+
+    def run(self):
+        try:
+            results = connectDevices(self.connectors, self.transport, self.cache, self.duration, self.update)
+        except Exception as e:
+            print("Error connecting the devices:", e)
+            results = {}
+
+        for name in self.devices:
+            if not results.get(name):
+                self.update(name, 'failed')
+            elif name not in self.setup:
+                self.update(name, 'connected')
+
+        for name, (state, function) in self.setup.items():
+            if results.get(name):
+                if state is not None:
+                    self.update(name, state)
+                try:
+                    ready = function()
+                except Exception as e:
+                    print("Error setting up %s:" % name, e)
+                    ready = False
+                self.update(name, 'connected' if ready else 'failed')
+        self.done.set()
+
+    def finished(self, name):
+        return self.states[name][0] in ('connected', 'failed')
+
+    def status(self):
+        """
+        Returns the states and timings, for the status endpoint.
+
+        Returns:
+        dict: id, started, done, and for each device its state, the time spent in it so far and
+              the time spent in each previous state (seconds).
+        """
+
+        now = time.monotonic()
+        with self.lock:
+            devices = {}
+            for name in self.devices:
+                state, since = self.states[name]
+                devices[name] = {
+                    'state': state,
+                    'elapsed': now - since,
+                    'timings': dict(self.timings[name]),
+                }
+        return {
+            'id': self.number,
+            'started': self.started,
+            'duration': now - self.created,
+            'done': self.done.is_set(),
+            'devices': devices,
+        }
+
+class ConnectionJobs:
+    """
+    The connection jobs of the devices of one station, kept for their status.
+
+    A device is never in two running jobs: starting a job for a device that is already being
+    connected returns the running job instead. The devices are told apart by their Bluetooth
+    name, which is the same for every Wiiboard, so each station has its own ConnectionJobs. The
+    stations can share the numbering of their jobs, so that a number is never used twice.
+
+    Attributes:
+    jobs (dict): The last `keep` jobs, by number.
+    keep (int): Number of jobs kept.
+    numbers (iterator): Numbers of the next jobs.
+
+    Methods:
+    start(connectors, transport, cache, setup): Starts a job for the devices that are not being connected.
+    get(number): Returns a job by number.
+    """
+
+    def __init__(self, keep=16, numbers=None):
+        self.jobs = {}
+        self.keep = keep
+        self.numbers = numbers or itertools.count(1)
+        self.lock = threading.Lock()
+
+    def start(self, connectors, transport, cache=None, setup=None):
+        """
+        Starts a job for the devices that are not being connected.
+
+        Args:
+        connectors, transport, cache, setup: As for ConnectionJob.
+
+        Returns:
+        ConnectionJob: The new job, or the running job of the devices if they are all being connected.
+        """
+
+        with self.lock:
+            running = [job for job in self.jobs.values() if not job.done.is_set()]
+            busy = {name: job for job in running for name in job.devices if not job.finished(name)}
+            connectors = {name: connect for name, connect in connectors.items() if name not in busy}
+            if not connectors:
+                return busy[next(iter(busy))] if busy else None
+
+            setup = {name: item for name, item in (setup or {}).items() if name in connectors}
+            job = ConnectionJob(next(self.numbers), connectors, transport, cache, setup)
+            self.jobs[job.number] = job
+            for number in sorted(self.jobs)[:-self.keep]:
+                del self.jobs[number]
+        job.start()
+        return job
+
+    def get(self, number):
+        """
+        Returns a job by number.
+
+        Returns:
+        ConnectionJob or None: The job, None if it is unknown or too old.
+        """
+
+        return self.jobs.get(number)
@@ -0,0 +1,60 @@
+import numpy as np
+
+class RingBuffer:
+    """
+    Fixed-length circular buffer of samples backed by a preallocated NumPy array.
+
+    Writing a sample overwrites the oldest one in place, so the cost of an append
+    does not depend on the length of the window.
+
+    Attributes:
+    length (int): Number of samples kept in the window.
+    width (int): Number of values stored for each sample.
+    data (numpy.ndarray): Preallocated storage of shape (length, width).
+    index (int): Row where the next sample will be written (also the oldest sample).
+
+    Methods:
+    append(*values): Writes a new sample over the oldest one.
+    snapshot(): Returns a copy of the window ordered from the oldest to the newest sample.
+    fill(*values): Sets every sample of the window to the same values.
+    """
+
+    def __init__(self, length, width, dtype=np.float64):
+        self.length = length
+        self.width = width
+        self.data = np.zeros((length, width), dtype=dtype)
+        self.index = 0
+
+    def append(self, *values):
+        """
+        Writes a new sample over the oldest one.
+
+        Args:
+        *values (float): The `width` values of the sample.
+        """
+
+        self.data[self.index] = values
+        self.index += 1
+        if self.index == self.length:
+            self.index = 0
+
+    def snapshot(self):
+        """
+        Unrolls the window into a new array.
+
+        Returns:
+        numpy.ndarray: Array of shape (length, width), oldest sample first.
+        """
+
+        return np.concatenate((self.data[self.index:], self.data[:self.index]))
+
+    def fill(self, *values):
+        """
+        Sets every sample of the window to the same values.
+
+        Args:
+        *values (float): The `width` values of the sample.
+        """
+
+        self.data[:] = values
+        self.index = 0
@@ -0,0 +1,158 @@
+import threading
+from collections import namedtuple
+import numpy as np
+
+class Snapshot(namedtuple('Snapshot', ['sequence', 'time', 'values'])):
+    """
+    Last sample of a device, never modified once published.
+
+    The stream replaces its snapshot with a new one for each sample, in a single assignment, so
+    a consumer always reads the values of one sample, and compares the sequence numbers of two
+    snapshots to know whether a sample arrived in between.
+
+    Attributes:
+    sequence (int): Number of samples pushed to the stream up to this one (0 before the first).
+    time (float or None): Monotonic time at which the sample was received, in seconds.
+    values (tuple): The `width` values of the sample.
+    """
+
+    __slots__ = ()
+
+class SampleStream:
+    """
+    Queue of timestamped samples produced by one device.
+
+    The reader thread of the device pushes every decoded sample with the monotonic time at which
+    it was received, and the capture stage drains all the samples that arrived since its last call.
+    Samples are kept in a preallocated array, so pushing a sample does not allocate.
+
+    Attributes:
+    width (int): Number of values of a sample, without the timestamp.
+    capacity (int): Maximum number of samples waiting to be drained.
+    rows (numpy.ndarray): Preallocated storage of shape (capacity, width + 1), timestamp first.
+    count (int): Number of samples waiting to be drained.
+    start (int): Row of the oldest waiting sample.
+    pushed (int): Number of samples pushed since the stream was created.
+    dropped (int): Number of samples overwritten before being drained.
+    notify (threading.Event or None): Event set each time a sample is pushed, used to wake up the consumer.
+    latest (Snapshot): The last sample pushed, with its sequence number.
+
+    Methods:
+    push(t, *values): Adds a sample.
+    extend(t, values): Adds several samples.
+    drain(): Returns the waiting samples and empties the stream.
+    snapshot(): Returns the last sample pushed.
+    changed(sequence): Checks whether a sample was pushed after a sequence number.
+    """
+
+    def __init__(self, width, capacity=4096):
+        self.width = width
+        self.capacity = capacity
+        self.rows = np.zeros((capacity, width + 1))
+        self.count = 0
+        self.start = 0
+        self.pushed = 0
+        self.dropped = 0
+        self.notify = None
+        self.latest = Snapshot(0, None, (0.0,) * width)
+        self.lock = threading.Lock()
+
+    def push(self, t, *values):
+        """
+        Adds a sample.
+
+        If the stream is full, the oldest waiting sample is overwritten and counted in `dropped`.
+
+        Args:
+        t (float): Monotonic time at which the sample was received, in seconds.
+        *values (float): The `width` values of the sample.
+        """
+
+        with self.lock:
+            end = (self.start + self.count) % self.capacity
+            row = self.rows[end]
+            row[0] = t
+            row[1:] = values
+            if self.count == self.capacity:
+                self.start = (self.start + 1) % self.capacity
+                self.dropped += 1
+            else:
+                self.count += 1
+            self.pushed += 1
+            self.latest = Snapshot(self.pushed, t, tuple(values))
+        if self.notify is not None:
+            self.notify.set()
+
+    def extend(self, t, values):
+        """
+        Adds several samples at once.
+
+        If the stream overflows, the oldest waiting samples are overwritten and counted in `dropped`.
+
+        Args:
+        t (sequence): Monotonic time at which each sample was received, in seconds.
+        values (numpy.ndarray): Values of the samples, of shape (len(t), width).
+        """
+
+        count = len(values)
+        if count == 0:
+            return
+        with self.lock:
+            end = (self.start + self.count) % self.capacity
+            first = 0
+            while first < count:
+                rows = self.rows[end:end + count - first]
+                last = first + len(rows)
+                rows[:, 0] = t[first:last]
+                rows[:, 1:] = values[first:last]
+                end = (end + len(rows)) % self.capacity
+                first = last
+            overflow = max(self.count + count - self.capacity, 0)
+            self.start = (self.start + overflow) % self.capacity
+            self.count = min(self.count + count, self.capacity)
+            self.pushed += count
+            self.dropped += overflow
+            self.latest = Snapshot(self.pushed, t[count - 1], tuple(values[count - 1].tolist()))
+        if self.notify is not None:
+            self.notify.set()
+
+    def drain(self):
+        """
+        Returns the waiting samples and empties the stream.
+
+        Returns:
+        numpy.ndarray: Array of shape (n, width + 1), oldest sample first (n may be 0).
+        """
+
+        with self.lock:
+            end = self.start + self.count
+            if end <= self.capacity:
+                samples = self.rows[self.start:end].copy()
+            else:
+                samples = np.concatenate((self.rows[self.start:], self.rows[:end - self.capacity]))
+            self.start = end % self.capacity
+            self.count = 0
+        return samples
+
+    def snapshot(self):
+        """
+        Returns the last sample pushed, without waiting for the reader thread of the device.
+
+        Returns:
+        Snapshot: The sample, with its sequence number and its time (None before the first sample).
+        """
+
+        return self.latest
+
+    def changed(self, sequence):
+        """
+        Checks whether a sample was pushed after a sequence number.
+
+        Args:
+        sequence (int): Sequence number of a snapshot read before.
+
+        Returns:
+        bool: True if a newer sample was pushed.
+        """
+
+        return self.latest.sequence != sequence
@@ -0,0 +1,218 @@
+"""
+Ring buffer of telemetry samples in shared memory, written by the acquisition daemon and read
+by the Django workers.
+
+The segment starts with a header of int64 fields, followed by `capacity` rows of float64. There
+is a single writer, which reserves the rows it is about to write, copies them, then advances
+the count, and any number of readers, which never lock: a reader copies the rows it has not
+seen, then checks the reservation and discards the rows that the writer may have overwritten
+meanwhile. The header also carries the
+state of the station (session, shot, stale devices) and a heartbeat of the daemon.
+"""
+
+import time
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+MAGIC = 0x52544952  # "RTIR"
+
+# Header fields
+HEADER_MAGIC = 0
+HEADER_CAPACITY = 1
+HEADER_WIDTH = 2
+HEADER_COUNT = 3
+HEADER_SESSION = 4
+HEADER_SHOT = 5
+HEADER_STALE = 6
+HEADER_HEARTBEAT = 7
+HEADER_RESERVED = 8
+HEADER_FIELDS = 9
+
+# No session yet, in the session field
+NO_SESSION = -1
+
+def ring_name(prefix, station):
+    return "%s-%s" % (prefix, station)
+
+class SharedRing:
+    """
+    Ring of float64 rows in a named shared memory segment.
+
+    Attributes:
+    name (str): Name of the shared memory segment.
+    capacity (int): Number of rows kept.
+    width (int): Number of values of a row.
+    owner (bool): True in the process that created the segment (the writer), which removes it on close.
+
+    Methods:
+    create(name, capacity, width): Creates the segment, replacing a segment left by a dead writer.
+    attach(name): Opens an existing segment.
+    append(rows): Writes rows (writer only).
+    publish(session, shot, stale): Writes the state of the station and the heartbeat (writer only).
+    count(): Returns the number of rows written since the segment was created.
+    since(cursor): Returns the rows written after a count.
+    latest(n): Returns the last rows written.
+    state(): Returns the state of the station and the age of the heartbeat.
+    close(): Releases the segment, and removes it in the writer.
+    """
+
+    def __init__(self, memory, owner):
+        self.memory = memory
+        self.owner = owner
+        self.name = memory.name
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=memory.buf)
+        if self.header[HEADER_MAGIC] != MAGIC:
+            raise ValueError("Shared memory %s is not a telemetry ring" % self.name)
+        self.capacity = int(self.header[HEADER_CAPACITY])
+        self.width = int(self.header[HEADER_WIDTH])
+        self.rows = np.ndarray((self.capacity, self.width), dtype=np.float64, buffer=memory.buf, offset=HEADER_FIELDS * 8)
+
+    @classmethod
+    def create(cls, name, capacity, width):
+        size = HEADER_FIELDS * 8 + capacity * width * 8
+        try:
+            memory = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # Left by a daemon that did not exit cleanly
+            old = shared_memory.SharedMemory(name)
+            old.close()
+            old.unlink()
+            memory = shared_memory.SharedMemory(name, create=True, size=size)
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=memory.buf)
+        header[:] = 0
+        header[HEADER_CAPACITY] = capacity
+        header[HEADER_WIDTH] = width
+        header[HEADER_SESSION] = NO_SESSION
+        header[HEADER_MAGIC] = MAGIC
+        return cls(memory, True)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Opens an existing segment.
+
+        Raises:
+        FileNotFoundError: If no writer created it.
+        """
+
+        memory = shared_memory.SharedMemory(name)
+        # Before Python 3.13, the resource tracker removes the segments a process opened when it
+        # exits, which would remove the ring of the running daemon
+        try:
+            resource_tracker.unregister(memory._name, "shared_memory")
+        except Exception:
+            pass
+        return cls(memory, False)
+
+    def append(self, rows):
+        """
+        Writes rows, the oldest ones being overwritten when the ring is full.
+
+        Args:
+        rows (numpy.ndarray): Rows of shape (n, width).
+        """
+
+        count = int(self.header[HEADER_COUNT])
+        if len(rows) > self.capacity:
+            count += len(rows) - self.capacity
+            rows = rows[-self.capacity:]
+        self.header[HEADER_RESERVED] = count + len(rows)
+        start = count % self.capacity
+        first = min(len(rows), self.capacity - start)
+        self.rows[start:start + first] = rows[:first]
+        self.rows[:len(rows) - first] = rows[first:]
+        self.header[HEADER_COUNT] = count + len(rows)
+
+    def publish(self, session, shot, stale):
+        """
+        Writes the state of the station and the heartbeat of the writer.
+
+        Args:
+        session (int or None): ID of the session.
+        shot (int): ID of the next shot.
+        stale (int): STALE_* bits of the devices whose link is down.
+        """
+
+        self.header[HEADER_SESSION] = NO_SESSION if session is None else session
+        self.header[HEADER_SHOT] = shot
+        self.header[HEADER_STALE] = stale
+        self.header[HEADER_HEARTBEAT] = time.monotonic_ns()
+
+    def count(self):
+        return int(self.header[HEADER_COUNT])
+
+    def since(self, cursor):
+        """
+        Returns the rows written after a count.
+
+        Args:
+        cursor (int): Count returned by the previous call (or by count()).
+
+        Returns:
+        tuple: (rows, cursor, lost) the rows written since, oldest first, the count to give to the
+               next call, and the number of rows overwritten before they could be read.
+        """
+
+        count = int(self.header[HEADER_COUNT])
+        first = max(cursor, count - self.capacity)
+        rows = self.read(first, count)
+        # The writer may have gone round the ring while the rows were copied
+        oldest = int(self.header[HEADER_RESERVED]) - self.capacity
+        if oldest > first:
+            rows = rows[oldest - first:]
+            first = min(oldest, count)
+        return rows, count, first - cursor
+
+    def latest(self, n):
+        """
+        Returns the last rows written.
+
+        Args:
+        n (int): Number of rows, at most `capacity`.
+
+        Returns:
+        numpy.ndarray: Up to n rows, oldest first.
+        """
+
+        count = int(self.header[HEADER_COUNT])
+        return self.since(max(count - n, 0))[0]
+
+    def read(self, first, end):
+        if end <= first:
+            return np.empty((0, self.width))
+        start = first % self.capacity
+        stop = end % self.capacity
+        if start < stop:
+            return self.rows[start:stop].copy()
+        return np.concatenate((self.rows[start:], self.rows[:stop]))
+
+    def state(self):
+        """
+        Returns the state of the station and the age of the heartbeat.
+
+        Returns:
+        dict: session (int or None), shot, stale and age (seconds since the last publish, None if never).
+        """
+
+        session = int(self.header[HEADER_SESSION])
+        heartbeat = int(self.header[HEADER_HEARTBEAT])
+        return {
+            'session': None if session == NO_SESSION else session,
+            'shot': int(self.header[HEADER_SHOT]),
+            'stale': int(self.header[HEADER_STALE]),
+            'age': (time.monotonic_ns() - heartbeat) / 1e9 if heartbeat else None,
+        }
+
+    def close(self):
+        """
+        Releases the segment, and removes it in the writer.
+        """
+
+        self.header = None
+        self.rows = None
+        self.memory.close()
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,313 @@
+import bisect
+import json
+import os
+import time
+import numpy as np
+
+# Samples per chunk file: about 43 minutes of a 100 Hz device
+CHUNK_SAMPLES = 1 << 18
+# Streams recorded for each session, with the number of values of their samples
+STREAMS = {'wiiboard': 2, 'sensors': 4}
+
+def chunk_path(directory, name, number):
+    return os.path.join(directory, "%s-%05d.npy" % (name, number))
+
+def index_path(directory, name):
+    return os.path.join(directory, "%s.json" % name)
+
+def written_rows(chunk):
+    """
+    Counts the rows written in a chunk from their timestamps.
+
+    The chunks are preallocated with zeros and filled in order, and the monotonic times of the
+    samples are strictly positive, so the written rows are the ones before the first zero time.
+    Used for the chunk that was being written, whose count is not in the index if the recorder
+    was not closed. Only about log2(len(chunk)) rows are read.
+
+    Args:
+    chunk (numpy.ndarray): A chunk, time in the first column.
+
+    Returns:
+    int: Number of rows written.
+    """
+
+    low, high = 0, len(chunk)
+    while low < high:
+        middle = (low + high) // 2
+        if chunk[middle, 0] > 0:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+def refresh(entry, chunk):
+    """
+    Updates the index entry of a chunk from the rows actually written in it.
+
+    Returns:
+    int: Number of rows written.
+    """
+
+    entry['count'] = written_rows(chunk)
+    if entry['count']:
+        entry['first'] = float(chunk[0, 0])
+        entry['last'] = float(chunk[entry['count'] - 1, 0])
+    return entry['count']
+
+class StreamRecorder:
+    """
+    Records every sample of one device to preallocated, memory-mapped binary files.
+
+    The samples are appended to chunks of `chunk_samples` rows (float64, time first), stored as
+    .npy files created at their full size when the previous one is full, so appending a batch of
+    samples is a copy into the mapped memory, without any system call. The operating system
+    writes the pages to the disk in the background. An index (<name>.json) gives the time range
+    of each chunk, so that StreamReader only opens the chunks it needs.
+
+    Attributes:
+    directory (str): Directory of the chunks and the index.
+    name (str): Name of the stream, prefix of its files.
+    width (int): Number of values of a sample, without the timestamp.
+    chunk_samples (int): Number of samples of a chunk.
+    chunks (list): Index entries of the chunks: file, number of samples, times of the first and last samples.
+    chunk (numpy.memmap or None): Chunk being written.
+    count (int): Number of samples written in the current chunk.
+    recorded (int): Number of samples recorded since the recorder was created.
+    gaps (list): [start, end] monotonic times during which the link to the device was down.
+    epoch (float): Wall-clock time of the monotonic time 0, to date the samples.
+
+    Methods:
+    append(rows): Records a batch of samples.
+    addGap(start, end): Records a time during which the link to the device was down.
+    flush(): Writes the mapped pages and the index to the disk.
+    close(): Flushes and releases the current chunk.
+    """
+
+    def __init__(self, directory, name, width, chunk_samples=CHUNK_SAMPLES):
+        self.directory = directory
+        self.name = name
+        self.width = width
+        self.chunk_samples = chunk_samples
+        self.chunks = []
+        self.chunk = None
+        self.count = 0
+        self.recorded = 0
+        self.gaps = []
+        # Wall-clock time of the monotonic time 0, to date the samples
+        self.epoch = time.time() - time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+
+        # Continue a stream recorded before, for example after a restart of the measurement
+        if os.path.exists(index_path(directory, name)):
+            with open(index_path(directory, name)) as file:
+                index = json.load(file)
+            self.chunks = index['chunks']
+            self.gaps = index.get('gaps', [])
+            # The samples already on disk stay dated as when they were recorded
+            self.epoch = index['epoch']
+            if self.chunks:
+                refresh(self.chunks[-1], np.load(os.path.join(directory, self.chunks[-1]['file']), mmap_mode='r'))
+
+    def open_chunk(self):
+        path = chunk_path(self.directory, self.name, len(self.chunks))
+        self.chunk = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(self.chunk_samples, self.width + 1))
+        self.count = 0
+        self.chunks.append({'file': os.path.basename(path), 'count': 0, 'first': None, 'last': None})
+
+    def append(self, rows):
+        """
+        Records a batch of samples.
+
+        Args:
+        rows (numpy.ndarray): Samples of shape (n, width + 1), time first, oldest first.
+        """
+
+        first = 0
+        while first < len(rows):
+            if self.chunk is None or self.count == self.chunk_samples:
+                self.rotate()
+            last = min(len(rows), first + self.chunk_samples - self.count)
+            self.chunk[self.count:self.count + last - first] = rows[first:last]
+            entry = self.chunks[-1]
+            if entry['first'] is None:
+                entry['first'] = float(rows[first, 0])
+            entry['last'] = float(rows[last - 1, 0])
+            self.count += last - first
+            entry['count'] = self.count
+            first = last
+        self.recorded += len(rows)
+
+    def addGap(self, start, end):
+        """
+        Records a time during which the link to the device was down, written with the index.
+
+        Args:
+        start (float): Monotonic time at which the link was lost, in seconds.
+        end (float): Monotonic time at which it was recovered, in seconds.
+        """
+
+        self.gaps.append([start, end])
+        self.write_index()
+
+    def rotate(self):
+        """
+        Closes the current chunk, if any, and creates the next one.
+        """
+
+        if self.chunk is not None:
+            self.flush()
+            self.chunk = None
+        self.open_chunk()
+        self.write_index()
+
+    def write_index(self):
+        index = {
+            'name': self.name,
+            'width': self.width,
+            'chunk_samples': self.chunk_samples,
+            'epoch': self.epoch,
+            'chunks': self.chunks,
+            'gaps': self.gaps,
+        }
+        path = index_path(self.directory, self.name)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(index, file)
+        os.replace(path + '.tmp', path)
+
+    def flush(self):
+        """
+        Writes the mapped pages and the index to the disk.
+        """
+
+        if self.chunk is not None:
+            self.chunk.flush()
+            self.write_index()
+
+    def close(self):
+        """
+        Flushes and releases the current chunk.
+        """
+
+        self.flush()
+        self.chunk = None
+
+class SessionRecorder:
+    """
+    Records the samples of every device during a session, one StreamRecorder per device.
+
+    Attributes:
+    directory (str): Directory of the session.
+    streams (dict): StreamRecorder of each device, by name.
+
+    Methods:
+    record(name, rows): Records a batch of samples of a device.
+    recordGap(name, start, end): Records a time during which the link to a device was down.
+    flush(): Writes every stream to the disk.
+    close(): Closes every stream.
+    """
+
+    def __init__(self, directory, streams=STREAMS, chunk_samples=CHUNK_SAMPLES):
+        self.directory = directory
+        self.streams = {name: StreamRecorder(directory, name, width, chunk_samples) for name, width in streams.items()}
+
+    def record(self, name, rows):
+        """
+        Records a batch of samples of a device (nothing is done if the batch is empty).
+
+        Args:
+        name (str): Name of the device, as in STREAMS.
+        rows (numpy.ndarray): Samples of shape (n, width + 1), time first.
+        """
+
+        if len(rows):
+            self.streams[name].append(rows)
+
+    def recordGap(self, name, start, end):
+        self.streams[name].addGap(start, end)
+
+    def flush(self):
+        for stream in self.streams.values():
+            stream.flush()
+
+    def close(self):
+        for stream in self.streams.values():
+            stream.close()
+
+class StreamReader:
+    """
+    Reads the samples of a stream recorded by StreamRecorder, by time range.
+
+    Only the chunks overlapping the range are mapped, and the first and last samples of the range
+    are found by binary search on the time column, so a slice costs the copy of its own samples
+    whatever the length of the recording.
+
+    Attributes:
+    directory (str): Directory of the chunks and the index.
+    name (str): Name of the stream.
+    width (int): Number of values of a sample, without the timestamp.
+    epoch (float): Wall-clock time of the monotonic time 0 when the recording started.
+    chunks (list): Index entries of the chunks.
+    gaps (list): [start, end] monotonic times during which the link to the device was down.
+
+    Methods:
+    time_range(): Returns the times of the first and last recorded samples.
+    slice(start, end): Returns the samples recorded between two times.
+    """
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        with open(index_path(directory, name)) as file:
+            index = json.load(file)
+        self.width = index['width']
+        self.epoch = index['epoch']
+        self.chunks = index['chunks']
+        self.gaps = index.get('gaps', [])
+        self.mapped = {}
+
+        # The last chunk may have been written after the index, if the recorder was not closed
+        if self.chunks:
+            if not refresh(self.chunks[-1], self.map(len(self.chunks) - 1)):
+                self.chunks.pop()
+
+    def map(self, number):
+        if number not in self.mapped:
+            self.mapped[number] = np.load(os.path.join(self.directory, self.chunks[number]['file']), mmap_mode='r')
+        return self.mapped[number]
+
+    def time_range(self):
+        """
+        Returns the times of the first and last recorded samples.
+
+        Returns:
+        tuple or None: (first, last) monotonic times in seconds, None if nothing was recorded.
+        """
+
+        if not self.chunks:
+            return None
+        return self.chunks[0]['first'], self.chunks[-1]['last']
+
+    def slice(self, start, end):
+        """
+        Returns the samples recorded between two times.
+
+        Args:
+        start (float): Monotonic time of the first sample, in seconds (included).
+        end (float): Monotonic time of the last sample, in seconds (excluded).
+
+        Returns:
+        numpy.ndarray: Copy of the samples, of shape (n, width + 1), time first.
+        """
+
+        parts = []
+        for number, entry in enumerate(self.chunks):
+            if entry['last'] < start or entry['first'] >= end:
+                continue
+            # bisect reads only the rows it compares, where np.searchsorted would copy the strided column
+            times = self.map(number)[:entry['count'], 0]
+            first = bisect.bisect_left(times, start)
+            last = bisect.bisect_left(times, end, first)
+            parts.append(self.map(number)[first:last])
+        if not parts:
+            return np.empty((0, self.width + 1))
+        return np.concatenate(parts)
@@ -0,0 +1,211 @@
+import json
+import struct
+import threading
+import time
+import numpy as np
+
+# WebSocket subprotocols offered by the server, chosen by the client at connect time.
+PROTOCOL_BINARY = "rt.binary.v1"
+PROTOCOL_JSON = "rt.json"
+SUBPROTOCOLS = [PROTOCOL_BINARY, PROTOCOL_JSON]
+
+MAGIC = 0x5254          # "RT"
+VERSION = 1
+
+FRAME_BATCH = 2
+
+# Bits of the stale flags: the link to the device is down, its values in the samples are its last known ones
+STALE_WIIBOARD = 1
+STALE_SENSORS = 2
+
+# Values of a sample, in the order of the columns of a batch.
+SAMPLE_FIELDS = ('t', 'x', 'y', 'q0', 'q1', 'q2', 'q3')
+
+# Little-endian layout of the header of a batch frame (28 bytes):
+#   0  magic     uint16
+#   2  version   uint8
+#   3  type      uint8
+#   4  sequence  uint32
+#   8  session   uint32
+#  12  shot      uint32
+#  16  CoG flag  uint8
+#  17  stale     uint8, STALE_* bits
+#  18  count     uint16
+#  20  t0        float64, time of the first sample in seconds
+# followed by `count` samples of 7 float32: t - t0, x, y, q0, q1, q2, q3.
+BATCH_HEADER = struct.Struct('<HBBIIIBBHd')
+SAMPLE_DTYPE = np.dtype('<f4')
+
+def encode_batch(data, sequence):
+    """
+    Packs a frame built by update_Measure into a binary batch frame.
+
+    Args:
+    data (dict): Frame with the keys samples (array of shape (n, 7)), CoG, sessionID and shotID,
+                 and optionally stale (STALE_* bits).
+    sequence (int): Sequence number of the frame.
+
+    Returns:
+    bytes: The encoded frame.
+    """
+
+    samples = data['samples']
+    t0 = float(samples[0, 0]) if len(samples) else 0.0
+    packed = samples.astype(SAMPLE_DTYPE)
+    packed[:, 0] = samples[:, 0] - t0
+    header = BATCH_HEADER.pack(
+        MAGIC, VERSION, FRAME_BATCH,
+        sequence & 0xFFFFFFFF, data['sessionID'] or 0, data['shotID'] or 0, 1 if data['CoG'] else 0,
+        data.get('stale', 0), len(samples), t0,
+    )
+    return header + packed.tobytes()
+
+def decode_batch(message):
+    """
+    Unpacks a binary batch frame.
+
+    Args:
+    message (bytes): The encoded frame.
+
+    Returns:
+    dict: Frame with the keys seq, sessionID, shotID, CoG, stale and samples (array of shape (n, 7), absolute times).
+
+    Raises:
+    ValueError: If the header does not describe a batch frame of this version.
+    """
+
+    (magic, version, frame_type, sequence, session, shot, cog, stale,
+     count, t0) = BATCH_HEADER.unpack_from(message)
+    if magic != MAGIC or version != VERSION or frame_type != FRAME_BATCH:
+        raise ValueError("Not a version %d batch frame" % VERSION)
+    samples = np.frombuffer(message, SAMPLE_DTYPE, count * len(SAMPLE_FIELDS), BATCH_HEADER.size)
+    samples = samples.reshape(count, len(SAMPLE_FIELDS)).astype(np.float64)
+    samples[:, 0] += t0
+    return {'samples': samples, 'CoG': cog, 'stale': stale, 'sessionID': session, 'shotID': shot, 'seq': sequence}
+
+def encode_json(data, sequence):
+    """
+    Converts a frame built by update_Measure into JSON text.
+
+    The latest sample is also given as x, y, q0, q1, q2 and q3 for the clients that only show the current value.
+
+    Args:
+    data (dict): Frame with the keys samples, CoG, sessionID and shotID, and optionally stale.
+    sequence (int): Sequence number of the frame.
+
+    Returns:
+    str: The encoded frame.
+    """
+
+    samples = data['samples']
+    message = {'seq': sequence, 'CoG': data['CoG'], 'stale': data.get('stale', 0), 'sessionID': data['sessionID'],
+               'shotID': data['shotID'], 'samples': samples.tolist()}
+    if len(samples):
+        message.update(zip(SAMPLE_FIELDS[1:], samples[-1, 1:].tolist()))
+    return json.dumps(message)
+
+class FrameEncoder:
+    """
+    Encodes one frame at most once per format, whatever the number of clients using that format.
+
+    Attributes:
+    data (dict): Frame to encode.
+    sequence (int): Sequence number of the frame.
+
+    Methods:
+    encode(protocol): Returns the frame encoded for the given subprotocol.
+    """
+
+    def __init__(self, data, sequence):
+        self.data = data
+        self.sequence = sequence
+        self.messages = {}
+
+    def encode(self, protocol):
+        """
+        Returns the frame encoded for the given subprotocol.
+
+        Args:
+        protocol (str or None): Subprotocol negotiated by the client, None for clients that did not ask for one.
+
+        Returns:
+        bytes or str: Binary frame for PROTOCOL_BINARY, JSON text otherwise.
+        """
+
+        binary = protocol == PROTOCOL_BINARY
+        message = self.messages.get(binary)
+        if message is None:
+            if binary:
+                message = encode_batch(self.data, self.sequence)
+            else:
+                message = encode_json(self.data, self.sequence)
+            self.messages[binary] = message
+        return message
+
+class SampleBatch:
+    """
+    Collects the samples produced between two frames so that they can be sent in one message.
+
+    Samples are written by the acquisition thread and drained by the broadcaster on the
+    WebSocket server's event loop.
+
+    Attributes:
+    capacity (int): Maximum number of samples kept between two frames.
+    rows (numpy.ndarray): Preallocated storage of shape (capacity, 7), used as a ring.
+    start (int): Row of the oldest waiting sample.
+    count (int): Number of samples waiting to be sent.
+    dropped (int): Number of samples overwritten because nobody drained the batch in time.
+    epoch (float): Monotonic time subtracted from the sample timestamps.
+
+    Methods:
+    push(t, x, y, q0, q1, q2, q3): Adds a sample to the batch.
+    drain(): Returns the waiting samples and empties the batch.
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.rows = np.zeros((capacity, len(SAMPLE_FIELDS)))
+        self.start = 0
+        self.count = 0
+        self.dropped = 0
+        self.epoch = time.monotonic()
+        self.lock = threading.Lock()
+
+    def push(self, t, x, y, q0, q1, q2, q3):
+        """
+        Adds a sample to the batch.
+
+        If the batch is full, the new sample overwrites the oldest one, so that the newest ones are kept.
+
+        Args:
+        t (float): Monotonic time of the sample, in seconds.
+        x, y (float): Center of gravity.
+        q0, q1, q2, q3 (float): Quaternion.
+        """
+
+        with self.lock:
+            if self.count == self.capacity:
+                self.rows[self.start] = (t - self.epoch, x, y, q0, q1, q2, q3)
+                self.start = (self.start + 1) % self.capacity
+                self.dropped += 1
+            else:
+                self.rows[(self.start + self.count) % self.capacity] = (t - self.epoch, x, y, q0, q1, q2, q3)
+                self.count += 1
+
+    def drain(self):
+        """
+        Returns the waiting samples and empties the batch.
+
+        Returns:
+        numpy.ndarray: Array of shape (n, 7), oldest sample first (n may be 0).
+        """
+
+        with self.lock:
+            end = self.start + self.count
+            if end <= self.capacity:
+                samples = self.rows[self.start:end].copy()
+            else:
+                samples = np.concatenate((self.rows[self.start:], self.rows[:end - self.capacity]))
+            self.start = 0
+            self.count = 0
+        return samples
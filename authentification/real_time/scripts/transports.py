@@ -0,0 +1,499 @@
+"""
+Transports used by the device readers to reach the Wiiboard and the ESP32.
+
+A transport discovers a device by name and opens its sockets. The readers (Wiiboard and
+BluetoothReader) only use the socket methods (recv, recv_into, send, settimeout, fileno,
+close), so the same readers work with:
+- BluetoothTransport: the real devices, through PyBluez.
+- SimulatorTransport: synthetic devices sending byte-exact Wiiboard reports and ESP32 frames.
+- ReplayTransport: the bytes of a capture recorded with RecordingTransport, replayed at 1x or faster.
+
+The simulated and replayed devices write into local socket pairs, so nothing else than the
+transport changes between a build machine and the shooting range.
+"""
+
+import math
+import socket
+import struct
+import threading
+import time
+import numpy as np
+
+try:
+    import bluetooth
+except ImportError:
+    bluetooth = None
+
+WIIBOARD = 0
+SENSORS = 1
+
+# Bytes sent by the ESP32 (sendData): microphone peak-to-peak amplitude, then the quaternion q0..q3
+ESP32_FRAME = struct.Struct('<I4f')
+# Raw values of the sensors of the simulated Wiiboard at 0, 17 and 34 kg (TR, BR, TL, BL)
+SIMULATED_CALIBRATION = [4950, 17030, 3370, 6600, 6720, 18790, 5160, 8380, 8500, 20570, 6970, 10190]
+SIMULATED_ADDRESS = "00:00:00:00:00:00"
+
+CAPTURE_MAGIC = b"RTCAPTURE1\n"
+CAPTURE_RECORD = struct.Struct('<dBI')
+
+class BluetoothTransport:
+    """
+    Transport to the real devices, through PyBluez.
+
+    Methods:
+    discover(name): Returns the address of a nearby device.
+    discoverAll(names): Returns the addresses of several nearby devices, with a single inquiry.
+    openWiiboard(address): Opens the receive and control sockets of a Wiiboard.
+    openSensors(address): Opens the socket of the ESP32.
+    """
+
+    name = "bluetooth"
+
+    def module(self):
+        """
+        Returns the PyBluez module, which is only needed by this transport.
+        """
+
+        if bluetooth is None:
+            raise Exception("Error: PyBluez is not installed, use the simulator or replay transport")
+        return bluetooth
+
+    def discover(self, name, duration=3):
+        """
+        Returns the address of a nearby device.
+
+        Args:
+        name (str): Bluetooth name of the device.
+        duration (int): Duration of the inquiry, in seconds.
+
+        Returns:
+        str or None: Bluetooth address of the device, or None if it was not found.
+        """
+
+        return self.discoverAll([name], duration).get(name)
+
+    def discoverAll(self, names, duration=3):
+        """
+        Returns the addresses of several nearby devices, with a single inquiry.
+
+        Args:
+        names (list): Bluetooth names of the devices.
+        duration (int): Duration of the inquiry, in seconds.
+
+        Returns:
+        dict: Address of each device found, by name.
+        """
+
+        found = {}
+        for address, deviceName in self.module().discover_devices(duration=duration, lookup_names=True):
+            if deviceName in names and deviceName not in found:
+                found[deviceName] = address
+        return found
+
+    def openWiiboard(self, address):
+        """
+        Opens the receive and control sockets of a Wiiboard.
+
+        Args:
+        address (str): Bluetooth address of the Wiiboard.
+
+        Returns:
+        tuple: (receive socket, control socket).
+        """
+
+        bt = self.module()
+        try:
+            receivesocket = bt.BluetoothSocket(bt.L2CAP)
+            controlsocket = bt.BluetoothSocket(bt.L2CAP)
+        except ValueError:
+            raise Exception("Error: Bluetooth not found")
+
+        receivesocket.connect((address, 0x13))
+        receivesocket.settimeout(2)
+        controlsocket.connect((address, 0x11))
+        return receivesocket, controlsocket
+
+    def openSensors(self, address):
+        """
+        Opens the socket of the ESP32.
+
+        Args:
+        address (str): Bluetooth address of the ESP32.
+
+        Returns:
+        bluetooth.BluetoothSocket: The connected RFCOMM socket.
+        """
+
+        bt = self.module()
+        sensorsocket = bt.BluetoothSocket(bt.RFCOMM)
+        sensorsocket.connect((address, 1))
+        sensorsocket.settimeout(2)
+        return sensorsocket
+
+class DeviceThread:
+    """
+    Thread writing the bytes of a simulated or replayed device into its end of a socket pair.
+
+    The thread stops when the reader closes its end of the pair.
+
+    Attributes:
+    device (socket.socket): End of the socket pair written by the device.
+    reader (socket.socket): End of the socket pair given to the reader.
+
+    Methods:
+    start(): Starts the thread, once.
+    run(): Calls the target with the device end of the pair until it returns or the pair is closed.
+    """
+
+    def __init__(self, kind, target):
+        self.device, self.reader = socket.socketpair(socket.AF_UNIX, kind)
+        self.reader.settimeout(2)
+        self.target = target
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def run(self):
+        try:
+            self.target(self.device)
+        except OSError:
+            pass
+        finally:
+            self.device.close()
+
+def paced(rate, speed=1.0):
+    """
+    Yields the times at which periodic samples are due, sleeping until each of them.
+
+    Args:
+    rate (float): Number of samples per second.
+    speed (float): Replay speed, the samples are due `speed` times faster.
+
+    Yields:
+    float: Time of the sample since the start, at 1x, in seconds.
+    """
+
+    start = time.monotonic()
+    index = 0
+    while True:
+        t = index / rate
+        delay = start + t / speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        yield t
+        index += 1
+
+class SimulatedWiiboard:
+    """
+    Control socket of a simulated Wiiboard.
+
+    Answers the commands sent by Wiiboard: the calibration read is answered with two 0x21
+    reports, and the request of continuous reporting starts the stream of 0x32 reports.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.closed = False
+
+    def send(self, data):
+        if self.closed:
+            raise OSError("control socket closed")
+        command = data[1]
+        if command == 0x17 and data[3:6] == b"\xA4\x00\x24":
+            raw = b"".join(value.to_bytes(2, "big") for value in SIMULATED_CALIBRATION)
+            self.stream.device.send(b"\xA1\x21\x00\x00\xF0\x00\x24" + raw[:16])
+            self.stream.device.send(b"\xA1\x21\x00\x00\x70\x00\x34" + raw[16:] + bytes(8))
+        elif command == 0x12 and data[3] == 0x32:
+            self.stream.start()
+        return len(data)
+
+    def close(self):
+        self.closed = True
+
+class SimulatorTransport:
+    """
+    Transport to synthetic devices.
+
+    The Wiiboard reports the weights of a person swaying around the center of the board (two
+    slow sines plus noise), and the ESP32 sends a slowly rotating quaternion and a quiet
+    microphone with a shot every `shot_interval` seconds (a spike with a short rising edge).
+
+    Attributes:
+    rate (float): Reports per second of the Wiiboard.
+    sensor_rate (float): Frames per second of the ESP32.
+    mass (float): Mass of the simulated person, in kg.
+    sway (float): Amplitude of the sway of the center of mass, between 0 and 1.
+    sway_frequency (float): Frequency of the sway, in Hz.
+    noise (float): Standard deviation of the noise added to the center of mass.
+    shot_interval (float or None): Time between two shots, in seconds, or None for no shot.
+    """
+
+    name = "simulator"
+
+    SHOT = [350, 800, 1020, 960, 600, 250]
+
+    def __init__(self, rate=100, sensor_rate=100, mass=70, sway=0.05, sway_frequency=0.3, noise=0.005, shot_interval=15, seed=None):
+        self.rate = rate
+        self.sensor_rate = sensor_rate
+        self.mass = mass
+        self.sway = sway
+        self.sway_frequency = sway_frequency
+        self.noise = noise
+        self.shot_interval = shot_interval
+        self.random = np.random.default_rng(seed)
+
+    def discover(self, name, duration=3):
+        return SIMULATED_ADDRESS
+
+    def discoverAll(self, names, duration=3):
+        return {name: SIMULATED_ADDRESS for name in names}
+
+    def centerOfMass(self, t):
+        """
+        Returns the simulated center of mass at time t, in seconds.
+        """
+
+        phase = 2 * math.pi * self.sway_frequency * t
+        x = self.sway * math.sin(phase) + self.random.normal(0, self.noise)
+        y = self.sway * math.sin(0.7 * phase + 1) + self.random.normal(0, self.noise)
+        return x, y
+
+    def wiiboardReport(self, t):
+        """
+        Builds the 0x32 report of the simulated Wiiboard at time t, in seconds.
+        """
+
+        x, y = self.centerOfMass(t)
+        quarter = self.mass / 4
+        weights = (quarter * (1 + x + y), quarter * (1 + x - y), quarter * (1 - x + y), quarter * (1 - x - y))
+        report = bytearray(b"\xA1\x32\x00\x00")
+        for sensor, weight in enumerate(weights):
+            zero, middle, full = SIMULATED_CALIBRATION[sensor::4]
+            if weight < 17:
+                raw = zero + weight * (middle - zero) / 17
+            else:
+                raw = middle + (weight - 17) * (full - middle) / 17
+            report += int(round(raw)).to_bytes(2, "big")
+        return bytes(report)
+
+    def sensorFrame(self, t):
+        """
+        Builds the frame of the simulated ESP32 at time t, in seconds.
+        """
+
+        microphone = int(self.random.integers(20, 120))
+        if self.shot_interval:
+            index = int(round((t % self.shot_interval) * self.sensor_rate)) - int(self.shot_interval * self.sensor_rate) // 2
+            if 0 <= index < len(self.SHOT):
+                microphone = self.SHOT[index]
+
+        angle = 0.1 * math.sin(2 * math.pi * 0.2 * t)
+        axis = (0.6, 0.8, 0)
+        half = angle / 2
+        q = (math.cos(half), axis[0] * math.sin(half), axis[1] * math.sin(half), axis[2] * math.sin(half))
+        return ESP32_FRAME.pack(microphone, *q)
+
+    def openWiiboard(self, address):
+        def stream(device):
+            for t in paced(self.rate):
+                device.send(self.wiiboardReport(t))
+
+        thread = DeviceThread(socket.SOCK_SEQPACKET, stream)
+        return thread.reader, SimulatedWiiboard(thread)
+
+    def openSensors(self, address):
+        def stream(device):
+            for t in paced(self.sensor_rate):
+                device.sendall(self.sensorFrame(t))
+
+        thread = DeviceThread(socket.SOCK_STREAM, stream)
+        thread.start()
+        return thread.reader
+
+class ReplayTransport:
+    """
+    Transport replaying the bytes of a capture recorded with RecordingTransport.
+
+    Each device replays its own records, with their recorded timing divided by `speed`, from
+    the moment it is opened. The Wiiboard records start with its calibration reports, so the
+    commands of the reader do not need to be answered.
+
+    Attributes:
+    path (str): Path of the capture.
+    speed (float): Replay speed (1 for real time).
+    loop (bool): If True, the capture is replayed again when it ends.
+    records (dict): (time, bytes) records of each device, by device.
+    """
+
+    name = "replay"
+
+    def __init__(self, path, speed=1.0, loop=False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.records = readCapture(path)
+
+    def discover(self, name, duration=3):
+        return SIMULATED_ADDRESS
+
+    def discoverAll(self, names, duration=3):
+        return {name: SIMULATED_ADDRESS for name in names}
+
+    def replay(self, device, kind):
+        records = self.records[device]
+
+        def stream(device):
+            while True:
+                start = time.monotonic()
+                for t, data in records:
+                    delay = start + t / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    device.sendall(data)
+                if not self.loop:
+                    break
+
+        thread = DeviceThread(kind, stream)
+        thread.start()
+        return thread.reader
+
+    def openWiiboard(self, address):
+        return self.replay(WIIBOARD, socket.SOCK_SEQPACKET), NullControl()
+
+    def openSensors(self, address):
+        return self.replay(SENSORS, socket.SOCK_STREAM)
+
+class NullControl:
+    """
+    Control socket of a replayed Wiiboard, which ignores the commands.
+    """
+
+    def send(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+class RecordingSocket:
+    """
+    Socket recording every chunk of bytes received through it.
+    """
+
+    def __init__(self, sock, writer, device):
+        self.sock = sock
+        self.writer = writer
+        self.device = device
+
+    def recv(self, size, *flags):
+        data = self.sock.recv(size, *flags)
+        self.writer.write(self.device, data)
+        return data
+
+    def recv_into(self, buffer, size=0, *flags):
+        received = self.sock.recv_into(buffer, size, *flags)
+        self.writer.write(self.device, bytes(buffer[:received]))
+        return received
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+class CaptureWriter:
+    """
+    Writes the records of a capture: time since the start, device and bytes of each chunk received.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(CAPTURE_MAGIC)
+        self.starts = {}
+        self.lock = threading.Lock()
+
+    def write(self, device, data):
+        now = time.monotonic()
+        with self.lock:
+            start = self.starts.setdefault(device, now)
+            self.file.write(CAPTURE_RECORD.pack(now - start, device, len(data)))
+            self.file.write(data)
+            self.file.flush()
+
+def readCapture(path):
+    """
+    Reads a capture written by RecordingTransport.
+
+    Args:
+    path (str): Path of the capture.
+
+    Returns:
+    dict: List of (time, bytes) records of each device (WIIBOARD and SENSORS).
+    """
+
+    records = {WIIBOARD: [], SENSORS: []}
+    with open(path, "rb") as file:
+        if file.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError("%s is not a capture" % path)
+        while True:
+            header = file.read(CAPTURE_RECORD.size)
+            if len(header) < CAPTURE_RECORD.size:
+                break
+            t, device, size = CAPTURE_RECORD.unpack(header)
+            records[device].append((t, file.read(size)))
+    return records
+
+class RecordingTransport:
+    """
+    Transport recording in a capture every byte received from the devices of another transport.
+
+    Attributes:
+    transport: The transport whose devices are recorded.
+    writer (CaptureWriter): Writer of the capture.
+    """
+
+    def __init__(self, transport, path):
+        self.transport = transport
+        self.writer = CaptureWriter(path)
+        self.name = transport.name
+
+    def discover(self, name, duration=3):
+        return self.transport.discover(name, duration)
+
+    def discoverAll(self, names, duration=3):
+        return self.transport.discoverAll(names, duration)
+
+    def openWiiboard(self, address):
+        receivesocket, controlsocket = self.transport.openWiiboard(address)
+        return RecordingSocket(receivesocket, self.writer, WIIBOARD), controlsocket
+
+    def openSensors(self, address):
+        return RecordingSocket(self.transport.openSensors(address), self.writer, SENSORS)
+
+TRANSPORTS = {
+    BluetoothTransport.name: BluetoothTransport,
+    SimulatorTransport.name: SimulatorTransport,
+    ReplayTransport.name: ReplayTransport,
+}
+
+def create(name="bluetooth", record=None, **options):
+    """
+    Creates a transport from its name, as given in the settings.
+
+    Args:
+    name (str): "bluetooth", "simulator" or "replay".
+    record (str or None): Path of a capture in which to record the received bytes, or None.
+    **options: Arguments of the transport (for example rate for the simulator, path and speed for the replay).
+
+    Returns:
+    The transport.
+
+    Raises:
+    ValueError: If the name is not a known transport.
+    """
+
+    if name not in TRANSPORTS:
+        raise ValueError("Unknown transport %r, expected one of %s" % (name, ", ".join(TRANSPORTS)))
+    transport = TRANSPORTS[name](**options)
+    if record:
+        transport = RecordingTransport(transport, record)
+    return transport
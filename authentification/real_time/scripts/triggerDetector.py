@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import deque
+
+class Shot:
+    """
+    A shot detected in the microphone signal.
+
+    Attributes:
+    index (int): Index of the onset sample among all the samples given to the detector.
+    time (float): Monotonic time at which the onset sample was received, in seconds.
+    detected (float): Monotonic time at which the shot was detected, in seconds.
+    amplitude (int): Amplitude of the sample that crossed the threshold.
+    """
+
+    def __init__(self, index, time, detected, amplitude):
+        self.index = index
+        self.time = time
+        self.detected = detected
+        self.amplitude = amplitude
+
+    @property
+    def latency(self):
+        """
+        Time between the reception of the onset sample and the detection, in seconds.
+        """
+
+        return self.detected - self.time
+
+class TriggerDetector:
+    """
+    Detects the shots in the stream of microphone amplitudes, sample by sample.
+
+    A shot is detected when the amplitude goes above `threshold`, at most once per `refractory`
+    seconds. The onset is then refined by going back over the previous samples while their
+    amplitude is above `onset * threshold`, so the shot is dated at the start of the rising edge
+    rather than at the sample that crossed the threshold. The shot is kept until the capture
+    stage takes it.
+
+    Attributes:
+    threshold (float): Amplitude above which a shot is detected.
+    refractory (float): Minimum time between two shots, in seconds.
+    onset (float): Fraction of the threshold above which the previous samples belong to the rising edge.
+    count (int): Number of samples given to the detector.
+    shots (int): Number of shots detected.
+    last_latency (float): Detection latency of the last shot, in seconds.
+    max_latency (float): Longest detection latency, in seconds.
+    latencies (collections.deque): Detection latency of the last shots, in seconds.
+
+    Methods:
+    update(t, amplitude): Gives a sample to the detector.
+    extend(t, amplitudes): Gives several samples to the detector.
+    take(): Returns the last shot detected and not taken yet.
+    stats(): Returns the detection statistics.
+    """
+
+    def __init__(self, threshold=1000, refractory=10, onset=0.5, history=32):
+        self.threshold = threshold
+        self.refractory = refractory
+        self.onset = onset
+        self.history = deque(maxlen=history)
+        self.count = 0
+        self.last = None
+        self.pending = None
+        self.lock = threading.Lock()
+
+        self.shots = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.latencies = deque(maxlen=1024)
+
+    def update(self, t, amplitude):
+        """
+        Gives a sample to the detector.
+
+        Args:
+        t (float): Monotonic time at which the sample was received, in seconds.
+        amplitude (int): Amplitude of the microphone.
+
+        Returns:
+        Shot or None: The shot if this sample triggered one.
+        """
+
+        self.history.append((t, amplitude))
+        self.count += 1
+        if amplitude <= self.threshold or (self.last is not None and t - self.last.time < self.refractory):
+            return None
+
+        # Go back to the start of the rising edge
+        level = self.onset * self.threshold
+        back = 1
+        while back < len(self.history) and self.history[-back - 1][1] > level:
+            back += 1
+        onset_time = self.history[-back][0]
+
+        shot = Shot(self.count - back, onset_time, time.monotonic(), amplitude)
+        with self.lock:
+            self.last = shot
+            self.pending = shot
+            self.shots += 1
+            self.last_latency = shot.latency
+            self.max_latency = max(self.max_latency, shot.latency)
+            self.latencies.append(shot.latency)
+        print("Shot detected at sample %d (%d samples before the threshold, latency %.1f ms)" % (shot.index, back - 1, 1000 * shot.latency))
+        return shot
+
+    def extend(self, t, amplitudes):
+        """
+        Gives several samples to the detector.
+
+        The samples are only examined one by one when one of them is above the threshold.
+
+        Args:
+        t (sequence): Monotonic time at which each sample was received, in seconds.
+        amplitudes (numpy.ndarray): Amplitudes of the microphone.
+        """
+
+        if amplitudes.max() <= self.threshold:
+            start = max(len(amplitudes) - self.history.maxlen, 0)
+            self.history.extend(zip(t[start:], amplitudes[start:].tolist()))
+            self.count += len(amplitudes)
+            return
+        for sample in zip(t, amplitudes.tolist()):
+            self.update(*sample)
+
+    def take(self):
+        """
+        Returns the last shot detected and not taken yet.
+
+        Returns:
+        Shot or None: The shot, which is then no longer pending.
+        """
+
+        with self.lock:
+            shot = self.pending
+            self.pending = None
+        return shot
+
+    def stats(self):
+        """
+        Returns the detection statistics.
+
+        Returns:
+        dict: samples, shots, last_latency and max_latency.
+        """
+
+        return {
+            'samples': self.count,
+            'shots': self.shots,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+        }
@@ -1,11 +1,16 @@
 import sys
-import bluetooth
 import threading
 import time
-import pygame
+import importlib
+import select
 import socket 
+from real_time.scripts.sampleStream import SampleStream
+from real_time.scripts.wiiboardDecoder import ReportDecoder, SENSOR_BYTES
+from real_time.scripts.transports import BluetoothTransport
+from real_time.scripts.deviceLink import DeviceLink
 
-base = pygame.USEREVENT
+# Events published to the subscribers (offset by pygame.USEREVENT when posted to pygame)
+base = 0
 WIIBOARD_BUTTON_PRESS = base + 1
 WIIBOARD_BUTTON_RELEASE = base + 2
 WIIBOARD_MASS = base + 3
@@ -18,7 +23,47 @@ COMMAND_REQUEST_STATUS = 15
 COMMAND_REGISTER = 16
 COMMAND_READ_REGISTER = 17
 
+REPORT_STATUS = 0x20
+REPORT_READ_DATA = 0x21
+REPORT_BUTTONS_EXTENSION = 0x32
+CONTINUOUS = "04"
+
 BUTTON_DOWN_MASK = 8
+REPORT_BATCH = 32
+
+def buildCommand(command, *payload):
+	"""
+    Builds the bytes of a command sent to the Wiiboard.
+
+    Args:
+    command (int): One of the COMMAND_* codes, written with the digits of its hexadecimal value.
+    *payload (str): Bytes of the command, in hexadecimal.
+
+    Returns:
+    bytes: The complete output report, ready to be sent on the control socket.
+    """
+
+	return bytes.fromhex("52" + str(command) + "".join(payload))
+
+def centerOfMass(topLeft, topRight, bottomLeft, bottomRight):
+	"""
+    Computes the center of mass from the weights on the four sensors.
+
+    Returns:
+    tuple: (CoMx, CoMy), both in [-1, 1], or (0, 0) when the board is empty.
+    """
+
+	total = topLeft + topRight + bottomLeft + bottomRight
+	if total == 0:
+		return 0, 0
+	return ((topRight + bottomRight) - (topLeft + bottomLeft))/total, ((topRight + topLeft) - (bottomRight + bottomLeft))/total
+
+# Commands are built once, so sending one is a single socket call
+LIGHT_ON = buildCommand(COMMAND_LIGHT, "10")
+LIGHT_OFF = buildCommand(COMMAND_LIGHT, "00")
+ENABLE_EXTENSION = buildCommand(COMMAND_REGISTER, "04", "A4", "00", "40", "01", "00" * 16)
+READ_CALIBRATION = buildCommand(COMMAND_READ_REGISTER, "04", "A4", "00", "24", "00", "18")
+CONTINUOUS_REPORTING = buildCommand(COMMAND_REPORTING, CONTINUOUS, "%02X" % REPORT_BUTTONS_EXTENSION)
 
 BLUETOOTH_NAME = "Nintendo RVL-WBC-01"
 
@@ -46,26 +91,33 @@ class BoardEvent:
 		self.buttonPressed = buttonPressed
 		self.buttonReleased = buttonReleased
 		self.totalWeight = topLeft + topRight + bottomLeft + bottomRight
-		try : 
-			self.CoMx = ((topRight + bottomRight) - (topLeft + bottomLeft))/(topRight + bottomRight + topLeft + bottomLeft)
-			self.CoMy = ((topRight + topLeft) - (bottomRight + bottomLeft))/(topRight + bottomRight + topLeft + bottomLeft)
-		except : 
-			self.CoMx = 0
-			self.CoMy = 0
+		self.CoMx, self.CoMy = centerOfMass(topLeft, topRight, bottomLeft, bottomRight)
 
 class Wiiboard:
 	"""
     Represents a Wiiboard and handles communication with it over Bluetooth.
 
+    The decoded samples and the button and connection events are delivered to the functions
+    registered with subscribe(), directly from the receive thread. Unless the Wiiboard is
+    headless, the events are also posted to the pygame event queue as before, as BoardEvent
+    masses with the type `pygame.USEREVENT + WIIBOARD_*`.
+
     Attributes:
-    receivesocket (bluetooth.BluetoothSocket or None): Socket for receiving data from Wiiboard.
-    controlsocket (bluetooth.BluetoothSocket or None): Socket for sending commands to Wiiboard.
+    transport: Transport used to discover the Wiiboard and open its sockets (see real_time.scripts.transports).
+    cache (DeviceCache or None): Cache of the calibrations of the Wiiboards met before.
+    receivesocket (socket or None): Socket for receiving data from Wiiboard.
+    controlsocket (socket or None): Socket for sending commands to Wiiboard.
     calibration (list): Calibration data for sensors.
+    decoder (ReportDecoder or None): Decoder of the sensor bytes, built from the calibration.
+    calibrated (threading.Event): Set once the Wiiboard connected last is calibrated.
     LED (bool): State of the LED on the Wiiboard.
     address (str or None): Bluetooth address of the connected Wiiboard.
     buttonDown (bool): Indicates if the button is currently pressed.
-    status (str): Current connection status ("Connected" or "Disconnected").
-    lastEvent (BoardEvent): Last event received from the Wiiboard.
+    status (str): Current connection status ("Connected", "Reconnecting" after a loss of the link, or "Disconnected").
+    link (DeviceLink): State of the link: stale while it is down, and the gaps of the samples.
+    samples (SampleStream): Timestamped center of mass (CoMx, CoMy) of every report received.
+    subscribers (list): Functions called for every event of the Wiiboard.
+    pygame (module or None): The pygame module, or None when the Wiiboard is headless.
 
     Methods:
     isConnected(): Checks if the Wiiboard is currently connected.
@@ -74,24 +126,43 @@ class Wiiboard:
     discover(): Attempts to discover a Wiiboard nearby.
     wait(millis): Pauses execution for the specified milliseconds.
     setLight(light): Turns the LED on or off on the Wiiboard.
-    send(data): Sends data/command to the Wiiboard.
+    subscribe(callback): Registers a function called for every event of the Wiiboard.
+    unsubscribe(callback): Removes a function registered with subscribe.
+    publish(event, t, value, **attributes): Delivers an event to the subscribers and to pygame.
+    send(data): Sends a command to the Wiiboard.
     calibrate(): Performs sensor calibration on the Wiiboard.
-    receivethread(): Continuously receives data from the Wiiboard and posts events.
-    createBoardEvent(bytes): Creates a BoardEvent object from received bytes.
+    receivethread(): Switches the Wiiboard to continuous reporting, then receives its reports, pushes the samples and posts events.
+    reconnect(error): Reopens the link after a loss, with backoff.
+    decodeButtons(bytes, t): Decodes the buttons of a report and publishes the button events.
+    decodeReport(bytes, t): Decodes the bytes of a single report and publishes the button events.
     calcMass(raw, pos): Calculates mass from raw sensor data using calibration data.
     """
 
 	receivesocket = None
 	controlsocket = None
 
-	def __init__(self):
+	def __init__(self, headless=False, transport=None, cache=None):
+		"""
+        Args:
+        headless (bool): If True, pygame is never imported and the events are only delivered to the subscribers.
+        transport: Transport to the Wiiboard, Bluetooth when None.
+        cache (DeviceCache or None): Cache of the calibrations, read from the Wiiboard every time when None.
+        """
+
+		self.transport = transport or BluetoothTransport()
+		self.cache = cache
 		self.calibration = []
+		self.decoder = None
+		self.calibrated = threading.Event()
 		self.LED = False
 		self.address = None
 		self.buttonDown = False
 
 		self.status = "Disconnected"
-		self.lastEvent = BoardEvent(0,0,0,0,False,False)
+		self.link = DeviceLink("Wiiboard")
+		self.samples = SampleStream(2)
+		self.subscribers = []
+		self.pygame = None if headless else importlib.import_module("pygame")
 
 	def isConnected(self):
 		"""
@@ -108,10 +179,13 @@ class Wiiboard:
 
 	def connect(self, address):
 		"""
-        Connects to the Wiiboard at the specified Bluetooth address.
+        Connects to the Wiiboard at the specified address, through the transport.
 
         Args:
-        address (str): Bluetooth address of the Wiiboard.
+        address (str): Address of the Wiiboard.
+
+        Returns:
+        bool: True if the Wiiboard is connected.
 
         Raises:
         Exception: If an error occurs during connection.
@@ -120,43 +194,41 @@ class Wiiboard:
 		global find
 		if address is None:
 			print("Non existant address")
-			return
-		try:
-			self.receivesocket = bluetooth.BluetoothSocket(bluetooth.L2CAP)
-			self.controlsocket = bluetooth.BluetoothSocket(bluetooth.L2CAP)
-		except ValueError:
-			raise Exception("Error: Bluetooth not found")
-		
-		self.receivesocket.connect((address, 0x13))
-		self.receivesocket.settimeout(2)
-		self.controlsocket.connect((address, 0x11))
+			return False
+		self.receivesocket, self.controlsocket = self.transport.openWiiboard(address)
 		if self.receivesocket and self.controlsocket:
 			print("Connected to Wiiboard at address " + address)
 			self.status = "Connected"
 			self.address = address
+			self.link.restore()
+			self.calibrated.clear()
+			self.send(ENABLE_EXTENSION)
 			thread = threading.Thread(target=self.receivethread, args=())
 			thread.start()
-			useExt = ["00", COMMAND_REGISTER, "04", "A4", "00", "40", "00"]
-			self.send(useExt)
 			
-			pygame.event.post(pygame.event.Event(WIIBOARD_CONNECTED))
+			self.publish(WIIBOARD_CONNECTED, time.monotonic())
+			return True
 		else:
 			print("Could not connect to Wiiboard at address " + address)
+			return False
 
 	def disconnect(self):
 		"""
         Disconnects from the currently connected Wiiboard.
         """
 
+		self.status = "Disconnected"
+		self.closeSockets()
+		print("WiiBoard disconnected")
+
+	def closeSockets(self):
 		try:
-			self.status = "Disconnected"
 			self.receivesocket.close()
 			self.controlsocket.close()
 			self.receivesocket = None
 			self.controlsocket = None
 		except:
 			pass
-		print("WiiBoard disconnected")
 
 
 	def discover(self):
@@ -168,12 +240,9 @@ class Wiiboard:
         """
 
 		print ("Press the red sync button on the board now")
-		address = None
-		bluetoothdevices = bluetooth.discover_devices(duration = 3, lookup_names = True)
-		for bluetoothdevice in bluetoothdevices:
-			if bluetoothdevice[1] == BLUETOOTH_NAME:
-				address = bluetoothdevice[0]
-				print ("Found Wiiboard at address " + address)
+		address = self.transport.discover(BLUETOOTH_NAME)
+		if address is not None:
+			print ("Found Wiiboard at address " + address)
 		if address == None:
 			print ("No Wiiboards discovered.")
 		return address
@@ -197,42 +266,92 @@ class Wiiboard:
         light (bool): True to turn on the LED, False to turn it off.
         """
 
-		val = "00"
 		if light == True:
-			val = "10"
-
-		message = ["00", COMMAND_LIGHT, val]
-		self.send(message)
+			self.send(LIGHT_ON)
+		else:
+			self.send(LIGHT_OFF)
 		self.LED = light
 		
+	def subscribe(self, callback):
+		"""
+        Registers a function called for every event of the Wiiboard.
+
+        The function is called from the receive thread as callback(event, t, value), where event
+        is one of the WIIBOARD_* constants, t the monotonic time of the event and value the tuple
+        (CoMx, CoMy, totalWeight) for a WIIBOARD_MASS event, None otherwise. It should return quickly,
+        as the next report is not read before it returns.
+
+        Args:
+        callback (callable): The function to register.
+        """
+
+		if callback not in self.subscribers:
+			self.subscribers.append(callback)
+
+	def unsubscribe(self, callback):
+		"""
+        Removes a function registered with subscribe.
+
+        Args:
+        callback (callable): The function to remove.
+        """
+
+		if callback in self.subscribers:
+			self.subscribers.remove(callback)
+
+	def publish(self, event, t, value=None, **attributes):
+		"""
+        Delivers an event to the subscribers and, unless the Wiiboard is headless, to pygame.
+
+        Args:
+        event (int): One of the WIIBOARD_* constants.
+        t (float): Monotonic time of the event, in seconds.
+        value (tuple or None): Value given to the subscribers.
+        **attributes: Attributes of the pygame event.
+        """
+
+		for callback in self.subscribers:
+			try:
+				callback(event, t, value)
+			except Exception as e:
+				# A subscriber must not stop the receive thread
+				print("Error in a subscriber of the Wiiboard events:", e)
+		if self.pygame is not None:
+			self.pygame.event.post(self.pygame.event.Event(self.pygame.USEREVENT + event, **attributes))
+
 	def send(self,data):
 		"""
-        Sends data/command to the Wiiboard.
+        Sends a command to the Wiiboard.
 
         Args:
-        data (list): List of bytes representing the command to send.
+        data (bytes): The command, as built by buildCommand.
         """
 
 		if self.status != "Connected" :
 			return
-		data[0] = "52"
-		senddata = b""
-		for byte in data:
-			byte = str(byte)
-			senddata += bytes.fromhex(byte)
-			a = self.controlsocket.send(senddata)
+		self.controlsocket.send(data)
 	
 	def calibrate(self):
 		"""
         Performs sensor calibration on the Wiiboard.
+
+        The calibration registers are only read the first time a Wiiboard is met: the values are
+        then kept in `cache` by address, as they are written in the board at the factory.
         """
 
-		message = ["00", COMMAND_READ_REGISTER ,"04", "A4", "00", "24", "00", "18"]
+		cached = self.cache.calibration(self.address) if self.cache is not None else None
+		if cached is not None:
+			self.calibration = list(cached)
+			self.decoder = ReportDecoder(self.calibration, REPORT_BATCH)
+			self.calibrated.set()
+			return
+
+		self.calibration = []
 		done = False
 		while not done : 
-			self.send(message)
+			self.send(READ_CALIBRATION)
 			data = self.receivesocket.recv(25)
-			if(data[1] == 33):
+			if(data[1] == REPORT_READ_DATA):
 				data2 = self.receivesocket.recv(25)
 				data = data[7:24]
 				data2 = data2[7:15]
@@ -242,54 +361,152 @@ class Wiiboard:
 					self.calibration.append((data[k] << 8) + data[k+1])
 					i+=1
 				done = True
+		if self.cache is not None:
+			self.cache.storeCalibration(self.address, self.calibration)
+		self.decoder = ReportDecoder(self.calibration, REPORT_BATCH)
+		self.calibrated.set()
 			
 
 	def receivethread(self):
 		"""
         Continuously receives data from the Wiiboard and posts events.
+
+        After the calibration (the Wiiboard is disconnected if it fails), the Wiiboard is switched
+        to continuous reporting of the buttons and the extension bytes (report 0x32), so it sends
+        its sensors at its own rate without being polled. Each report is timestamped with the monotonic time at which it was received.
+        The reports already waiting on the socket are read together (up to REPORT_BATCH) and
+        their sensors are decoded at once by `decoder`; the center of mass of each one is pushed
+        to `samples` and published as a WIIBOARD_MASS event. A status report resets the reporting
+        mode of the Wiiboard, so the continuous mode is requested again when one is received.
+        If the link is lost (a socket error or 2 seconds without report), WIIBOARD_DISCONNECTED is
+        published and the same thread reconnects (see reconnect), then WIIBOARD_CONNECTED is
+        published and the reports are received again.
         """
 
-		self.calibrate()
+		try:
+			self.calibrate()
+			self.send(CONTINUOUS_REPORTING)
+		except Exception as e:
+			# The connection job sees the Wiiboard disconnected and reports the failure
+			print("Calibration of the Wiiboard failed:", e)
+			if self.status == "Connected":
+				self.disconnect()
+			return
+		reports = bytearray(REPORT_BATCH * SENSOR_BYTES)
+		times = [0.0] * REPORT_BATCH
 		while self.status == "Connected":
 			try : 
-				message = ["00", COMMAND_READ_REGISTER, "04", "A4", "00", "00", "00", "08"]
-				self.send(message)
-				time.sleep(0.05)
-				data = self.receivesocket.recv(25)
-				if(data[1]==33):
-					self.lastEvent = self.createBoardEvent(data[2:15])
-					pygame.event.post(pygame.event.Event(WIIBOARD_MASS, mass=self.lastEvent))
-			except : 
-				pygame.event.post(pygame.event.Event(WIIBOARD_DISCONNECTED))
-		
-	def createBoardEvent(self, bytes):
+				count = 0
+				waiting = True
+				while waiting and count < REPORT_BATCH:
+					data = self.receivesocket.recv(25)
+					received = time.monotonic()
+					if not data:
+						raise ConnectionError("connection closed by the Wiiboard")
+					if(data[1] == REPORT_STATUS):
+						self.send(CONTINUOUS_REPORTING)
+					elif(data[1] == REPORT_BUTTONS_EXTENSION):
+						self.decodeButtons(data[2:4], received)
+						reports[count * SENSOR_BYTES:(count + 1) * SENSOR_BYTES] = data[4:12]
+						times[count] = received
+						count += 1
+					waiting = bool(select.select([self.receivesocket], [], [], 0)[0])
+
+				masses = self.decoder.decode(reports, count)
+				self.samples.extend(times[:count], masses[:, 5:7])
+				for received, (topLeft, topRight, bottomLeft, bottomRight, total, CoMx, CoMy) in zip(times, masses.tolist()):
+					if self.pygame is None:
+						self.publish(WIIBOARD_MASS, received, (CoMx, CoMy, total))
+					else:
+						self.publish(WIIBOARD_MASS, received, (CoMx, CoMy, total), mass=BoardEvent(topLeft, topRight, bottomLeft, bottomRight, self.buttonDown, False))
+			except OSError as e : 
+				if self.status != "Connected":
+					break
+				self.publish(WIIBOARD_DISCONNECTED, time.monotonic())
+				if not self.reconnect(e):
+					break
+				self.publish(WIIBOARD_CONNECTED, time.monotonic())
+			except Exception as e :
+				if self.status != "Connected":
+					break
+				# The link is fine: only the reports being decoded are lost
+				print("Error decoding the reports of the Wiiboard:", e)
+
+	def reconnect(self, error):
 		"""
-        Creates a BoardEvent object from received bytes.
+        Reopens the link to the Wiiboard after a loss, with backoff (see DeviceLink.recover).
+
+        The dead sockets are closed and the Wiiboard is opened again at the same address, with
+        the same calibration (its registers are not read again), and switched back to
+        continuous reporting. Its samples go on being pushed to the same `samples`, so the
+        capture continues in the same session. Meanwhile, `status` is "Reconnecting".
 
         Args:
-        bytes (bytes): Bytes received from the Wiiboard.
+        error (Exception): Cause of the loss.
 
         Returns:
-        BoardEvent: BoardEvent object representing the event.
+        bool: True if the link is recovered, False if the Wiiboard was disconnected meanwhile or the reconnection gave up.
+        """
+
+		self.link.lose(error)
+		self.status = "Reconnecting"
+		self.closeSockets()
+
+		def attempt():
+			try:
+				self.receivesocket, self.controlsocket = self.transport.openWiiboard(self.address)
+				self.status = "Connected"
+				self.send(ENABLE_EXTENSION)
+				self.send(CONTINUOUS_REPORTING)
+				return True
+			except:
+				if self.status == "Connected":
+					self.status = "Reconnecting"
+				self.closeSockets()
+				raise
+
+		if self.link.recover(attempt, lambda: self.status == "Disconnected"):
+			return True
+		self.status = "Disconnected"
+		return False
+		
+	def decodeButtons(self, bytes, t):
+		"""
+        Decodes the buttons of a report and publishes the button events.
+
+        Args:
+        bytes (bytes): The 2 bytes of buttons of a report.
+        t (float): Monotonic time at which the report was received, in seconds.
         """
 
-		buttonBytes = bytes[0:2]
-		bytes = bytes[5:13]
-		buttonPressed = False
-		buttonReleased = False
-		state = (buttonBytes[0] << 8) | buttonBytes[1]
+		state = (bytes[0] << 8) | bytes[1]
 
 		if state == BUTTON_DOWN_MASK:
-			buttonPressed = True
 			if not self.buttonDown:
-				pygame.event.post(pygame.event.Event(WIIBOARD_BUTTON_PRESS))
 				self.buttonDown = True
+				self.publish(WIIBOARD_BUTTON_PRESS, t)
 
-		if buttonPressed == False:
-			if self.lastEvent.buttonPressed == True:
-				buttonReleased = True
-				self.buttonDown = False
-				pygame.event.post(pygame.event.Event(WIIBOARD_BUTTON_RELEASE))
+		elif self.buttonDown:
+			self.buttonDown = False
+			self.publish(WIIBOARD_BUTTON_RELEASE, t)
+
+	def decodeReport(self, bytes, t):
+		"""
+        Decodes the bytes of a single report and publishes the button events.
+
+        This is the report by report path, with one calcMass call per sensor; the receive
+        thread decodes the reports by batches with `decoder` instead.
+
+        Args:
+        bytes (bytes): Payload of a 0x32 report: 2 bytes of buttons, then the 8 bytes of the sensors (TR, BR, TL, BL).
+        t (float): Monotonic time at which the report was received, in seconds.
+
+        Returns:
+        tuple: Weights (topLeft, topRight, bottomLeft, bottomRight) on the four sensors.
+        """
+
+		self.decodeButtons(bytes[0:2], t)
+		bytes = bytes[2:10]
 
 		rawTR = (bytes[0] << 8) + bytes[1]
 		rawBR = (bytes[2] << 8) + bytes[3]
@@ -301,8 +518,7 @@ class Wiiboard:
 		topLeft = self.calcMass(rawTL,2)
 		bottomLeft = self.calcMass(rawBL,3)
 
-		boardEvent = BoardEvent(topLeft,topRight,bottomLeft,bottomRight,buttonPressed,buttonReleased)
-		return boardEvent
+		return topLeft, topRight, bottomLeft, bottomRight
 
 	def calcMass(self, raw, pos):
 		"""
@@ -322,7 +538,7 @@ class Wiiboard:
 			return val
 		elif raw < self.calibration[pos+4]:
 			val = 17 * ((raw - self.calibration[pos]) / float((self.calibration[pos+4] - self.calibration[pos])))
-		elif raw > self.calibration[pos+4]:
+		else:
 			val = 17 + 17 * ((raw - self.calibration[pos+4]) / float((self.calibration[pos+8] - self.calibration[pos+4])))
 
 		return val
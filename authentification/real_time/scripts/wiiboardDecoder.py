@@ -0,0 +1,111 @@
+import numpy as np
+
+# Order of the sensors in the reports and in the calibration of the Wiiboard
+REPORT_SENSORS = ('topRight', 'bottomRight', 'topLeft', 'bottomLeft')
+# Columns of the decoded samples
+COLUMNS = ('topLeft', 'topRight', 'bottomLeft', 'bottomRight', 'total', 'CoMx', 'CoMy')
+# Column of each decoded sensor in the reports
+SENSOR_COLUMNS = [REPORT_SENSORS.index(sensor) for sensor in COLUMNS[:4]]
+
+SENSOR_BYTES = 8
+RAW_VALUES = 1 << 16
+REFERENCE_MASS = 17
+
+class ReportDecoder:
+    """
+    Decodes the sensor bytes of Wiiboard reports by batches, with NumPy.
+
+    The calibration curve of each sensor (raw values measured at 0, 17 and 34 kg, linear between
+    them, 0 below the raw value at 0 kg) is evaluated once for every possible raw value, so
+    converting the sensors of a batch of reports is a single lookup in this table. The weights,
+    the total and the numerators of the center of mass are then obtained with one matrix product.
+    All the intermediate values are written in arrays allocated once, so decoding a batch does
+    not allocate any array proportional to its size.
+
+    Attributes:
+    capacity (int): Maximum number of reports decoded in one call.
+    table (numpy.ndarray): Weight of every raw value (0 to 65535) of each sensor, sensors in the order of the reports.
+    combine (numpy.ndarray): Matrix of shape (4, 7) from the weights in the order of the reports to the columns of COLUMNS.
+    out (numpy.ndarray): Preallocated decoded samples of shape (capacity, 7), columns as in COLUMNS.
+
+    Methods:
+    curve(calibration, raw): Evaluates the calibration curve of the four sensors.
+    decode(reports, count): Decodes a batch of reports.
+    """
+
+    def __init__(self, calibration, capacity=64):
+        """
+        Args:
+        calibration (list): The 12 raw calibration values read from the Wiiboard: the 4 sensors
+                            (TR, BR, TL, BL) at 0 kg, then at 17 kg, then at 34 kg.
+        capacity (int): Maximum number of reports decoded in one call.
+        """
+
+        self.capacity = capacity
+        self.table = self.curve(calibration, np.arange(RAW_VALUES)[:, None]).T.ravel()
+        self.offsets = np.arange(4) * RAW_VALUES
+
+        # Weights in the order of COLUMNS, total, and numerators of CoMx and CoMy
+        self.combine = np.zeros((4, len(COLUMNS)))
+        for column, sensor in enumerate(SENSOR_COLUMNS):
+            self.combine[sensor, column] = 1
+        self.combine[:, 4] = 1
+        for sensor, name in enumerate(REPORT_SENSORS):
+            self.combine[sensor, 5] = 1 if name.endswith('Right') else -1
+            self.combine[sensor, 6] = 1 if name.startswith('top') else -1
+
+        self.out = np.zeros((capacity, len(COLUMNS)))
+        self.index = np.empty((capacity, 4), dtype=np.intp)
+        self.weights = np.empty((capacity, 4))
+        self.loaded = np.empty((capacity, 1), dtype=bool)
+
+    @staticmethod
+    def curve(calibration, raw):
+        """
+        Evaluates the calibration curve of the four sensors.
+
+        Args:
+        calibration (list): The 12 raw calibration values, as for the constructor.
+        raw (numpy.ndarray): Raw values, of shape (n, 4) (or (n, 1) to evaluate the same values for every sensor).
+
+        Returns:
+        numpy.ndarray: Weights in kg, of shape (n, 4), sensors in the order of the reports.
+        """
+
+        zero, middle, full = np.asarray(calibration, dtype=np.float64).reshape(3, 4)
+        low = REFERENCE_MASS * (raw - zero) / (middle - zero)
+        high = REFERENCE_MASS + REFERENCE_MASS * (raw - middle) / (full - middle)
+        return np.where(raw < zero, 0.0, np.where(raw < middle, low, high))
+
+    def decode(self, reports, count=None):
+        """
+        Decodes a batch of reports.
+
+        Args:
+        reports (bytes-like): The 8 sensor bytes of each report, one report after the other
+                              (big-endian TR, BR, TL, BL, as in the 0x32 reports).
+        count (int or None): Number of reports to decode, all the reports of `reports` when None.
+
+        Returns:
+        numpy.ndarray: View of shape (count, 7) of the preallocated output, columns as in COLUMNS.
+                       It is overwritten by the next call, so it must be copied to be kept.
+        """
+
+        if count is None:
+            count = len(reports) // SENSOR_BYTES
+        sensors = np.frombuffer(reports, dtype='>u2', count=4 * count).reshape(count, 4)
+
+        index = self.index[:count]
+        weights = self.weights[:count]
+        out = self.out[:count]
+        loaded = self.loaded[:count]
+
+        np.add(sensors, self.offsets, out=index)
+        np.take(self.table, index, out=weights)
+        np.matmul(weights, self.combine, out=out)
+
+        # Center of mass, left at 0 when the board is empty (all the weights are 0)
+        np.not_equal(out[:, 4:5], 0, out=loaded)
+        np.divide(out[:, 5:7], out[:, 4:5], out=out[:, 5:7], where=loaded)
+
+        return out
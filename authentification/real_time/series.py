@@ -0,0 +1,71 @@
+"""
+Packing of the time series stored with each shot.
+
+A series is a table of samples (one row per sample, one column per value). It is stored
+column by column as little-endian float32 in a binary field, with the metadata needed to
+read it back (dtype, shape and column names) kept next to it in a JSON field.
+"""
+
+import numpy as np
+
+SERIES_DTYPE = '<f4'
+
+GRAVITY_CENTER_COLUMNS = ['x', 'y']
+QUATERNION_COLUMNS = ['q0', 'q1', 'q2', 'q3']
+
+def pack_series(values, columns):
+    """
+    Packs a table of samples into column-major float32 bytes.
+
+    Args:
+    values (array-like): Samples of shape (n, len(columns)), for example a list of [x, y] pairs.
+    columns (list): Names of the columns.
+
+    Returns:
+    tuple: (bytes, dict) the packed columns and their metadata (dtype, shape, columns).
+    """
+
+    table = np.asarray(values, dtype=SERIES_DTYPE).reshape(-1, len(columns))
+    packed = np.ascontiguousarray(table.T)
+    meta = {'dtype': SERIES_DTYPE, 'shape': list(packed.shape), 'columns': list(columns)}
+    return packed.tobytes(), meta
+
+def unpack_series(blob, meta):
+    """
+    Reads packed columns without copying them.
+
+    Args:
+    blob (bytes or memoryview): Packed columns, as returned by pack_series.
+    meta (dict): Metadata returned by pack_series.
+
+    Returns:
+    numpy.ndarray: Read-only array of shape (len(columns), n), one row per column.
+    """
+
+    return np.frombuffer(blob, dtype=meta['dtype']).reshape(meta['shape'])
+
+def summarise_gravity_center(gravity_center, trigger_index=None):
+    """
+    Computes the values shown for a shot on the session scatter plot.
+
+    Args:
+    gravity_center (numpy.ndarray): Samples of shape (n, 2), one [x, y] row per sample.
+    trigger_index (int or None): Index of the sample taken at the trigger instant, the middle
+                                 of the window when None.
+
+    Returns:
+    dict: trigger_x, trigger_y and the sway extents min_x, max_x, min_y, max_y.
+    """
+
+    if trigger_index is None:
+        trigger_index = len(gravity_center) // 2 - 1
+    minimum = gravity_center.min(axis=0)
+    maximum = gravity_center.max(axis=0)
+    return {
+        'trigger_x': float(gravity_center[trigger_index, 0]),
+        'trigger_y': float(gravity_center[trigger_index, 1]),
+        'min_x': float(minimum[0]),
+        'max_x': float(maximum[0]),
+        'min_y': float(minimum[1]),
+        'max_y': float(maximum[1]),
+    }
@@ -0,0 +1,764 @@
+"""
+Stations of the range: one shooter, with a Wiiboard and the sensors of the rifle.
+
+Each station owns its devices and their threads, its capture windows, its session and its
+telemetry channel, so one server can measure every firing point at once. The stations are
+created from the REAL_TIME_STATIONS setting (see create_stations) and addressed by their ID in
+the URLs ("station/<id>/...") and in the WebSocket route ("/ws/real_time/<id>/"). Only the shot
+writer and the event loop of the ASGI server are shared.
+
+The stations run in the Django process, or in the acquisition daemon (see real_time.daemon),
+which publishes their samples to a shared memory ring instead of broadcasting them.
+"""
+
+import itertools
+import math
+import os
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.db.models import Max
+from real_time.models import Data
+from real_time.scripts.ringBuffer import RingBuffer
+from real_time.scripts.triggerDetector import TriggerDetector
+from real_time.scripts.streamRecorder import SessionRecorder
+from real_time.scripts.broadcaster import Broadcaster
+from real_time.scripts.telemetry import SampleBatch, STALE_WIIBOARD, STALE_SENSORS
+from real_time.scripts import wiiboard
+from real_time.scripts import dataSensors
+from real_time.scripts import transports
+from real_time.scripts import devices
+from real_time import websocket
+
+# Extra samples kept before the windows, for the samples received between the shot and its detection
+TRIGGER_MARGIN = 64
+
+LEN_GC = 500
+LEN_QUA = 150
+
+# Keys of the reference values sent by the page of the shooter (see sendParameters.js), by attribute of the station
+REFERENCE_KEYS = {
+    'quat_ref': ('q0_ref', 'q1_ref', 'q2_ref', 'q3_ref'),
+    'slidersValues': ('sliderSensitivityStabilityValue', 'sliderSensitivityValue'),
+    'centerGravity_ref': ('Xcalibration', 'Ycalibration'),
+}
+
+def reference_values(message):
+    """
+    Reads the reference values of a message of a client.
+
+    Args:
+    message: The decoded JSON message.
+
+    Returns:
+    dict or None: The values of quat_ref, slidersValues and centerGravity_ref, None (logged) if
+                  a key is missing or a value is not a finite number.
+    """
+
+    if not isinstance(message, dict):
+        print("Ignored message of a WebSocket client: not an object")
+        return None
+    values = {}
+    for attribute, keys in REFERENCE_KEYS.items():
+        values[attribute] = []
+        for key in keys:
+            value = message.get(key)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                print("Ignored message of a WebSocket client: invalid %s %r" % (key, value))
+                return None
+            values[attribute].append(value)
+    return values
+
+def split_window(window, trigger_time, length):
+    """
+    Splits a window of timestamped samples at the instant of a shot.
+
+    Args:
+    - window (numpy.ndarray): Samples of the window before the detection, oldest first, time in the first column.
+    - trigger_time (float): Monotonic time of the shot, in seconds.
+    - length (int): Number of samples kept before the shot.
+
+    Returns:
+    - tuple: (numpy.ndarray, list) the `length` samples received up to the shot, padded with the
+      oldest sample if there are not enough, and the samples received after the shot.
+    """
+
+    after = window[:, 0] > trigger_time
+    before = window[~after][-length:]
+    if len(before) < length:
+        before = np.concatenate((np.repeat(window[:1], length - len(before), axis=0), before))
+    return before, window[after].tolist()
+
+def open_recorder(user, session):
+    """
+    Opens the recorder of the raw streams of a session.
+
+    Args:
+    - user (User): The user measuring.
+    - session (int): ID of the session.
+
+    Returns:
+    - SessionRecorder or None: Recorder writing to REAL_TIME_RECORDINGS/<user id>/session-<session>,
+      None if REAL_TIME_RECORDINGS is None.
+    """
+
+    directory = getattr(settings, 'REAL_TIME_RECORDINGS', None)
+    if directory is None:
+        return None
+    return SessionRecorder(os.path.join(directory, str(user.pk), "session-%d" % session))
+
+def create_detector():
+    return TriggerDetector(
+        getattr(settings, 'REAL_TIME_TRIGGER_THRESHOLD', 1000),
+        getattr(settings, 'REAL_TIME_TRIGGER_REFRACTORY', 10),
+        getattr(settings, 'REAL_TIME_TRIGGER_ONSET', 0.5),
+    )
+
+class Station:
+    """
+    A firing point: its devices, its capture and its telemetry channel.
+
+    Attributes:
+    id (str): ID of the station, in its URLs and WebSocket route.
+    transport: Transport to the devices of the station (see real_time.scripts.transports).
+    cache (DeviceCache or None): Addresses and calibrations of the devices of the station.
+    board (Wiiboard): The Wiiboard of the station.
+    reader (BluetoothReader): The sensors of the rifle of the station.
+    shot_writer (ShotWriter): Queue of the shots waiting to be written to the database, shared by the stations.
+    new_session (bool): True when the next start opens a new session.
+    session_id (int or None): ID of the current session of measurements.
+    shot_id (int): ID of the next shot.
+    measure_thread (threading.Thread or None): Thread of save_Measure.
+    user_id (int or None): ID of the user measuring, the only one whose pages may set the reference values.
+    stop_measure (bool): Set to stop save_Measure.
+    recorder (SessionRecorder or None): Recorder of the raw streams of the session.
+    quat_ref (list): Reference for quaternions [q0, q1, q2, q3], set by the clients of the user measuring.
+    slidersValues (list): Values of sliders [sliderSensitivityStabilityValue, sliderSensitivityValue], set by the clients of the user measuring.
+    centerGravity_ref (list): Reference for center of gravity [Xcalibration, Ycalibration], set by the clients of the user measuring.
+    sample_batch (SampleBatch): Samples waiting to be sent by the broadcaster.
+    broadcaster (Broadcaster): Sends the frames of the station to its clients.
+    ring (SharedRing or None): Ring to which the telemetry rows are written instead of the batch, in the acquisition daemon.
+    jobs (ConnectionJobs): Connection jobs of the devices.
+
+    Methods:
+    connectors(wiiboard_wanted, sensors_wanted): Returns the connection functions of the devices to connect.
+    connect(wiiboard_wanted, sensors_wanted): Starts connecting the devices in the background.
+    job_status(number): Returns the progress of a connection job.
+    connected(): Checks that both devices are connected.
+    status(): Returns the state of the devices and of the measurement.
+    start_session(user): Starts the measurement, opening a new session if needed.
+    start_measure(user): Starts the measurement thread and the broadcaster.
+    stop(): Stops the measurement thread and the broadcaster.
+    collect_samples(gc, qua): Adds the samples received to the capture windows and the telemetry batch.
+    save_Measure(user): Collects the samples and saves the shots, until stopped.
+    update_Measure(): Builds the next frame sent to the clients.
+    set_references(user_id, values): Sets the reference values sent by a client of the user measuring.
+    handle_message(connection, latest_value): Handles a message of a client.
+    """
+
+    def __init__(self, station_id, transport, shot_writer, cache=None, sensors_name=dataSensors.bluetooth_name, broadcast_rate=60, jobs=None):
+        self.id = station_id
+        self.transport = transport
+        self.cache = cache
+        self.shot_writer = shot_writer
+        self.jobs = jobs or devices.ConnectionJobs()
+
+        self.board = wiiboard.Wiiboard(headless=True, transport=transport, cache=cache)
+        self.reader = dataSensors.BluetoothReader(sensors_name, transport)
+        self.reader.cache = cache
+        self.reader.detector = create_detector()
+
+        self.new_session = True
+        self.shot_id = 1
+        self.session_id = None
+        self.first_connexion = True
+        self.measure_thread = None
+        self.user_id = None
+        self.stop_measure = False
+        self.recorder = None
+        self.lock = threading.Lock()
+
+        self.before_gc = True
+        self.measure_gc_after = []
+        self.measure_gc_before = RingBuffer(LEN_GC + TRIGGER_MARGIN, 3)
+        self.ind_gc = 0
+        self.before_qua = True
+        self.measure_qua_after = []
+        self.measure_qua_before = RingBuffer(LEN_QUA + TRIGGER_MARGIN, 5)
+        self.ind_qua = 0
+
+        self.quat_ref = [0,0,0,0]
+        self.slidersValues = [10,1]
+        self.centerGravity_ref = [0,0]
+        self.CoG = 0
+        self.last_stale = 0
+        self.sample_batch = SampleBatch()
+        self.held_gc = [0, 0]
+        self.held_qua = [0, 0, 0, 0]
+        self.broadcaster = Broadcaster(self.send_to_all_clients, self.update_Measure, rate=broadcast_rate)
+        self.ring = None
+
+    def __repr__(self):
+        return "<Station %s>" % self.id
+
+    def group(self):
+        return websocket.station_group(self.id)
+
+    def wiiboard_ready(self):
+        """
+        Waits for the calibration of the Wiiboard just opened, then turns its LED on.
+
+        If the calibration fails or is not done within 10 seconds, the Wiiboard is disconnected,
+        so that it can be connected again.
+
+        Returns:
+        bool: True if the Wiiboard was calibrated within 10 seconds.
+        """
+
+        deadline = time.monotonic() + 10
+        while not self.board.calibrated.wait(0.1):
+            if self.board.status != "Connected" or time.monotonic() > deadline:
+                self.board.disconnect()
+                return False
+        self.board.setLight(True)
+        return True
+
+    def sensors_ready(self):
+        """
+        Starts reading the sensors just opened, in a daemon thread, until they are disconnected.
+
+        Returns:
+        bool: Always True.
+        """
+
+        def run():
+            self.reader.read()
+            self.reader.disconnect()
+
+        threading.Thread(target=run, name="sensors-%s" % self.id, daemon=True).start()
+        return True
+
+    def connectors(self, wiiboard_wanted, sensors_wanted):
+        """
+        Returns the connection functions of the requested devices that are not connected.
+
+        Args:
+        wiiboard_wanted (bool): Whether the Wiiboard is requested.
+        sensors_wanted (bool): Whether the sensors are requested.
+
+        Returns:
+        tuple: (connectors, setup) for ConnectionJobs.start, by Bluetooth name.
+        """
+
+        connectors = {}
+        setup = {}
+        if wiiboard_wanted and self.board.status == "Disconnected":
+            connectors[wiiboard.BLUETOOTH_NAME] = self.board.connect
+            setup[wiiboard.BLUETOOTH_NAME] = ('calibrating', self.wiiboard_ready)
+        if sensors_wanted and self.reader.connected == False:
+            self.reader.finish = False
+            connectors[self.reader.BLUETOOTH_NAME] = self.reader.connect
+            setup[self.reader.BLUETOOTH_NAME] = (None, self.sensors_ready)
+        return connectors, setup
+
+    def connect(self, wiiboard_wanted, sensors_wanted):
+        """
+        Starts connecting the requested devices that are not connected, in the background.
+
+        Returns:
+        int or None: Number of the connection job, None if the devices are already connected.
+        """
+
+        connectors, setup = self.connectors(wiiboard_wanted, sensors_wanted)
+        if not connectors:
+            return None
+        return self.jobs.start(connectors, self.transport, self.cache, setup).number
+
+    def job_status(self, number):
+        """
+        Returns the progress of a connection job (see ConnectionJob.status), None if it is unknown.
+        """
+
+        job = self.jobs.get(number)
+        return None if job is None else job.status()
+
+    def connected(self):
+        return self.board.status == "Connected" and self.reader.connected == True
+
+    def status(self):
+        """
+        Returns the state of the devices and of the measurement.
+
+        Returns:
+        dict: Status of the Wiiboard, whether the sensors are connected, whether the station is
+              measuring, its session, and the sequence number and age (seconds, None before the
+              first one) of the last sample of each device.
+        """
+
+        now = time.monotonic()
+        samples = {}
+        for name, stream in (('wiiboard', self.board.samples), ('sensors', self.reader.samples)):
+            snapshot = stream.snapshot()
+            samples[name] = {'sequence': snapshot.sequence, 'age': None if snapshot.time is None else now - snapshot.time}
+        return {
+            'wiiboard': self.board.status,
+            'sensors': self.reader.connected,
+            'measuring': self.measure_thread is not None and self.measure_thread.is_alive(),
+            'session': self.session_id,
+            'samples': samples,
+        }
+
+    def start_session(self, user):
+        """
+        Starts the measurement, opening a new session if needed.
+
+        The session ID continues from the last session of the user saved in the database, and a
+        new session opens the recorder of its raw streams.
+
+        Args:
+        user (User): The user measuring.
+        """
+
+        self.start_measure(user)
+
+        with self.lock:
+            if self.first_connexion:
+                self.session_id = Data.objects.filter(user=user).aggregate(Max('session_id'))['session_id__max']
+                self.first_connexion = False
+
+            if self.session_id is None:
+                self.session_id = 0
+
+            if self.new_session:
+                self.session_id = self.session_id + 1
+                self.new_session = False
+                if self.recorder is not None:
+                    self.recorder.close()
+                self.recorder = open_recorder(user, self.session_id)
+
+    def start_measure(self, user):
+        """
+        Starts the measurement thread and the broadcaster if they are not running.
+
+        Args:
+        user (User): The user measuring.
+        """
+
+        with self.lock:
+            if not self.measure_thread or not self.measure_thread.is_alive():
+                self.stop_measure = False
+                self.user_id = user.pk
+                self.measure_thread = threading.Thread(target=self.save_Measure, args=(user,), name="measure-%s" % self.id)
+                self.measure_thread.start()
+
+        # In the acquisition daemon, the Django workers broadcast the rows of the ring
+        if self.ring is None and not self.broadcaster.is_running():
+            self.start_broadcaster()
+
+    def stop(self):
+        """
+        Stops the measurement thread, waiting for it, and the broadcaster.
+        """
+
+        self.stop_measure = True
+        measure_thread = self.measure_thread
+        if measure_thread is not None:
+            measure_thread.join()
+            self.measure_thread = None
+        self.broadcaster.stop()
+
+    def start_broadcast_loop(self, loop):
+        if not self.broadcaster.is_running():
+            self.broadcaster.start(loop)
+
+    def start_broadcaster(self):
+        """
+        Starts the broadcaster on the event loop of the ASGI server, as soon as it is known.
+        """
+
+        websocket.hub.when_ready(self.start_broadcast_loop)
+
+    def stale_flags(self):
+        """
+        Returns the STALE_* bits of the devices whose link is down.
+        """
+
+        return (STALE_WIIBOARD if self.board.link.stale else 0) | (STALE_SENSORS if self.reader.link.stale else 0)
+
+    def record_gaps(self, session_recorder, recorded):
+        """
+        Records in the session the losses of link that ended since the last call.
+
+        Args:
+        - session_recorder (SessionRecorder): Recorder of the session.
+        - recorded (dict): Number of gaps of each link already recorded, by stream name, updated.
+        """
+
+        for name, link in (('wiiboard', self.board.link), ('sensors', self.reader.link)):
+            gaps = link.gaps
+            while recorded[name] < len(gaps) and gaps[recorded[name]][1] is not None:
+                session_recorder.recordGap(name, *gaps[recorded[name]])
+                recorded[name] += 1
+
+    def link_stats(self):
+        return {'wiiboard': self.board.link.stats(), 'sensors': self.reader.link.stats()}
+
+    def writer_stats(self):
+        return self.shot_writer.stats()
+
+    def get_point_position(self, t, X, Y):
+        """
+        Adds a position of the center of gravity to the capture windows.
+
+        If `before_gc` is True, it overwrites the oldest sample of `measure_gc_before` (constant time).
+        If `before_gc` is False, it appends it to `measure_gc_after` until LEN_GC samples are collected.
+
+        Args:
+        t (float): Monotonic time at which the sample was received, in seconds.
+        X (float): X-coordinate of the point.
+        Y (float): Y-coordinate of the point.
+        """
+
+        if self.before_gc:
+            self.measure_gc_before.append(t, X, Y)
+            self.ind_gc = 0
+
+        else:
+            if self.ind_gc < LEN_GC:
+                self.measure_gc_after.append([t, X, Y])
+                self.ind_gc = self.ind_gc + 1
+
+    def get_Quaternion(self, t, q0, q1, q2, q3):
+        """
+        Adds a quaternion to the capture windows.
+
+        If `before_qua` is True, it overwrites the oldest sample of `measure_qua_before` (constant time).
+        If `before_qua` is False, it appends it to `measure_qua_after` until LEN_QUA samples are collected.
+
+        Args:
+        t (float): Monotonic time at which the sample was received, in seconds.
+        q0, q1, q2, q3 (float): Quaternion values.
+        """
+
+        if self.before_qua:
+            self.measure_qua_before.append(t, q0, q1, q2, q3)
+            self.ind_qua = 0
+
+        else:
+            if self.ind_qua < LEN_QUA:
+                self.measure_qua_after.append([t, q0, q1, q2, q3])
+                self.ind_qua = self.ind_qua + 1
+
+    def handle_message(self, connection, latest_value):
+        """
+        Handles a message of a client of the station, called on the event loop of the ASGI server.
+
+        Args:
+        - connection (websocket.Connection): The client.
+        - latest_value (dict): The decoded JSON message.
+
+        Actions:
+        - Updates quat_ref, slidersValues, and centerGravity_ref from the message, if it is valid
+          (see reference_values) and comes from the user measuring: the other clients only watch.
+        """
+
+        values = reference_values(latest_value)
+        if values is not None:
+            self.set_references(connection.user_id, values)
+
+    def set_references(self, user_id, values):
+        """
+        Sets the reference values sent by a client, if it belongs to the user measuring.
+
+        Args:
+        - user_id (int): ID of the user of the client.
+        - values (dict): quat_ref, slidersValues and centerGravity_ref, as returned by reference_values.
+
+        Returns:
+        bool: True if the values were set.
+        """
+
+        if self.user_id is None or user_id != self.user_id:
+            return False
+        self.quat_ref = values['quat_ref']
+        self.slidersValues = values['slidersValues']
+        self.centerGravity_ref = values['centerGravity_ref']
+        return True
+
+    async def send_to_all_clients(self, data):
+        """
+        Sends data to all the clients of the station.
+
+        Args:
+        - data (dict): Dictionary containing data to be sent to clients.
+
+        Action:
+        - Numbers the frame, encodes it once per subprotocol in use and queues it for each client
+          of the station (see websocket.TelemetryHub.send).
+        """
+
+        await websocket.hub.send(self.group(), data)
+
+    def collect_samples(self, gc, qua):
+        """
+        Adds the samples received from the devices to the capture windows and the telemetry batch.
+
+        Args:
+        - gc (numpy.ndarray): Samples of the Wiiboard, one [t, x, y] row per sample.
+        - qua (numpy.ndarray): Samples of the sensors, one [t, q0, q1, q2, q3] row per sample.
+
+        Actions:
+        - Adjusts every sample based on the reference values and adds it to the capture windows with its timestamp.
+        - Merges the two devices in time order and adds one telemetry row per received sample, using the
+          latest value of the other device (`held_gc`, `held_qua`) for the missing values, to the
+          batch of the broadcaster or to the shared ring (`ring`).
+        """
+
+        gc = gc.tolist()
+        qua = qua.tolist()
+        Xref, Yref = self.centerGravity_ref
+        q0ref, q1ref, q2ref, q3ref = self.quat_ref
+
+        for t, x, y in gc:
+            self.get_point_position(t, x - Xref, y - Yref)
+        for t, q0, q1, q2, q3 in qua:
+            self.get_Quaternion(t, q0 - q0ref, q1 - q1ref, q2 - q2ref, q3 - q3ref)
+
+        ring = self.ring
+        rows = []
+        for sample in sorted(gc + qua):
+            if len(sample) == 3:
+                self.held_gc = sample[1:]
+            else:
+                self.held_qua = sample[1:]
+            if ring is None:
+                self.sample_batch.push(sample[0], *self.held_gc, *self.held_qua)
+            else:
+                rows.append([sample[0], *self.held_gc, *self.held_qua])
+        if rows:
+            ring.append(np.array(rows))
+
+    def save_Measure(self, user):
+        """
+        Collects every sample produced by the devices of the station and saves a shot to the database when triggered.
+
+        Args:
+        - user (User): The user measuring.
+
+        Actions:
+        - Waits for the devices to push samples (`board.samples` and `reader.samples`) and consumes
+          them as they arrive with collect_samples, so every real sample is captured once with its timestamp.
+          A wake-up with no new sequence number in the snapshots of the two streams is skipped.
+        - Appends every sample, as received, to the recording of the session, so the data between the
+          shots is kept as well, with the times during which the link to a device was down.
+        - Starts a capture when the trigger detector of the sensors (`reader.detector`) reports a shot:
+            - Sets CoG to 1.
+            - Increments shot_id and splits a snapshot of the windows at the onset time of the shot: the
+              samples received up to the shot go into data_gc and data_qua, the ones received since
+              start measure_gc_after and measure_qua_after. The shot is dated by the detector, so the
+              windows do not depend on when this loop noticed it.
+        - Ends the capture once enough samples are collected in measure_gc_after and measure_qua_after:
+            - Prepares final data_gc and data_qua for database storage, with times relative to the trigger.
+            - Resets relevant flags and clears measure_gc_after and measure_qua_after.
+            - Creates a Data object with user, session_id, shot_id, gravity_center, quaternion, and sliders_value,
+              the two series being packed as float32 columns.
+            - Hands it to the shot writer, which saves it with its ShotSummary from its own thread.
+
+        Notes:
+        - The windows are filled with the first sample of each device, so that a shot taken right after the
+          start does not contain samples that were never measured, and the telemetry starts from the last
+          sample each device pushed before the start (`held_gc`, `held_qua`).
+        - It never waits for the database: if the writer queue is full, the shot is dropped and counted.
+        - It goes on while a device reconnects: that device sends no sample meanwhile, and its samples
+          continue in the same session once its link is recovered. A shot whose windows span a loss of
+          link shows it in its times.
+        """
+
+        self.shot_writer.start()
+
+        board = self.board
+        reader = self.reader
+        arrived = threading.Event()
+        board.samples.notify = arrived
+        reader.samples.notify = arrived
+        board.samples.drain()
+        reader.samples.drain()
+        reader.detector.take()
+        seen_gc = board.samples.snapshot()
+        seen_qua = reader.samples.snapshot()
+        self.held_gc = list(seen_gc.values)
+        self.held_qua = list(seen_qua.values)
+        filled_gc = False
+        filled_qua = False
+        recorded_gaps = {'wiiboard': len(board.link.gaps), 'sensors': len(reader.link.gaps)}
+
+        capturing = False
+        trigger_time = 0
+
+        while not self.stop_measure:
+
+            arrived.wait(0.1)
+            arrived.clear()
+            if not board.samples.changed(seen_gc.sequence) and not reader.samples.changed(seen_qua.sequence):
+                continue
+            # Read before draining, so that a sample pushed meanwhile is seen as new at the next wake-up
+            seen_gc = board.samples.snapshot()
+            seen_qua = reader.samples.snapshot()
+            gc = board.samples.drain()
+            qua = reader.samples.drain()
+
+            if not filled_gc and len(gc):
+                self.measure_gc_before.fill(*gc[0])
+                filled_gc = True
+            if not filled_qua and len(qua):
+                self.measure_qua_before.fill(*qua[0])
+                filled_qua = True
+
+            session_recorder = self.recorder
+            if session_recorder is not None:
+                session_recorder.record('wiiboard', gc)
+                session_recorder.record('sensors', qua)
+                self.record_gaps(session_recorder, recorded_gaps)
+
+            self.collect_samples(gc, qua)
+
+            shot = None if capturing else reader.detector.take()
+
+            if shot is not None:
+
+                self.CoG = 1
+                self.shot_id = self.shot_id + 1
+                trigger_time = shot.time
+                capturing = True
+
+                # Unroll the windows and split them at the shot
+                data_gc, self.measure_gc_after = split_window(self.measure_gc_before.snapshot(), trigger_time, LEN_GC)
+                data_qua, self.measure_qua_after = split_window(self.measure_qua_before.snapshot(), trigger_time, LEN_QUA)
+                self.ind_gc = len(self.measure_gc_after)
+                self.ind_qua = len(self.measure_qua_after)
+
+                self.before_gc = False
+                self.before_qua = False
+
+            elif capturing and len(self.measure_gc_after) >= LEN_GC and len(self.measure_qua_after) >= LEN_QUA:
+
+                # Combine measurements after trigger, with times relative to the trigger
+                data_gc = np.concatenate((data_gc, self.measure_gc_after[:LEN_GC]))
+                data_qua = np.concatenate((data_qua, self.measure_qua_after[:LEN_QUA]))
+                data_gc[:, 0] -= trigger_time
+                data_qua[:, 0] -= trigger_time
+
+                self.before_gc = True
+                self.before_qua = True
+                capturing = False
+
+                # Clear after-trigger measurement lists
+                self.measure_gc_after = []
+                self.measure_qua_after = []
+
+                measurement = Data(user=user, session_id=self.session_id, shot_id=self.shot_id - 1, sliders_value=self.slidersValues)
+                measurement.set_series('gravity_center', data_gc)
+                measurement.set_series('quaternion', data_qua)
+                self.shot_writer.submit(measurement, trigger_index=LEN_GC - 1)
+
+        if self.recorder is not None:
+            self.recorder.flush()
+
+    def update_Measure(self):
+        """
+        Builds the next frame sent to the clients of the station.
+
+        This method is called by the broadcaster once per period, on the event loop of the ASGI server.
+
+        Returns:
+        dict or None: Dictionary `data_to_send` containing every sample collected since the last frame
+                      (timestamp, x, y and quaternion), CoG, stale (STALE_* bits of the devices
+                      reconnecting), sessionID, and shotID, or None if no new sample arrived and no
+                      link changed since the last frame.
+
+        Notes:
+        - CoG is reset to 0 once it has been put in a frame.
+        """
+
+        samples = self.sample_batch.drain()
+        stale = self.stale_flags()
+        if not len(samples) and not self.CoG and stale == self.last_stale:
+            return None
+        self.last_stale = stale
+
+        data_to_send = {
+                'samples': samples,
+                'CoG' : self.CoG,
+                'stale': stale,
+                'sessionID' : self.session_id,
+                'shotID' : self.shot_id,
+            }
+        self.CoG = 0
+        return data_to_send
+
+def station_cache_path(station_id):
+    """
+    Returns the path of the device cache of a station: REAL_TIME_DEVICE_CACHE for the default
+    station, and <name>-<station id><extension> next to it for the others.
+    """
+
+    path = getattr(settings, 'REAL_TIME_DEVICE_CACHE', None)
+    if path is None or station_id == websocket.DEFAULT_STATION:
+        return path
+    root, extension = os.path.splitext(str(path))
+    return "%s-%s%s" % (root, station_id, extension)
+
+def station_options():
+    """
+    Returns the options of each station of REAL_TIME_STATIONS, by ID.
+    """
+
+    return {str(station_id): options for station_id, options in getattr(settings, 'REAL_TIME_STATIONS', {websocket.DEFAULT_STATION: {}}).items()}
+
+def create_stations(shot_writer):
+    """
+    Creates the stations of REAL_TIME_STATIONS, with their devices.
+
+    The options of a station are optional: wiiboard and sensors (addresses the devices are pinned
+    to), sensors_name (Bluetooth name of its ESP32), transport, transport_options and record (its
+    own transport, instead of the one of REAL_TIME_TRANSPORT, shared by the other stations).
+    Only the stations using the Bluetooth transport keep their device cache in a file.
+
+    Args:
+    shot_writer (ShotWriter): Writer of the shots of every station.
+
+    Returns:
+    dict: The stations, by ID.
+    """
+
+    # Devices used by the readers: the real ones over Bluetooth, or simulated or replayed ones
+    transport = transports.create(
+        getattr(settings, 'REAL_TIME_TRANSPORT', 'bluetooth'),
+        getattr(settings, 'REAL_TIME_RECORD', None),
+        **getattr(settings, 'REAL_TIME_TRANSPORT_OPTIONS', {}),
+    )
+    # Each station has its own connection jobs, numbered in one sequence so the numbers are unique
+    job_numbers = itertools.count(1)
+    broadcast_rate = getattr(settings, 'REAL_TIME_BROADCAST_RATE', 60)
+
+    stations = {}
+    for station_id, options in station_options().items():
+        station_transport = transport
+        if 'transport' in options:
+            station_transport = transports.create(options['transport'], options.get('record'), **options.get('transport_options', {}))
+
+        sensors_name = options.get('sensors_name', dataSensors.bluetooth_name)
+        pinned = {}
+        if options.get('wiiboard'):
+            pinned[wiiboard.BLUETOOTH_NAME] = options['wiiboard']
+        if options.get('sensors'):
+            pinned[sensors_name] = options['sensors']
+        # The addresses and calibrations of simulated or replayed devices are not kept, so they
+        # never take the place of the real ones in the cache
+        cache_path = station_cache_path(station_id) if station_transport.name == transports.BluetoothTransport.name else None
+        cache = devices.DeviceCache(cache_path, pinned)
+
+        jobs = devices.ConnectionJobs(numbers=job_numbers)
+        stations[station_id] = Station(station_id, station_transport, shot_writer, cache, sensors_name, broadcast_rate, jobs)
+    return stations
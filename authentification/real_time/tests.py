@@ -1,3 +1,1073 @@
-from django.test import TestCase
+import asyncio
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction, OperationalError
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from real_time import views, websocket
+from real_time.models import Data, ShotSummary
+from real_time.station import reference_values, create_stations
+from real_time.writer import ShotWriter
+from real_time.series import pack_series, unpack_series, GRAVITY_CENTER_COLUMNS, QUATERNION_COLUMNS
+from real_time.scripts.dataSensors import BluetoothReader, FRAME, FRAME_SIZE, BUFFER_SIZE
+from real_time.scripts.triggerDetector import TriggerDetector
+from real_time.scripts import wiiboard
+from real_time.scripts.wiiboard import Wiiboard, centerOfMass
+from real_time.scripts.wiiboardDecoder import ReportDecoder, SENSOR_BYTES
+from real_time.scripts.streamRecorder import StreamRecorder, StreamReader
+from real_time.scripts import deviceLink
+from real_time.scripts.deviceLink import DeviceLink
+from real_time.scripts.devices import DeviceCache, connectDevices, ConnectionJobs
+from real_time.scripts.transports import SimulatorTransport, SIMULATED_ADDRESS
+from real_time.scripts.sampleStream import SampleStream
+from real_time.scripts.sharedRing import SharedRing, HEADER_RESERVED
+from real_time.scripts.telemetry import (encode_batch, decode_batch, FrameEncoder, PROTOCOL_BINARY, PROTOCOL_JSON,
+                                         STALE_SENSORS, BATCH_HEADER, SampleBatch)
 
-# Create your tests here.
+class TelemetryEncodingTests(SimpleTestCase):
+    """
+    Encoding of the telemetry frames (encode_batch, decode_batch and FrameEncoder).
+    """
+
+    def frame(self, count=5, t0=1234.5):
+        samples = np.zeros((count, 7))
+        samples[:, 0] = t0 + 0.01 * np.arange(count)
+        samples[:, 1:] = np.random.default_rng(3).normal(size=(count, 6))
+        return {'samples': samples, 'CoG': 1, 'stale': STALE_SENSORS, 'sessionID': 4, 'shotID': 9}
+
+    def test_batch_round_trip(self):
+        data = self.frame()
+        message = encode_batch(data, 42)
+        self.assertEqual(len(message), BATCH_HEADER.size + 5 * 7 * 4)
+        decoded = decode_batch(message)
+        self.assertEqual({key: decoded[key] for key in ('seq', 'CoG', 'stale', 'sessionID', 'shotID')},
+                         {'seq': 42, 'CoG': 1, 'stale': STALE_SENSORS, 'sessionID': 4, 'shotID': 9})
+        # Values are sent as float32, and the times relative to the first one so they keep their precision
+        np.testing.assert_allclose(decoded['samples'][:, 0], data['samples'][:, 0], atol=1e-6)
+        np.testing.assert_array_equal(decoded['samples'][:, 1:], data['samples'][:, 1:].astype(np.float32))
+
+    def test_empty_batch(self):
+        data = dict(self.frame(), samples=np.zeros((0, 7)), CoG=0, sessionID=None)
+        decoded = decode_batch(encode_batch(data, 1))
+        self.assertEqual(decoded['samples'].shape, (0, 7))
+        self.assertEqual((decoded['CoG'], decoded['sessionID']), (0, 0))
+
+    def test_sequence_wraps(self):
+        self.assertEqual(decode_batch(encode_batch(self.frame(), 2 ** 32 + 5))['seq'], 5)
+
+    def test_unknown_header_is_refused(self):
+        message = bytearray(encode_batch(self.frame(), 1))
+        message[2] = 99
+        with self.assertRaises(ValueError):
+            decode_batch(bytes(message))
+
+    def test_frame_encoder_formats(self):
+        data = self.frame()
+        encoder = FrameEncoder(data, 7)
+        binary = encoder.encode(PROTOCOL_BINARY)
+        self.assertIs(encoder.encode(PROTOCOL_BINARY), binary)
+        self.assertEqual(decode_batch(binary)['seq'], 7)
+        text = json.loads(encoder.encode(PROTOCOL_JSON))
+        self.assertIs(encoder.encode(None), encoder.encode(PROTOCOL_JSON))
+        self.assertEqual(text['samples'], data['samples'].tolist())
+        self.assertEqual(text['q3'], data['samples'][-1, 6])
+
+class SampleBatchTests(SimpleTestCase):
+    """
+    Samples waiting for the next frame (SampleBatch), when the broadcaster drains them late.
+    """
+
+    def push(self, batch, start, count):
+        for k in range(start, start + count):
+            batch.push(batch.epoch + k, k, 0, 1, 0, 0, 0)
+
+    def test_drain_returns_the_samples_in_order(self):
+        batch = SampleBatch(capacity=8)
+        self.push(batch, 0, 5)
+        samples = batch.drain()
+        np.testing.assert_array_equal(samples[:, 0], range(5))
+        np.testing.assert_array_equal(samples[:, 1], range(5))
+        self.assertEqual(len(batch.drain()), 0)
+        self.assertEqual(batch.dropped, 0)
+
+    def test_full_batch_overwrites_only_the_oldest_samples(self):
+        batch = SampleBatch(capacity=8)
+        self.push(batch, 0, 11)
+        np.testing.assert_array_equal(batch.drain()[:, 1], range(3, 11))
+        self.assertEqual(batch.dropped, 3)
+
+        # The ring starts again from its first row after a drain
+        self.push(batch, 11, 9)
+        np.testing.assert_array_equal(batch.drain()[:, 1], range(12, 20))
+        self.assertEqual(batch.dropped, 4)
+
+class SeriesPackingTests(SimpleTestCase):
+    """
+    Packing of the shot time series (pack_series and unpack_series).
+    """
+
+    def test_round_trip(self):
+        values = [[0.25, -1.5], [3.0, 0.125], [-2.0, 8.0]]
+        blob, meta = pack_series(values, GRAVITY_CENTER_COLUMNS)
+        self.assertEqual(meta, {'dtype': '<f4', 'shape': [2, 3], 'columns': ['x', 'y']})
+        self.assertEqual(len(blob), 2 * 3 * 4)
+        columns = unpack_series(blob, meta)
+        np.testing.assert_array_equal(columns.T, values)
+        self.assertFalse(columns.flags.writeable)
+
+    def test_values_are_rounded_to_float32(self):
+        values = np.random.default_rng(0).normal(size=(50, 4))
+        blob, meta = pack_series(values, QUATERNION_COLUMNS)
+        np.testing.assert_array_equal(unpack_series(blob, meta).T, values.astype(np.float32))
+
+    def test_empty_series(self):
+        blob, meta = pack_series([], QUATERNION_COLUMNS)
+        self.assertEqual(unpack_series(blob, meta).shape, (4, 0))
+
+class PackedSeriesMigrationTests(TransactionTestCase):
+    """
+    Backfill of the JSON series into packed columns by migration 0002, and its reverse.
+    """
+
+    before = [("real_time", "0001_initial")]
+    after = [("real_time", "0002_packed_series")]
+
+    GRAVITY_CENTER = [[0.1, 0.2], [0.3, -0.4], [1e-3, 2.5]]
+    QUATERNION = [[1.0, 0.0, 0.0, 0.0], [0.5, 0.5, 0.5, 0.5]]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill_and_reverse(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model("auth", "User").objects.create(username="shooter")
+        data = apps.get_model("real_time", "Data").objects.create(
+            user=user, gravity_center=self.GRAVITY_CENTER, quaternion=self.QUATERNION, sliders_value=[10, 1])
+
+        apps = self.migrate(self.after)
+        packed = apps.get_model("real_time", "Data").objects.get(pk=data.pk)
+        self.assertEqual(packed.series_meta["gravity_center"]["columns"], GRAVITY_CENTER_COLUMNS)
+        np.testing.assert_array_equal(unpack_series(packed.gravity_center, packed.series_meta["gravity_center"]).T,
+                                      np.asarray(self.GRAVITY_CENTER, dtype=np.float32))
+        np.testing.assert_array_equal(unpack_series(packed.quaternion, packed.series_meta["quaternion"]).T,
+                                      np.asarray(self.QUATERNION, dtype=np.float32))
+
+        apps = self.migrate(self.before)
+        restored = apps.get_model("real_time", "Data").objects.get(pk=data.pk)
+        np.testing.assert_allclose(restored.gravity_center, self.GRAVITY_CENTER, rtol=1e-6)
+        np.testing.assert_array_equal(restored.quaternion, self.QUATERNION)
+
+class ShotWriterTests(TransactionTestCase):
+    """
+    Writing of the shots by batches from the writer thread (ShotWriter).
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="shooter")
+
+    def shot(self, shot_id):
+        data = Data(user=self.user, session_id=1, shot_id=shot_id, sliders_value=[10, 1])
+        t = np.linspace(-0.5, 0.5, 11)
+        data.set_series('gravity_center', np.column_stack((t, np.sin(t), np.cos(t))))
+        data.set_series('quaternion', np.column_stack((t, np.ones(11), np.zeros((11, 3)))))
+        return data
+
+    def write(self, writer, count):
+        for shot_id in range(1, count + 1):
+            self.assertTrue(writer.submit(self.shot(shot_id)))
+        writer.start()
+        writer.queue.join()
+
+    def test_shots_are_written_by_batches(self):
+        writer = ShotWriter(maxsize=8, batch_size=3)
+        # The shots are queued before the thread starts: 3, 3 and 1 shots per transaction
+        with mock.patch.object(transaction, 'atomic', wraps=transaction.atomic) as atomic:
+            self.write(writer, 7)
+        self.assertEqual(atomic.call_count, 3)
+        self.assertEqual(Data.objects.count(), 7)
+        self.assertEqual(ShotSummary.objects.count(), 7)
+        stats = writer.stats()
+        self.assertEqual((stats['written'], stats['dropped'], stats['queue_depth']), (7, 0, 0))
+        self.assertEqual(len(writer.latencies), 7)
+
+    def test_full_queue_drops_the_shot(self):
+        writer = ShotWriter(maxsize=2)
+        self.assertTrue(writer.submit(self.shot(1)))
+        self.assertTrue(writer.submit(self.shot(2)))
+        self.assertFalse(writer.submit(self.shot(3)))
+        self.assertEqual(writer.stats()['dropped'], 1)
+        self.assertEqual(writer.stats()['queue_depth'], 2)
+
+    def test_locked_database_is_retried(self):
+        save = Data.save
+        calls = []
+
+        def locked_once(data, *args, **kwargs):
+            calls.append(data.shot_id)
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+            return save(data, *args, **kwargs)
+
+        writer = ShotWriter(maxsize=8, batch_size=4)
+        with mock.patch.object(Data, 'save', locked_once):
+            self.write(writer, 2)
+        # The whole batch is written again in a new transaction
+        self.assertEqual(calls, [1, 1, 2])
+        self.assertEqual(sorted(Data.objects.values_list('shot_id', flat=True)), [1, 2])
+        self.assertEqual(ShotSummary.objects.count(), 2)
+        self.assertEqual((writer.written, writer.dropped), (2, 0))
+
+class ReportDecoderTests(SimpleTestCase):
+    """
+    Batch decoding of the Wiiboard reports (ReportDecoder), checked against the scalar path (calcMass).
+    """
+
+    # TR, BR, TL, BL at 0 kg, then at 17 kg, then at 34 kg
+    CALIBRATION = [1000, 1100, 900, 1200, 2700, 2900, 2500, 3000, 4400, 4700, 4100, 4800]
+
+    def setUp(self):
+        self.board = Wiiboard(headless=True)
+        self.board.calibration = list(self.CALIBRATION)
+        self.decoder = ReportDecoder(self.CALIBRATION, capacity=64)
+
+    def reports(self, raw):
+        return np.asarray(raw, dtype='>u2').tobytes()
+
+    def scalar(self, raw):
+        rows = []
+        for sensors in raw:
+            # decodeReport takes the 2 bytes of the buttons before the sensors
+            payload = b"\x00\x00" + self.reports([sensors])
+            topLeft, topRight, bottomLeft, bottomRight = self.board.decodeReport(payload, 0.0)
+            total = topLeft + topRight + bottomLeft + bottomRight
+            rows.append([topLeft, topRight, bottomLeft, bottomRight, total, *centerOfMass(topLeft, topRight, bottomLeft, bottomRight)])
+        return np.array(rows)
+
+    def test_matches_calc_mass(self):
+        # Raw values below the 0 kg value, between the calibration points, at them and above 34 kg
+        rng = np.random.default_rng(1)
+        raw = rng.integers(0, 6000, size=(60, 4))
+        raw[0] = self.CALIBRATION[0:4]
+        raw[1] = self.CALIBRATION[4:8]
+        raw[2] = self.CALIBRATION[8:12]
+        decoded = self.decoder.decode(self.reports(raw))
+        np.testing.assert_allclose(decoded, self.scalar(raw), rtol=1e-12, atol=1e-12)
+
+    def test_empty_board(self):
+        raw = [[0, 0, 0, 0], [500, 500, 500, 500]]
+        decoded = self.decoder.decode(self.reports(raw))
+        np.testing.assert_array_equal(decoded, 0)
+
+    def test_count_and_reuse(self):
+        raw = np.random.default_rng(2).integers(0, 6000, size=(10, 4))
+        data = self.reports(raw)
+        first = self.decoder.decode(data, 4).copy()
+        self.assertEqual(first.shape, (4, 7))
+        np.testing.assert_allclose(first, self.scalar(raw[:4]), rtol=1e-12, atol=1e-12)
+        # The output is overwritten by the next call
+        second = self.decoder.decode(data[4 * SENSOR_BYTES:])
+        np.testing.assert_allclose(second, self.scalar(raw[4:]), rtol=1e-12, atol=1e-12)
+
+def frames(*values):
+    return b"".join(FRAME.pack(*frame) for frame in values)
+
+def quaternion_frames(count, microphone=10):
+    # Unit quaternions, exactly representable in float32
+    quaternions = [(1.0, 0.0, 0.0, 0.0), (0.5, 0.5, 0.5, 0.5), (0.0, 1.0, 0.0, 0.0), (0.5, -0.5, 0.5, -0.5)]
+    return [(microphone,) + quaternions[k % len(quaternions)] for k in range(count)]
+
+class FakeSocket:
+    """
+    Socket returning the given chunks of bytes, one per recv_into, then stopping the reader.
+    """
+
+    def __init__(self, reader, chunks):
+        self.reader = reader
+        self.chunks = list(chunks)
+
+    def recv_into(self, view, size):
+        if not self.chunks:
+            self.reader.connected = False
+            raise OSError("no more data")
+        chunk = self.chunks.pop(0)
+        view[:len(chunk)] = chunk
+        return len(chunk)
+
+class SensorFramingTests(SimpleTestCase):
+    """
+    Framing of the ESP32 stream (BluetoothReader.decodeFrames, resync and read).
+    """
+
+    def setUp(self):
+        self.reader = BluetoothReader("ESP32")
+
+    def decode(self, data, start=0, received=1.0):
+        buffer = bytearray(BUFFER_SIZE)
+        buffer[:len(data)] = data
+        return self.reader.decodeFrames(memoryview(buffer), start, len(data), received)
+
+    def pushed(self):
+        return self.reader.samples.drain()
+
+    def test_frame_split_over_two_reads(self):
+        values = quaternion_frames(2)
+        data = frames(*values)
+        self.assertEqual(self.decode(data[:FRAME_SIZE + 7]), FRAME_SIZE)
+        self.assertEqual(self.decode(data, FRAME_SIZE), len(data))
+        np.testing.assert_array_equal(self.pushed()[:, 1:], [frame[1:] for frame in values])
+        self.assertEqual(self.reader.frames, 2)
+
+    def test_read_reassembles_frames_from_arbitrary_chunks(self):
+        values = quaternion_frames(12)
+        data = frames(*values)
+        chunks = [data[:5], data[5:30], data[30:31], data[31:150], data[150:]]
+        self.reader.connected = True
+        self.reader.socket = FakeSocket(self.reader, chunks)
+        self.reader.read()
+        np.testing.assert_array_equal(self.pushed()[:, 1:], [frame[1:] for frame in values])
+        self.assertEqual(self.reader.skipped, 0)
+
+    def test_burst_is_decoded_at_once(self):
+        values = quaternion_frames(40)
+        data = frames(*values)
+        self.assertEqual(self.decode(data, received=2.5), len(data))
+        samples = self.pushed()
+        self.assertEqual(len(samples), 40)
+        np.testing.assert_array_equal(samples[:, 0], 2.5)
+        np.testing.assert_array_equal(samples[:, 1:], [frame[1:] for frame in values])
+        self.assertEqual(self.reader.detector.count, 40)
+
+    def test_resync_after_leading_garbage(self):
+        values = quaternion_frames(3)
+        data = b"\xff\xff\xff" + frames(*values)
+        self.assertEqual(self.decode(data), len(data))
+        self.assertEqual(self.reader.skipped, 3)
+        np.testing.assert_array_equal(self.pushed()[:, 1:], [frame[1:] for frame in values])
+
+    def test_resync_after_garbage_inside_a_burst(self):
+        first = quaternion_frames(10)
+        second = quaternion_frames(10, microphone=20)
+        data = frames(*first) + b"\xff" * 5 + frames(*second)
+        self.assertEqual(self.decode(data), len(data))
+        self.assertEqual(self.reader.frames, 20)
+        self.assertEqual(self.reader.skipped, 5)
+        np.testing.assert_array_equal(self.pushed()[:, 1:], [frame[1:] for frame in first + second])
+
+    def test_incomplete_frame_is_kept(self):
+        data = frames(*quaternion_frames(1))
+        self.assertEqual(self.decode(data[:FRAME_SIZE - 1]), 0)
+        self.assertEqual(len(self.pushed()), 0)
+
+    def test_resync_keeps_the_bytes_that_may_start_a_frame(self):
+        data = b"\xff" * (FRAME_SIZE + 3)
+        boundary = self.reader.resync(memoryview(data), 1, len(data))
+        self.assertEqual(boundary, len(data) - FRAME_SIZE + 1)
+
+class TriggerDetectorTests(SimpleTestCase):
+    """
+    Shot detection on the microphone amplitude (TriggerDetector).
+    """
+
+    # Quiet, then a rising edge: 600 and 800 are above the onset level (500) but below the threshold
+    SIGNAL = [10, 20, 10, 600, 800, 1500, 900, 30]
+
+    def feed(self, detector, amplitudes, start=0.0, period=0.01):
+        shots = []
+        for k, amplitude in enumerate(amplitudes):
+            shot = detector.update(start + k * period, amplitude)
+            if shot is not None:
+                shots.append(shot)
+        return shots
+
+    def test_onset_is_the_start_of_the_rising_edge(self):
+        detector = TriggerDetector(threshold=1000, refractory=1, onset=0.5)
+        shots = self.feed(detector, self.SIGNAL)
+        self.assertEqual(len(shots), 1)
+        self.assertEqual(shots[0].index, 3)
+        self.assertAlmostEqual(shots[0].time, 0.03)
+        self.assertEqual(shots[0].amplitude, 1500)
+        self.assertIs(detector.take(), shots[0])
+        self.assertIsNone(detector.take())
+
+    def test_onset_without_rising_edge_is_the_crossing_sample(self):
+        detector = TriggerDetector(threshold=1000, refractory=1, onset=0.5)
+        shots = self.feed(detector, [10, 10, 2000])
+        self.assertEqual(shots[0].index, 2)
+        self.assertAlmostEqual(shots[0].time, 0.02)
+
+    def test_refractory_period(self):
+        detector = TriggerDetector(threshold=1000, refractory=1, onset=0.5)
+        # A second crossing 0.5 s later is the same shot, another one 1.5 s later is a new shot
+        amplitudes = [10] * 200
+        for crossing in (10, 60, 160):
+            amplitudes[crossing] = 2000
+        shots = self.feed(detector, amplitudes)
+        self.assertEqual([shot.index for shot in shots], [10, 160])
+        self.assertEqual(detector.shots, 2)
+
+    def test_extend_detects_as_update(self):
+        amplitudes = np.array([10] * 20 + self.SIGNAL + [10] * 20)
+        times = [k * 0.01 for k in range(len(amplitudes))]
+        detector = TriggerDetector(threshold=1000, refractory=1, onset=0.5)
+        detector.extend(times, amplitudes[:20])
+        detector.extend(times[20:], amplitudes[20:])
+        shot = detector.take()
+        self.assertEqual(shot.index, 23)
+        self.assertAlmostEqual(shot.time, 0.23)
+        self.assertEqual(detector.count, len(amplitudes))
+
+    def test_quiet_burst_keeps_the_history(self):
+        # The rising edge started in a quiet burst: the onset is found in the samples it left in the history
+        detector = TriggerDetector(threshold=1000, refractory=1, onset=0.5)
+        detector.extend([0.0, 0.01, 0.02], np.array([10, 600, 800]))
+        shot = detector.update(0.03, 1500)
+        self.assertEqual(shot.index, 1)
+        self.assertAlmostEqual(shot.time, 0.01)
+
+class StreamRecorderTests(SimpleTestCase):
+    """
+    Recording of the raw streams to memory-mapped chunks (StreamRecorder) and reading them back (StreamReader).
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def rows(self, start, count):
+        # Times start at 1 s, every 10 ms: a recorded time is never 0
+        t = 1.0 + 0.01 * np.arange(start, start + count)
+        return np.column_stack((t, np.arange(start, start + count), -np.arange(start, start + count)))
+
+    def test_rotation(self):
+        recorder = StreamRecorder(self.directory.name, "wiiboard", 2, chunk_samples=8)
+        recorder.append(self.rows(0, 5))
+        recorder.append(self.rows(5, 15))
+        recorder.close()
+        self.assertEqual([chunk['count'] for chunk in recorder.chunks], [8, 8, 4])
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         ["wiiboard-00000.npy", "wiiboard-00001.npy", "wiiboard-00002.npy", "wiiboard.json"])
+
+        reader = StreamReader(self.directory.name, "wiiboard")
+        np.testing.assert_array_equal(reader.slice(0, 100), self.rows(0, 20))
+        self.assertEqual(reader.time_range(), (1.0, 1.19))
+
+    def test_recovery_from_the_zero_filled_tail(self):
+        # The recorder is never closed: the index was last written when the chunks were created
+        recorder = StreamRecorder(self.directory.name, "sensors", 2, chunk_samples=8)
+        recorder.append(self.rows(0, 11))
+        recorder.chunk.flush()
+
+        reader = StreamReader(self.directory.name, "sensors")
+        self.assertEqual([chunk['count'] for chunk in reader.chunks], [8, 3])
+        np.testing.assert_array_equal(reader.slice(0, 100), self.rows(0, 11))
+
+        # A new recorder continues the stream after the rows already written
+        recorder = StreamRecorder(self.directory.name, "sensors", 2, chunk_samples=8)
+        recorder.append(self.rows(11, 2))
+        recorder.close()
+        np.testing.assert_array_equal(StreamReader(self.directory.name, "sensors").slice(0, 100), self.rows(0, 13))
+
+    def test_continued_stream_keeps_its_epoch(self):
+        recorder = StreamRecorder(self.directory.name, "wiiboard", 2, chunk_samples=8)
+        recorder.append(self.rows(0, 3))
+        recorder.close()
+        # Recorded by another process, whose wall-clock dating of the monotonic times differs
+        path = os.path.join(self.directory.name, "wiiboard.json")
+        with open(path) as file:
+            index = json.load(file)
+        index['epoch'] = 1000.0
+        with open(path, 'w') as file:
+            json.dump(index, file)
+
+        recorder = StreamRecorder(self.directory.name, "wiiboard", 2, chunk_samples=8)
+        self.assertEqual(recorder.epoch, 1000.0)
+        recorder.append(self.rows(3, 2))
+        recorder.close()
+        self.assertEqual(StreamReader(self.directory.name, "wiiboard").epoch, 1000.0)
+
+    def test_empty_last_chunk_is_ignored(self):
+        recorder = StreamRecorder(self.directory.name, "wiiboard", 2, chunk_samples=4)
+        recorder.rotate()
+        reader = StreamReader(self.directory.name, "wiiboard")
+        self.assertIsNone(reader.time_range())
+        self.assertEqual(reader.slice(0, 100).shape, (0, 3))
+
+    def test_slice_bounds(self):
+        recorder = StreamRecorder(self.directory.name, "wiiboard", 2, chunk_samples=8)
+        recorder.append(self.rows(0, 20))
+        recorder.close()
+        reader = StreamReader(self.directory.name, "wiiboard")
+        times = self.rows(0, 20)[:, 0]
+
+        # Start included, end excluded, across the chunk boundaries
+        np.testing.assert_array_equal(reader.slice(times[3], times[17]), self.rows(3, 14))
+        np.testing.assert_array_equal(reader.slice(times[8], times[16]), self.rows(8, 8))
+        np.testing.assert_array_equal(reader.slice(times[7] + 0.001, times[9]), self.rows(8, 1))
+        self.assertEqual(len(reader.slice(times[5], times[5])), 0)
+        self.assertEqual(len(reader.slice(0, times[0])), 0)
+        self.assertEqual(len(reader.slice(times[19] + 0.001, 100)), 0)
+        np.testing.assert_array_equal(reader.slice(times[19], 100), self.rows(19, 1))
+
+class CountingSimulator(SimulatorTransport):
+    """
+    Simulator recording the names searched by each inquiry.
+    """
+
+    def __init__(self):
+        super().__init__(seed=0)
+        self.inquiries = []
+
+    def discoverAll(self, names, duration=3):
+        self.inquiries.append(list(names))
+        return super().discoverAll(names, duration)
+
+class FakeClock:
+    """
+    Monotonic clock advanced only by sleep, to replace the time module of deviceLink.
+    """
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class DeviceLinkTests(SimpleTestCase):
+    """
+    Reconnection with backoff and gaps of a device link (DeviceLink).
+    """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(deviceLink, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.attempts = []
+
+    def attempt_failing(self, failures):
+        def attempt():
+            self.attempts.append(self.clock.now)
+            if len(self.attempts) <= failures:
+                raise OSError("host is down")
+            return True
+        return attempt
+
+    def test_backoff_sequence(self):
+        link = DeviceLink("Wiiboard")
+        link.lose(OSError("timed out"))
+        self.assertTrue(link.recover(self.attempt_failing(7), lambda: False))
+        # The waits double up to the last delay, which is repeated
+        np.testing.assert_allclose(np.diff(self.attempts), [0.5, 1, 2, 4, 8, 8, 8])
+        self.assertEqual((link.attempts, link.reconnections, link.stale), (7, 1, False))
+        self.assertEqual(link.error, "host is down")
+
+    def test_gaps(self):
+        link = DeviceLink("Sensors")
+        link.lose("timed out")
+        # A second error while the link is down is the same loss
+        self.clock.sleep(1)
+        link.lose("still down")
+        self.assertEqual(link.gaps, [[100.0, None]])
+        self.assertEqual(link.stats()['down'], 1)
+        self.assertTrue(link.stats()['stale'])
+
+        self.assertTrue(link.recover(self.attempt_failing(1), lambda: False))
+        self.assertEqual(link.gaps, [[100.0, 101.5]])
+
+        self.clock.sleep(10)
+        link.lose("timed out")
+        self.clock.sleep(2)
+        link.restore()
+        stats = link.stats()
+        self.assertEqual(link.gaps, [[100.0, 101.5], [111.5, 113.5]])
+        self.assertEqual((stats['losses'], stats['reconnections'], stats['down']), (2, 2, 3.5))
+
+    def test_give_up_and_stop(self):
+        link = DeviceLink("Wiiboard", give_up=3)
+        link.lose("timed out")
+        self.assertFalse(link.recover(self.attempt_failing(100), lambda: False))
+        np.testing.assert_allclose(self.attempts, [100, 100.5, 101.5, 103.5])
+        self.assertTrue(link.stale)
+        self.assertEqual(link.gaps, [[100.0, None]])
+
+        # A stop is seen between two sleeps, not after the whole delay
+        link = DeviceLink("Wiiboard")
+        stop = self.clock.now + 0.6
+        self.attempts.clear()
+        self.assertFalse(link.recover(self.attempt_failing(100), lambda: self.clock.now >= stop))
+        self.assertEqual(len(self.attempts), 2)
+        self.assertLess(self.clock.now - stop, deviceLink.STOP_CHECK)
+
+class DeviceCacheTests(SimpleTestCase):
+    """
+    Cache of the device addresses and calibrations (DeviceCache), and its use by connectDevices.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "devices.json")
+        self.transport = CountingSimulator()
+        self.attempts = []
+
+    def connector(self, name, reachable=SIMULATED_ADDRESS):
+        def connect(address):
+            self.attempts.append((name, address))
+            return address == reachable
+        return connect
+
+    def test_saved_and_loaded(self):
+        cache = DeviceCache(self.path)
+        cache.remember("Nintendo RVL-WBC-01", "AA")
+        cache.storeCalibration("AA", range(12))
+        # Written to a temporary file then renamed over the cache
+        self.assertEqual(os.listdir(self.directory.name), ["devices.json"])
+
+        cache = DeviceCache(self.path)
+        self.assertEqual(cache.address("Nintendo RVL-WBC-01"), "AA")
+        self.assertEqual(cache.calibration("AA"), list(range(12)))
+        cache.forget("Nintendo RVL-WBC-01")
+        self.assertIsNone(DeviceCache(self.path).address("Nintendo RVL-WBC-01"))
+
+    def test_unreadable_file_is_an_empty_cache(self):
+        with open(self.path, 'w') as file:
+            file.write("{not json")
+        cache = DeviceCache(self.path)
+        self.assertEqual((cache.addresses, cache.calibrations), ({}, {}))
+
+    def test_pinned_address_is_never_overwritten(self):
+        cache = DeviceCache(self.path, pinned={"Wiiboard": "PIN"})
+        cache.remember("Wiiboard", "OTHER")
+        self.assertEqual(cache.address("Wiiboard"), "PIN")
+        self.assertTrue(cache.isPinned("Wiiboard"))
+
+        # Not reachable at its address: it is not searched for
+        results = connectDevices({"Wiiboard": self.connector("Wiiboard")}, self.transport, cache, duration=0)
+        self.assertEqual(results, {"Wiiboard": False})
+        self.assertEqual(self.attempts, [("Wiiboard", "PIN")])
+        self.assertEqual(self.transport.inquiries, [])
+
+    def test_cached_devices_are_tried_before_one_inquiry(self):
+        cache = DeviceCache(self.path)
+        cache.remember("Wiiboard", SIMULATED_ADDRESS)
+        connectors = {"Wiiboard": self.connector("Wiiboard"), "ESP32": self.connector("ESP32")}
+        results = connectDevices(connectors, self.transport, cache, duration=0)
+        self.assertEqual(results, {"Wiiboard": True, "ESP32": True})
+        self.assertEqual(self.attempts, [("Wiiboard", SIMULATED_ADDRESS), ("ESP32", SIMULATED_ADDRESS)])
+        self.assertEqual(self.transport.inquiries, [["ESP32"]])
+        self.assertEqual(DeviceCache(self.path).address("ESP32"), SIMULATED_ADDRESS)
+
+        # Everything is cached now: no inquiry at all
+        self.attempts.clear()
+        connectDevices(connectors, self.transport, cache, duration=0)
+        self.assertEqual(sorted(self.attempts), [("ESP32", SIMULATED_ADDRESS), ("Wiiboard", SIMULATED_ADDRESS)])
+        self.assertEqual(len(self.transport.inquiries), 1)
+
+    def test_stale_addresses_share_a_single_inquiry(self):
+        cache = DeviceCache(self.path)
+        cache.remember("Wiiboard", "OLD-1")
+        cache.remember("ESP32", "OLD-2")
+        connectors = {"Wiiboard": self.connector("Wiiboard"), "ESP32": self.connector("ESP32")}
+        results = connectDevices(connectors, self.transport, cache, duration=0)
+        self.assertEqual(results, {"Wiiboard": True, "ESP32": True})
+        self.assertEqual(self.transport.inquiries, [["Wiiboard", "ESP32"]])
+        self.assertEqual(cache.addresses, {"Wiiboard": SIMULATED_ADDRESS, "ESP32": SIMULATED_ADDRESS})
+
+class ConnectionJobTests(SimpleTestCase):
+    """
+    Background connection of the devices (ConnectionJob, ConnectionJobs) and its status endpoint.
+    """
+
+    def setUp(self):
+        self.transport = CountingSimulator()
+        self.calibrated = threading.Event()
+        self.addCleanup(self.calibrated.set)
+
+    def calibrate(self):
+        return self.calibrated.wait(5)
+
+    def start(self, jobs, connectors=None, calibrate=None):
+        connectors = connectors or {"Wiiboard": lambda address: True, "ESP32": lambda address: True}
+        return jobs.start(connectors, self.transport, None, {"Wiiboard": ('calibrating', calibrate or self.calibrate)})
+
+    def wait_for(self, job, name, state):
+        for _ in range(100):
+            if job.status()['devices'][name]['state'] == state:
+                return
+            time.sleep(0.01)
+        self.fail("%s never %s" % (name, state))
+
+    def test_transitions(self):
+        job = self.start(ConnectionJobs())
+        self.wait_for(job, "Wiiboard", 'calibrating')
+        status = job.status()
+        self.assertFalse(status['done'])
+        self.assertEqual(status['devices']["ESP32"]['state'], 'connected')
+
+        self.calibrated.set()
+        self.assertTrue(job.done.wait(5))
+        devices = job.status()['devices']
+        self.assertEqual(devices["Wiiboard"]['state'], 'connected')
+        # Nothing was cached: both devices were searched for before being opened
+        self.assertEqual(sorted(devices["Wiiboard"]['timings']), ['calibrating', 'connecting', 'discovering', 'pending'])
+        self.assertEqual(sorted(devices["ESP32"]['timings']), ['connecting', 'discovering', 'pending'])
+
+    def test_failures(self):
+        def broken(address):
+            raise OSError("host is down")
+
+        self.calibrated.set()
+        job = self.start(ConnectionJobs(), {"Wiiboard": lambda address: True, "ESP32": broken})
+        self.assertTrue(job.done.wait(5))
+        self.assertEqual(job.status()['devices']["ESP32"]['state'], 'failed')
+        self.assertEqual(job.status()['devices']["Wiiboard"]['state'], 'connected')
+
+        job = self.start(ConnectionJobs(), {"Wiiboard": lambda address: True}, calibrate=lambda: False)
+        self.assertTrue(job.done.wait(5))
+        self.assertEqual(job.status()['devices']["Wiiboard"]['state'], 'failed')
+
+    def test_device_being_connected_is_not_started_again(self):
+        jobs = ConnectionJobs()
+        job = self.start(jobs)
+        self.wait_for(job, "Wiiboard", 'calibrating')
+        self.assertIs(self.start(jobs, {"Wiiboard": lambda address: True}), job)
+        self.calibrated.set()
+        self.assertTrue(job.done.wait(5))
+        self.assertEqual(self.start(jobs).number, job.number + 1)
+
+    def test_status_endpoint(self):
+        station = views.stations[websocket.DEFAULT_STATION]
+        job = self.start(station.jobs)
+        self.wait_for(job, "Wiiboard", 'calibrating')
+        response = self.client.get("/connectionStatus/%d" % job.number)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['devices']["Wiiboard"]['state'], 'calibrating')
+
+        self.calibrated.set()
+        job.done.wait(5)
+        status = self.client.get("/station/%s/connectionStatus/%d" % (websocket.DEFAULT_STATION, job.number)).json()
+        self.assertTrue(status['done'])
+        self.assertEqual(status['id'], job.number)
+
+        self.assertEqual(self.client.get("/connectionStatus/%d" % (job.number + 100)).status_code, 404)
+        self.assertEqual(self.client.get("/station/nowhere/connectionStatus/%d" % job.number).status_code, 404)
+
+class TelemetryWebSocketTests(TransactionTestCase):
+    """
+    Handshake checks of the telemetry route (websocket.application) and the reference values sent by its clients.
+    """
+
+    REFERENCES = {'q0_ref': 1, 'q1_ref': 0, 'q2_ref': 0, 'q3_ref': 0, 'sliderSensitivityStabilityValue': 12,
+                  'sliderSensitivityValue': 2, 'Xcalibration': 0.1, 'Ycalibration': -0.2}
+
+    def setUp(self):
+        # A hub of their own, as the connections attach it to the event loop of each test
+        patcher = mock.patch.object(websocket, 'hub', websocket.TelemetryHub())
+        self.hub = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.hub.stations = set(views.stations)
+        self.hub.on_message = views.handle_message
+
+        self.user = get_user_model().objects.create(username="shooter")
+        self.client.force_login(self.user)
+        self.station = views.stations[websocket.DEFAULT_STATION]
+        self.addCleanup(setattr, self.station, 'user_id', self.station.user_id)
+        for attribute in ('quat_ref', 'slidersValues', 'centerGravity_ref'):
+            self.addCleanup(setattr, self.station, attribute, getattr(self.station, attribute))
+
+    def headers(self, origin="http://testserver", session=True):
+        headers = [(b'host', b'testserver')]
+        if origin is not None:
+            headers.append((b'origin', origin.encode()))
+        if session:
+            cookie = "%s=%s" % (settings.SESSION_COOKIE_NAME, self.client.cookies[settings.SESSION_COOKIE_NAME].value)
+            headers.append((b'cookie', cookie.encode()))
+        return headers
+
+    def run_client(self, path=websocket.PATH, headers=None, texts=(), subprotocols=()):
+        """
+        Connects a client, sends it the given texts then disconnects it, and returns what the server sent.
+        """
+
+        scope = {'type': 'websocket', 'path': path, 'headers': self.headers() if headers is None else headers,
+                 'subprotocols': list(subprotocols)}
+        incoming = [{'type': 'websocket.connect'}]
+        incoming += [{'type': 'websocket.receive', 'text': text} for text in texts]
+        incoming.append({'type': 'websocket.disconnect'})
+        sent = []
+
+        async def receive():
+            return incoming.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(websocket.application(scope, receive, send))
+        return sent
+
+    def test_unknown_station_is_refused(self):
+        sent = self.run_client("/ws/real_time/nowhere/")
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': websocket.CLOSE_NOT_FOUND}])
+        self.assertEqual(self.run_client("/ws/real_time/a/b/")[0]['code'], websocket.CLOSE_NOT_FOUND)
+
+    def test_cross_origin_is_refused(self):
+        sent = self.run_client(headers=self.headers(origin="https://elsewhere.example"))
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': websocket.CLOSE_FORBIDDEN_ORIGIN}])
+
+    def test_anonymous_is_refused(self):
+        sent = self.run_client(headers=self.headers(session=False))
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': websocket.CLOSE_UNAUTHENTICATED}])
+
+        # The cookie of a session that was logged out is anonymous too
+        headers = self.headers()
+        self.client.logout()
+        self.assertEqual(self.run_client(headers=headers)[0]['code'], websocket.CLOSE_UNAUTHENTICATED)
+
+    def test_logged_in_client_is_accepted(self):
+        # Clients that are not browsers send no Origin
+        for origin in ("http://testserver", None):
+            sent = self.run_client(headers=self.headers(origin=origin), subprotocols=["other", PROTOCOL_BINARY])
+            self.assertEqual(sent, [{'type': 'websocket.accept', 'subprotocol': PROTOCOL_BINARY}])
+        self.assertEqual(self.hub.connections(self.station.group()), [])
+
+    def test_references_of_the_user_measuring(self):
+        self.station.user_id = self.user.pk
+        self.run_client(texts=[json.dumps(self.REFERENCES)])
+        self.assertEqual(self.station.quat_ref, [1, 0, 0, 0])
+        self.assertEqual(self.station.slidersValues, [12, 2])
+        self.assertEqual(self.station.centerGravity_ref, [0.1, -0.2])
+
+        # Another user only watches
+        self.station.user_id = self.user.pk + 1
+        self.run_client(texts=[json.dumps(dict(self.REFERENCES, q0_ref=0.5))])
+        self.assertEqual(self.station.quat_ref, [1, 0, 0, 0])
+
+    def test_invalid_references_are_ignored(self):
+        self.station.user_id = self.user.pk
+        self.station.quat_ref = [1, 0, 0, 0]
+        without_key = dict(self.REFERENCES)
+        del without_key['Ycalibration']
+        texts = ["not json", "[1, 2]", json.dumps(without_key), json.dumps(dict(self.REFERENCES, q1_ref="0.5")),
+                 json.dumps(dict(self.REFERENCES, q1_ref=True)), json.dumps(dict(self.REFERENCES, q1_ref=None)),
+                 json.dumps(dict(self.REFERENCES, q1_ref=float('nan'))), json.dumps(dict(self.REFERENCES, q1_ref=[0]))]
+        sent = self.run_client(texts=texts)
+        self.assertEqual(sent[0]['type'], 'websocket.accept')
+        self.assertEqual(self.station.quat_ref, [1, 0, 0, 0])
+
+    def test_reference_values(self):
+        values = reference_values(self.REFERENCES)
+        self.assertEqual(values, {'quat_ref': [1, 0, 0, 0], 'slidersValues': [12, 2], 'centerGravity_ref': [0.1, -0.2]})
+        for value in (math.inf, -math.nan, "1", None, False, {}):
+            self.assertIsNone(reference_values(dict(self.REFERENCES, Xcalibration=value)))
+        self.assertIsNone(reference_values([self.REFERENCES]))
+
+@override_settings(REAL_TIME_TRANSPORT='simulator', REAL_TIME_STATIONS={'a': {}, 'b': {}})
+class StationConnectionTests(SimpleTestCase):
+    """
+    Connection of the devices of several stations at once, whose Wiiboards all have the same name.
+    """
+
+    def setUp(self):
+        self.stations = create_stations(ShotWriter())
+        for station in self.stations.values():
+            self.addCleanup(station.board.disconnect)
+
+    def test_each_station_connects_its_own_wiiboard(self):
+        a, b = self.stations['a'], self.stations['b']
+        first = a.connect(True, False)
+        second = b.connect(True, False)
+        self.assertNotEqual(first, second)
+        self.assertTrue(a.jobs.get(first).done.wait(15))
+        self.assertTrue(b.jobs.get(second).done.wait(15))
+        self.assertEqual((a.board.status, b.board.status), ("Connected", "Connected"))
+        self.assertEqual(b.job_status(second)['devices'][wiiboard.BLUETOOTH_NAME]['state'], 'connected')
+
+        # A station does not answer for the jobs of another one
+        self.assertIsNone(b.job_status(first))
+        with mock.patch.object(views, 'stations', self.stations):
+            self.assertEqual(self.client.get("/station/a/connectionStatus/%d" % first).status_code, 200)
+            self.assertEqual(self.client.get("/station/b/connectionStatus/%d" % first).status_code, 404)
+
+class ConnectionQueueTests(SimpleTestCase):
+    """
+    Bounded send queue of a WebSocket client (websocket.Connection).
+    """
+
+    def test_slow_client_loses_its_oldest_frames(self):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def run():
+            connection = websocket.Connection(send, 1, websocket.DEFAULT_STATION, None)
+            self.assertEqual(connection.queue.maxsize, websocket.QUEUE_SIZE)
+            # The writer is not started yet: the client reads nothing meanwhile
+            for number in range(7):
+                connection.put("frame %d" % number)
+            self.assertEqual(connection.dropped, 3)
+            self.assertEqual(connection.stats()['pending'], 4)
+
+            connection.start()
+            for _ in range(100):
+                if connection.sent == 4:
+                    break
+                await asyncio.sleep(0)
+            connection.stop()
+            return connection.stats()
+
+        stats = asyncio.run(run())
+        self.assertEqual([message['text'] for message in sent], ["frame 3", "frame 4", "frame 5", "frame 6"])
+        self.assertEqual((stats['sent'], stats['dropped'], stats['pending']), (4, 3, 0))
+
+class SharedRingTests(SimpleTestCase):
+    """
+    Ring of telemetry rows in shared memory (SharedRing), read with since() while the writer goes on.
+    """
+
+    def setUp(self):
+        self.ring = SharedRing.create("realtime-test-%d" % os.getpid(), 8, 3)
+        self.addCleanup(self.ring.close)
+
+    def rows(self, start, count):
+        return np.column_stack((np.arange(start, start + count), np.zeros(count), np.ones(count))).astype(np.float64)
+
+    def test_since_returns_the_new_rows(self):
+        self.ring.append(self.rows(0, 5))
+        rows, cursor, lost = self.ring.since(0)
+        np.testing.assert_array_equal(rows, self.rows(0, 5))
+        self.assertEqual((cursor, lost), (5, 0))
+
+        self.ring.append(self.rows(5, 6))
+        rows, cursor, lost = self.ring.since(cursor)
+        np.testing.assert_array_equal(rows, self.rows(5, 6))
+        self.assertEqual((cursor, lost), (11, 0))
+        self.assertEqual(len(self.ring.since(cursor)[0]), 0)
+
+    def test_writer_laps_the_reader(self):
+        self.ring.append(self.rows(0, 3))
+        cursor = self.ring.since(0)[1]
+        self.ring.append(self.rows(3, 17))
+        rows, cursor, lost = self.ring.since(cursor)
+        np.testing.assert_array_equal(rows, self.rows(12, 8))
+        self.assertEqual((cursor, lost), (20, 9))
+
+    def test_append_larger_than_the_ring(self):
+        self.ring.append(self.rows(0, 21))
+        rows, cursor, lost = self.ring.since(0)
+        np.testing.assert_array_equal(rows, self.rows(13, 8))
+        self.assertEqual((cursor, lost), (21, 13))
+        np.testing.assert_array_equal(self.ring.latest(3), self.rows(18, 3))
+
+    def test_rows_reserved_by_the_writer_are_discarded(self):
+        self.ring.append(self.rows(0, 10))
+        # The writer has reserved 4 more rows and may be overwriting the rows 6 to 9 of the previous lap
+        self.ring.header[HEADER_RESERVED] = 14
+        rows, cursor, lost = self.ring.since(4)
+        np.testing.assert_array_equal(rows, self.rows(6, 4))
+        self.assertEqual((cursor, lost), (10, 2))
+
+    def test_state(self):
+        self.assertEqual(self.ring.state(), {'session': None, 'shot': 0, 'stale': 0, 'age': None})
+        self.ring.publish(3, 7, 2)
+        state = self.ring.state()
+        self.assertEqual((state['session'], state['shot'], state['stale']), (3, 7, 2))
+        self.assertLess(state['age'], 1)
+
+
+class SampleStreamTests(SimpleTestCase):
+    """
+    Samples of a device between its reader thread and the capture stage (SampleStream).
+    """
+
+    def test_drain_returns_the_samples_in_order(self):
+        stream = SampleStream(2, capacity=8)
+        for k in range(5):
+            stream.push(k, k, -k)
+        samples = stream.drain()
+        np.testing.assert_array_equal(samples[:, 0], range(5))
+        np.testing.assert_array_equal(samples[:, 2], [-k for k in range(5)])
+        self.assertEqual(len(stream.drain()), 0)
+        self.assertEqual((stream.pushed, stream.dropped), (5, 0))
+
+    def test_full_stream_overwrites_the_oldest_samples(self):
+        stream = SampleStream(1, capacity=8)
+        for k in range(5):
+            stream.push(k, k)
+        stream.drain()
+        # The waiting samples wrap around the end of the rows
+        stream.extend(np.arange(5, 16), np.arange(5, 16).reshape(-1, 1))
+        np.testing.assert_array_equal(stream.drain()[:, 1], range(8, 16))
+        self.assertEqual((stream.pushed, stream.dropped), (16, 3))
+
+    def test_snapshot_and_changed(self):
+        stream = SampleStream(2)
+        first = stream.snapshot()
+        self.assertEqual(first, (0, None, (0.0, 0.0)))
+        self.assertFalse(stream.changed(first.sequence))
+
+        stream.push(1.5, 3, 4)
+        latest = stream.snapshot()
+        self.assertEqual(latest, (1, 1.5, (3, 4)))
+        self.assertTrue(stream.changed(first.sequence))
+        self.assertFalse(stream.changed(latest.sequence))
+
+        # Draining does not change the last sample
+        stream.drain()
+        self.assertIs(stream.snapshot(), latest)
+
+        stream.extend([2.0, 2.5], np.array([[5.0, 6.0], [7.0, 8.0]]))
+        self.assertEqual(stream.snapshot(), (3, 2.5, (7.0, 8.0)))
+        self.assertTrue(stream.changed(latest.sequence))
+
+    def test_push_sets_notify(self):
+        stream = SampleStream(1)
+        stream.notify = threading.Event()
+        stream.push(0, 1)
+        self.assertTrue(stream.notify.is_set())
+
+    def test_sequence_is_monotonic_while_pushing(self):
+        stream = SampleStream(1, capacity=64)
+        total = 20000
+
+        def produce():
+            for k in range(total):
+                stream.push(k, k)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        last = stream.snapshot()
+        drained = []
+        while producer.is_alive() or stream.changed(last.sequence):
+            snapshot = stream.snapshot()
+            self.assertGreaterEqual(snapshot.sequence, last.sequence)
+            if snapshot.sequence:
+                # The values are always the ones of the sample with this sequence number
+                self.assertEqual(snapshot.values, (snapshot.sequence - 1,))
+            last = snapshot
+            drained.append(stream.drain()[:, 1])
+        producer.join()
+        drained.append(stream.drain()[:, 1])
+
+        self.assertEqual(last.sequence, total)
+        received = np.concatenate(drained)
+        self.assertTrue(np.all(np.diff(received) > 0))
+        self.assertEqual(len(received) + stream.dropped, total)
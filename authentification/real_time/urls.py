@@ -1,10 +1,21 @@
-from django.urls import path
+from django.urls import path, include
 from real_time import views
 
-urlpatterns = [
+# Views of a station, at the root for the default station and under station/<id>/ for every station
+station_patterns = [
     path("wbb",views.wbb,name = "wbb"),
     path("connectSensors",views.connectSensors,name="connectSensors"),
     path("connectWiiboard",views.connectWiiboard,name="connectWiiboard"),
+    path("connectDevices",views.connectDevices,name="connectDevices"),
+    path("connectionStatus/<int:job_id>",views.connectionStatus,name="connectionStatus"),
+    path("linkStatus",views.linkStatus,name="linkStatus"),
+    path("clientStatus",views.clientStatus,name="clientStatus"),
     path('stop_measure/', views.stop_measure_view, name='stop_measure'),
     path('start_measure/', views.start_measure_view, name='start_measure')
-]
\ No newline at end of file
+]
+
+urlpatterns = station_patterns + [
+    path("stations",views.stationStatus,name="stationStatus"),
+    path("station/<str:station_id>/",views.stationHome,name="stationHome"),
+    path("station/<str:station_id>/",include(station_patterns)),
+]
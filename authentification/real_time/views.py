@@ -1,38 +1,25 @@
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse, JsonResponse, HttpResponseNotFound, HttpRequest
-import real_time.scripts.main as w
-import real_time.scripts.dataSensors as m
+from django.http import HttpResponse, JsonResponse, HttpResponseNotFound
 from django.contrib import messages
-import threading
-from .models import Data
-import copy
-import time
-from django.db.models import Max
-import asyncio
-import websockets
-import json
-
-new_session = True
-shot_id = 1
-session_id = None
-first_connexion = True
-
-measure_thread = None
-update_thread = None
-stop_measure = False
-
-def wbb(request):
+from real_time.writer import ShotWriter
+from real_time.station import create_stations, station_options
+from real_time.daemon import DaemonClient, DaemonError, RemoteStation
+from django.conf import settings
+from real_time import websocket
+
+def wbb(request, station_id=websocket.DEFAULT_STATION):
     """
-    View function for handling the real-time endpoint.
+    View function for handling the real-time endpoint of a station.
 
-    This function manages the interaction with Wiiboard and sensor data. It checks the status
-    of the Wiiboard and sensor connections, starts measurement and update threads if necessary,
-    manages session IDs for data aggregation, and renders appropriate templates based on the
-    connection status.
+    This function manages the interaction with the Wiiboard and the sensors of the station. It checks
+    the status of their connections, starts the measurement thread and the broadcaster of the station
+    if necessary, manages the session IDs for data aggregation, and renders appropriate templates
+    based on the connection status.
 
     Args:
         request (HttpRequest): The HTTP request object.
+        station_id (str): ID of the station.
 
     Returns:
         HttpResponse: A response object based on whether the Wiiboard and sensors are connected.
@@ -40,524 +27,323 @@ def wbb(request):
             an error message.
 
     Raises:
-        None
+        HttpResponseNotFound: If the station is unknown.
 
     Note:
-        - This function assumes the presence of global variables: session_id, new_session,
-          first_connexion, stop_measure, measure_thread, and update_thread.
-        - It requires the Wiiboard (`w.board`) and sensor reader (`m.reader`) to be connected
-          for proper functionality.
-        - The function starts measurement and update threads (`measure_thread` and `update_thread`)
-          if they are not already running.
-        - Manages session IDs (`session_id`) for data aggregation purposes.
+        - It requires the Wiiboard (`station.board`) and sensor reader (`station.reader`) to be
+          connected for proper functionality.
+        - The station starts its measurement thread and its broadcaster if they are not already
+          running, and opens a new session with the recorder of its raw streams when needed
+          (see Station.start_session).
+        - When the stations run in the acquisition daemon, the page shows its error if it is
+          not running.
 
     """
 
-    global session_id, new_session, first_connexion, stop_measure, measure_thread, update_thread
-    
-    if w.board.status == "Connected" and m.reader.connected==True:  
-
-        if not measure_thread or not measure_thread.is_alive():
-            stop_measure = False
-            measure_thread = threading.Thread(target=save_Measure, args=(request,))     
-            measure_thread.start()
-            update_thread = threading.Thread(target=update_Measure)     
-            update_thread.start()
- 
-        if first_connexion : 
-            session_id = Data.objects.filter(user=request.user).aggregate(Max('session_id'))['session_id__max']
-            first_connexion = False
-
-        if session_id is None :
-            session_id = 0
-        
-        if new_session : 
-            session_id = session_id + 1
-            new_session = False
-
-        return render(request,"real_time/main.html")
-    
-    else:
-        messages.error(request, "The sensors and the wiiboard must be connected before start")
+    station = stations.get(station_id)
+    if station is None:
+        return HttpResponseNotFound("Unknown station")
+
+    try:
+        if station.connected():
+            station.start_session(request.user)
+            return render(request,"real_time/main.html")
+
+        else:
+            messages.error(request, "The sensors and the wiiboard must be connected before start")
+            return render(request,"app/index.html")
+    except DaemonError as e:
+        messages.error(request, str(e))
         return render(request,"app/index.html")
 
 @csrf_exempt
-def stop_measure_view(request):
+def stop_measure_view(request, station_id=websocket.DEFAULT_STATION):
     """
-    View function for stopping measurement threads.
+    View function for stopping the measurement of a station.
 
-    This function stops the ongoing measurement and update threads by setting global flags
-    (`stop_measure`) and joining the threads (`measure_thread` and `update_thread`).
+    This function stops the ongoing measurement thread of the station, waiting for it, and its
+    broadcaster (see Station.stop).
 
     Args:
         request (HttpRequest): The HTTP request object.
+        station_id (str): ID of the station.
 
     Returns:
         HttpResponse: A plain text response indicating that the measurement has been stopped.
 
     Raises:
-        None
-
-    Note:
-        - This function assumes the presence of global variables: stop_measure, measure_thread,
-          and update_thread.
-        - It stops the measurement thread (`measure_thread`) if it exists by joining it.
-        - It stops the update thread (`update_thread`) if it exists by joining it.
+        HttpResponseNotFound: If the station is unknown.
 
     """
 
-    global stop_measure, measure_thread, update_thread
+    station = stations.get(station_id)
+    if station is None:
+        return HttpResponseNotFound("Unknown station")
 
-    stop_measure = True
-
-    if measure_thread is not None:
-        measure_thread.join()
-        measure_thread = None
-
-    if update_thread is not None:
-        update_thread.join()
-        update_thread = None
+    try:
+        station.stop()
+    except DaemonError as e:
+        return HttpResponse(str(e), status=503)
 
     return HttpResponse("Mesure arrêtée")
 
 @csrf_exempt
-def start_measure_view(request):
+def start_measure_view(request, station_id=websocket.DEFAULT_STATION):
     """
-    View function for starting measurement threads.
+    View function for starting the measurement of a station.
 
-    This function starts the measurement and update threads if they are not already running.
-    It sets the global flag (`stop_measure`) to False to ensure the measurement continues.
+    This function starts the measurement thread and the broadcaster of the station if they are
+    not already running (see Station.start_measure).
 
     Args:
         request (HttpRequest): The HTTP request object.
+        station_id (str): ID of the station.
 
     Returns:
         HttpResponse: A plain text response indicating that the measurement has been started.
 
     Raises:
-        None
-
-    Note:
-        - This function assumes the presence of global variables: stop_measure, measure_thread,
-          and update_thread.
-        - It starts the measurement thread (`measure_thread`) if it is not already running.
-        - It starts the update thread (`update_thread`) if it is not already running.
-        - The global flag `stop_measure` is set to False to allow the measurement to continue.
+        HttpResponseNotFound: If the station is unknown.
 
     """
 
-    global stop_measure, measure_thread, update_thread
-
-    stop_measure = False
+    station = stations.get(station_id)
+    if station is None:
+        return HttpResponseNotFound("Unknown station")
 
-    if measure_thread is None:
-        measure_thread = threading.Thread(target=save_Measure, args=(request,))     
-        measure_thread.start()
-
-    if update_thread is None:
-        update_thread = threading.Thread(target=update_Measure)
-        update_thread.start()
+    try:
+        station.start_measure(request.user)
+    except DaemonError as e:
+        return HttpResponse(str(e), status=503)
 
     return HttpResponse("Mesure arrêtée")
-    
-def connectWiiboard(request):
-    """
-    View function for connecting to Wiiboard.
 
-    This function attempts to connect to the Wiiboard using a separate thread (`Wiiboard_thread`).
-    It checks if the Wiiboard is already connected or if it needs to be connected.
-    Displays appropriate messages based on the connection status.
+def stationHome(request, station_id):
+    """
+    View function rendering the index page for a station, whose buttons act on its devices.
 
     Args:
         request (HttpRequest): The HTTP request object.
+        station_id (str): ID of the station.
 
     Returns:
-        HttpResponse: A rendered HTML page with success or error messages based on the Wiiboard connection status.
+        HttpResponse: The index page.
 
     Raises:
-        None
-
-    Note:
-        - This function assumes the presence of global variables or objects: w (Wiiboard instance).
-        - It starts a new thread (`Wiiboard_thread`) to attempt Wiiboard connection.
-        - Uses a while loop to wait until the Wiiboard is connected or found.
-        - Displays success or error messages based on the connection status.
-
+        HttpResponseNotFound: If the station is unknown.
     """
 
-    if(w.board.status == "Disconnected"):
-        Wiiboard_thread = threading.Thread(target=w.main)
-        Wiiboard_thread.daemon = True  
-        Wiiboard_thread.start()
-
-        while w.board.status!="Connected" and w.find == True:
-            time.sleep(1)
-
-        if w.board.status == "Disconnected":
-            messages.error(request,"Wiiboard not connected, please try again")
-        else : 
-            messages.success(request, "Wiiboard connected")
-
-        w.find = True
-        return render(request,"app/index.html")
-    
-    else : 
-        w.find = True
-        messages.error(request,"The Wiiboard is already connected")
-        return render(request,"app/index.html")
+    if station_id not in stations:
+        return HttpResponseNotFound("Unknown station")
+    return render(request, "app/index.html")
 
-def connectSensors(request):
+def start_connection(request, station_id, wiiboard_wanted, sensors_wanted):
     """
-    View function for connecting to sensors.
+    Starts connecting the requested devices of a station that are not connected, in the background.
 
-    This function attempts to connect to the microphone and accelerometer using a separate thread (`Sensors_thread`).
-    It checks if the sensors are already connected or if they need to be connected.
-    Displays appropriate messages based on the connection status.
+    The devices are tried at their cached or pinned addresses first, then found with a single
+    Bluetooth inquiry shared by all of them, and opened concurrently (see devices.connectDevices).
+    The request returns at once: the page polls `connectionStatus` for the state of each device.
 
     Args:
         request (HttpRequest): The HTTP request object.
+        station_id (str): ID of the station.
+        wiiboard_wanted (bool): Whether the Wiiboard is requested.
+        sensors_wanted (bool): Whether the sensors are requested.
 
     Returns:
-        HttpResponse: A rendered HTML page with success or error messages based on the sensors connection status.
+        HttpResponse: The index page, with the number of the job to poll, or an error message if
+            the requested devices are already connected.
 
     Raises:
-        None
+        HttpResponseNotFound: If the station is unknown.
+    """
 
-    Note:
-        - This function assumes the presence of global variables or objects: m (Sensors instance).
-        - It starts a new thread (`Sensors_thread`) to attempt sensors connection.
-        - Uses a while loop to wait until both microphone and accelerometer are connected or found.
-        - Displays success or error messages based on the connection status.
+    station = stations.get(station_id)
+    if station is None:
+        return HttpResponseNotFound("Unknown station")
 
-    """
-     
-    if(m.reader.connected == False):
-         
-        m.finish = False
-        Sensors_thread = threading.Thread(target=m.main)
-        Sensors_thread.daemon = True  
-        Sensors_thread.start()
-
-        while m.reader.connected == False and m.find == True:
-            time.sleep(1)
-
-        if m.reader.connected == False:
-            messages.error(request, "Microphone and accelerometer not connected, please try again")
-        else : 
-            messages.success(request, "Microphone and accelerometer connected")
-    
-        m.find = True
-        return render(request,"app/index.html")
-    
-    else:
-        m.find = True
-        messages.error(request,"The sensors are already connected")
-        return render(request,"app/index.html")
+    try:
+        job = station.connect(wiiboard_wanted, sensors_wanted)
+    except DaemonError as e:
+        messages.error(request, str(e))
+        return render(request, "app/index.html")
 
-   
-LEN_GC = 500
-before_gc = True
-measure_gc_after = []
-measure_gc_before = [[0,0] for _ in range(LEN_GC)]
-ind_gc = 0
+    if job is None:
+        if wiiboard_wanted and sensors_wanted:
+            messages.error(request, "The sensors and the wiiboard are already connected")
+        elif wiiboard_wanted:
+            messages.error(request, "The Wiiboard is already connected")
+        else:
+            messages.error(request, "The sensors are already connected")
+        return render(request, "app/index.html")
 
-LEN_QUA = 150
-before_qua = True
-measure_qua_after = []
-measure_qua_before = [[0,0,0,0] for _ in range(LEN_QUA)]
-ind_qua = 0
+    return render(request, "app/index.html", {'connection_job': job})
 
-def get_point_position(X, Y):
+def connectWiiboard(request, station_id=websocket.DEFAULT_STATION):
     """
-    Updates the position of a point and manages lists of positions before and after a gravity center.
-
-    This function updates the position of a point (X, Y) and manages two lists (`measure_gc_before` and `measure_gc_after`)
-    that store positions before and after a gravity center respectively. It uses a global index (`ind_gc`) to track the 
-    current position index in `measure_gc_after`.
+    View function for connecting to the Wiiboard of a station.
 
     Args:
-        X (float): X-coordinate of the point.
-        Y (float): Y-coordinate of the point.
+        request (HttpRequest): The HTTP request object.
+        station_id (str): ID of the station.
 
     Returns:
-        None
-
-    Raises:
-        None
+        HttpResponse: The index page, returned as soon as the connection is started (see start_connection).
+    """
 
-    Note:
-        - This function assumes the presence of global variables or objects: ind_gc, measure_gc_before, measure_gc_after, before_gc.
-        - If `before_gc` is True, it updates `measure_gc_before`.
-        - If `before_gc` is False, it updates `measure_gc_after` and manages the index `ind_gc`.
+    return start_connection(request, station_id, True, False)
 
+def connectSensors(request, station_id=websocket.DEFAULT_STATION):
     """
-    global ind_gc, measure_gc_after, measure_gc_before
-
-    if before_gc : 
-        measure_gc_before.pop(0)
-        measure_gc_before.append([X, Y])
-        ind_gc = 0
-    
-    else :
-        if ind_gc < LEN_GC :
-            measure_gc_after.append([X, Y])
-            ind_gc = ind_gc + 1
-
-def get_Quaternion(q0, q1, q2, q3):
-    """
-    Updates the quaternion values and manages lists of values before and after a quaternion measurement.
-
-    This function updates the quaternion values (q0, q1, q2, q3) and manages two lists (`measure_qua_before` and `measure_qua_after`)
-    that store quaternion values before and after a measurement respectively. It uses a global index (`ind_qua`) to track the 
-    current index in `measure_qua_after`.
+    View function for connecting to the sensors of a station.
 
     Args:
-        q0 (float): Quaternion value.
-        q1 (float): Quaternion value.
-        q2 (float): Quaternion value.
-        q3 (float): Quaternion value.
+        request (HttpRequest): The HTTP request object.
+        station_id (str): ID of the station.
 
     Returns:
-        None
-
-    Raises:
-        None
-
-    Note:
-        - This function assumes the presence of global variables or objects: ind_qua, measure_qua_before, measure_qua_after, before_qua.
-        - If `before_qua` is True, it updates `measure_qua_before`.
-        - If `before_qua` is False, it updates `measure_qua_after` and manages the index `ind_qua`.
-
+        HttpResponse: The index page, returned as soon as the connection is started (see start_connection).
     """
-    global ind_qua, measure_qua_after, measure_qua_before
-
-    if before_qua : 
-        measure_qua_before.pop(0)
-        measure_qua_before.append([q0,q1,q2,q3])
-        ind_qua = 0
 
-    else:
-        if ind_qua < LEN_QUA:
-            measure_qua_after.append([q0,q1,q2,q3])
-            ind_qua = ind_qua +1
+    return start_connection(request, station_id, False, True)
 
-clients = set()
-class WebSocketServer:
+def connectDevices(request, station_id=websocket.DEFAULT_STATION):
     """
-    Class to manage a WebSocket server for communicating with multiple clients concurrently.
-    """
-
-    def __init__(self):
-        """
-        Initializes the attributes of the WebSocketServer class.
+    View function for connecting the Wiiboard and the sensors of a station together.
 
-        Attributes:
-        - quat_ref (list): Reference for quaternions [q0, q1, q2, q3].
-        - slidersValues (list): Values of sliders [sliderSensitivityStabilityValue, sliderSensitivityValue].
-        - centerGravity_ref (list): Reference for center of gravity [Xcalibration, Ycalibration].
-        """
+    Args:
+        request (HttpRequest): The HTTP request object.
+        station_id (str): ID of the station.
 
-        self.quat_ref = [0,0,0,0]
-        self.slidersValues = [10,1]
-        self.centerGravity_ref = [0,0]
+    Returns:
+        HttpResponse: The index page, returned as soon as the connection is started (see start_connection).
+    """
 
-    async def handler(self, websocket, path):
-        """
-        Handles WebSocket connection with a client.
+    return start_connection(request, station_id, True, True)
 
-        Args:
-        - websocket (WebSocketServerProtocol): WebSocket object to communicate with the client.
-        - path (str): WebSocket URL path.
+def connectionStatus(request, job_id, station_id=websocket.DEFAULT_STATION):
+    """
+    View function returning the progress of a connection job.
 
-        Actions:
-        - Adds the client to the global set of connected clients.
-        - Waits for messages from the client, updates quat_ref, slidersValues, and centerGravity_ref
-          from received JSON data.
-        - Handles connection closed exceptions.
+    Args:
+        request (HttpRequest): The HTTP request object.
+        job_id (int): Number of the job, as given to the index page.
+        station_id (str): ID of the station.
 
-        Raises:
-        - websockets.exceptions.ConnectionClosed: If the connection is closed abruptly.
-        """
+    Returns:
+        JsonResponse: The state of each device (pending, discovering, connecting, calibrating,
+            connected or failed), the time spent in it and the time spent in the previous states.
 
-        clients.add(websocket)
-        try:
-            async for message in websocket:
-                latest_value = json.loads(message)  
-                self.quat_ref = [latest_value.get('q0_ref'), latest_value.get('q1_ref'), latest_value.get('q2_ref'), latest_value.get('q3_ref')]
-                self.slidersValues = [latest_value.get('sliderSensitivityStabilityValue'), latest_value.get('sliderSensitivityValue')]
-                self.centerGravity_ref = [latest_value.get('Xcalibration'), latest_value.get('Ycalibration')]
-
-        except websockets.exceptions.ConnectionClosed as e:
-            print(f"Connection closed: {e}")
-        finally:
-            clients.remove(websocket)
-
-    def start_server(self):
-        """
-        Starts the WebSocket server.
-
-        Action:
-        - Sets up and starts the WebSocket server on 'localhost:8765' using websockets.serve.
-        - Uses asyncio.get_event_loop().run_until_complete to start the server and
-          asyncio.get_event_loop().run_forever to keep it running indefinitely.
-        """
-
-        start_server = websockets.serve(self.handler, 'localhost', 8765)
-        asyncio.get_event_loop().run_until_complete(start_server)
-        asyncio.get_event_loop().run_forever()
-
-    async def send_to_all_clients(self, data):
-        """
-        Sends data to all connected clients.
-
-        Args:
-        - data (dict): Dictionary containing data to be sent to clients.
-
-        Action:
-        - Converts the data to JSON format.
-        - Asynchronously sends the message to each client in the clients set.
-        """
-
-        if clients:
-            message = json.dumps(data)
-            await asyncio.wait([client.send(message) for client in clients])
-
-ws_server = WebSocketServer()
-
-def run_websocket_server():
-    """
-    Runs the WebSocket server in a separate thread.
+    Raises:
+        HttpResponseNotFound: If the station is unknown, or the job is unknown or belongs to another station.
     """
-    asyncio.set_event_loop(asyncio.new_event_loop())
-    ws_server.start_server()
-
-websocket_thread = threading.Thread(target=run_websocket_server)
-websocket_thread.daemon = True
-websocket_thread.start()
 
-CoG = 0
-def save_Measure(request):
+    station = stations.get(station_id)
+    if station is None:
+        return HttpResponseNotFound("Unknown station")
+    try:
+        status = station.job_status(job_id)
+    except DaemonError as e:
+        return HttpResponse(str(e), status=503)
+    if status is None:
+        return HttpResponseNotFound("Unknown connection")
+    return JsonResponse(status)
+
+def linkStatus(request, station_id=websocket.DEFAULT_STATION):
     """
-    Continuously collects sensor measurements and saves them to the database when triggered.
+    View function returning the state of the links to the devices of a station.
 
     Args:
-    - request (HttpRequest): The HTTP request object from Django.
-
-    Global Variables Used:
-    - measure_gc_before (list): List to store gravity center measurements before a trigger event.
-    - shot_id (int): ID for each shot measurement.
-    - session_id (int): ID for each session of measurements.
-    - before_gc (bool): Flag indicating if gravity center measurements are before a trigger event.
-    - measure_gc_after (list): List to store gravity center measurements after a trigger event.
-    - measure_qua_after (list): List to store quaternion measurements after a trigger event.
-    - measure_qua_before (list): List to store quaternion measurements before a trigger event.
-    - before_qua (bool): Flag indicating if quaternion measurements are before a trigger event.
-    - CoG (int): Flag indicating the state of the center of gravity.
-    - ws_server (WebSocketServer): Instance of WebSocketServer for managing WebSocket connections.
-
-    Actions:
-    - Continuously loops to collect gravity center and quaternion measurements.
-    - Adjusts measurements based on reference values from WebSocketServer instance.
-    - Triggers a measurement save when m.trigger is True:
-        - Sets CoG to 1.
-        - Increments shot_id and prepares data_gc and data_qua for saving.
-        - Waits until sufficient data is collected in measure_gc_after and measure_qua_after.
-        - Prepares final data_gc and data_qua for database storage.
-        - Resets relevant flags and clears measure_gc_after and measure_qua_after.
-        - Creates and saves a Data object with user, session_id, shot_id, gravity_center, quaternion, and sliders_value.
-        - Prints a message indicating successful data saving.
-    - Sleeps for 0.01 seconds between iterations to control loop frequency.
-
-    Notes:
-    - This function assumes a continuous sensor data acquisition loop with occasional triggers for data saving.
-    - Requires properly initialized and running instances of sensors and WebSocketServer.
-    """
-
-    global measure_gc_before, shot_id, session_id, before_gc, measure_gc_after, measure_qua_after, measure_qua_before, before_qua, CoG
+        request (HttpRequest): The HTTP request object.
+        station_id (str): ID of the station.
 
-    while not stop_measure : 
-        
-        # Adjust measurements based on WebSocketServer reference values
-        get_point_position(w.x - ws_server.centerGravity_ref[0], w.y - ws_server.centerGravity_ref[1])
-        get_Quaternion(m.q0 - ws_server.quat_ref[0], m.q1 - ws_server.quat_ref[1], m.q2 - ws_server.quat_ref[2], m.q3 - ws_server.quat_ref[3])
-        
-        if m.trigger : 
+    Returns:
+        JsonResponse: For the Wiiboard and the sensors, whether the link is down (stale), the
+            number of losses, reconnections and failed attempts, the last error and the total
+            time without link.
 
-            m.trigger = False
-            CoG = 1
-            shot_id = shot_id + 1
+    Raises:
+        HttpResponseNotFound: If the station is unknown.
+    """
 
-            # Copy measurements before trigger
-            data_gc = copy.deepcopy(measure_gc_before)
-            data_qua = copy.deepcopy(measure_qua_before)
+    station = stations.get(station_id)
+    if station is None:
+        return HttpResponseNotFound("Unknown station")
+    try:
+        return JsonResponse(station.link_stats())
+    except DaemonError as e:
+        return HttpResponse(str(e), status=503)
 
-            before_gc = False
-            before_qua = False
+def clientStatus(request, station_id=websocket.DEFAULT_STATION):
+    """
+    View function returning the state of the WebSocket clients of a station.
 
-            # Wait until enough measurements are collected after trigger
-            while (len(measure_gc_after) < LEN_GC or len(measure_qua_after) < LEN_QUA) :
-                get_point_position(w.x - ws_server.centerGravity_ref[0],w.y - ws_server.centerGravity_ref[1])
-                get_Quaternion(m.q0 - ws_server.quat_ref[0], m.q1 -  ws_server.quat_ref[1], m.q2 -  ws_server.quat_ref[2], m.q3 -  ws_server.quat_ref[3])
-                time.sleep(0.01)
+    Args:
+        request (HttpRequest): The HTTP request object.
+        station_id (str): ID of the station.
 
-            # Combine measurements after trigger
-            data_gc = data_gc + measure_gc_after
-            data_qua = data_qua + measure_qua_after
+    Returns:
+        JsonResponse: The statistics of the broadcaster and of the shot writer (queue depth and
+            write latency), and for each client its number, whether it is one of the user's own,
+            the frames sent, dropped and waiting in its queue, and the time its last and slowest
+            frames waited in the queue.
 
-            before_gc = True
-            before_qua = True
+    Raises:
+        HttpResponseNotFound: If the station is unknown.
+    """
 
-            # Clear after-trigger measurement lists
-            measure_gc_after = []
-            measure_qua_after = []
+    station = stations.get(station_id)
+    if station is None:
+        return HttpResponseNotFound("Unknown station")
+    try:
+        writer = station.writer_stats()
+    except DaemonError as e:
+        return HttpResponse(str(e), status=503)
+    clients = [dict(connection.stats(), own=connection.user_id == request.user.pk)
+               for connection in websocket.hub.connections(station.group())]
+    return JsonResponse({'broadcaster': station.broadcaster.stats(), 'shot_writer': writer, 'clients': clients})
+
+def stationStatus(request):
+    """
+    View function listing the stations, with the state of their devices and measurement.
 
-            measurement = Data.objects.create(user=request.user,session_id = session_id, shot_id = shot_id - 1, gravity_center = data_gc, quaternion = data_qua, sliders_value = ws_server.slidersValues)
-            measurement.save()  
-            print("data save")
-        
-        time.sleep(0.01)
+    Args:
+        request (HttpRequest): The HTTP request object.
 
-def update_Measure():
-    """
-    Continuously updates and sends sensor measurements to all connected clients via WebSocket.
-
-    Global Variables Used:
-    - CoG (int): Flag indicating the state of the center of gravity.
-    - stop_measure (bool): Flag to control the loop termination.
-    - w.x (float): Current x-coordinate from the Wiiboard sensor.
-    - w.y (float): Current y-coordinate from the Wiiboard sensor.
-    - m.q0, m.q1, m.q2, m.q3 (float): Quaternion values from the sensor.
-    - session_id (int): ID for each session of measurements.
-    - shot_id (int): ID for each shot measurement.
-    - ws_server (WebSocketServer): Instance of WebSocketServer for managing WebSocket connections.
-
-    Actions:
-    - Continuously loops to gather current sensor measurements.
-    - Prepares a dictionary `data_to_send` containing current sensor data, including x, y, quaternions, CoG,
-      sessionID, and shotID.
-    - Resets CoG to 0 after preparing data for transmission.
-    - Uses asyncio to send `data_to_send` to all connected clients via WebSocketServer's `send_to_all_clients` method.
-    - Sleeps briefly before repeating the loop.
-
-    Notes:
-    - This function assumes a continuous sensor data update loop running in a separate thread.
-    - Requires properly initialized and running instances of sensors and WebSocketServer.
+    Returns:
+        JsonResponse: For each station, whether its Wiiboard and sensors are connected, whether
+            it is measuring, its session, the sequence number and age of the last sample of each
+            device, and its number of WebSocket clients in this process (or the error of the
+            acquisition daemon).
     """
 
-    global CoG
-    while not stop_measure : 
-        data_to_send = {
-                'x': w.x,
-                'y': w.y,
-                'q0': m.q0,
-                'q1': m.q1,
-                'q2': m.q2,
-                'q3': m.q3,
-                'CoG' : CoG,
-                'sessionID' : session_id,
-                'shotID' : shot_id, 
-            }
-        CoG = 0
-        asyncio.run(ws_server.send_to_all_clients(data_to_send))
+    status = {}
+    for station_id, station in stations.items():
+        try:
+            status[station_id] = station.status()
+        except DaemonError as e:
+            status[station_id] = {'error': str(e)}
+        status[station_id]['clients'] = len(websocket.hub.connections(station.group()))
+    return JsonResponse(status)
 
+def handle_message(connection, latest_value):
+    """
+    Passes a message of a WebSocket client to the station it watches.
+    """
 
+    station = stations.get(connection.station)
+    if station is not None:
+        station.handle_message(connection, latest_value)
+
+BROADCAST_RATE = getattr(settings, 'REAL_TIME_BROADCAST_RATE', 60)
+
+# The stations run in this process, or in the acquisition daemon (manage.py acquisition_daemon)
+DAEMON_SOCKET = getattr(settings, 'REAL_TIME_DAEMON_SOCKET', None)
+if DAEMON_SOCKET is None:
+    shot_writer = ShotWriter(getattr(settings, 'REAL_TIME_WRITER_QUEUE', 64))
+    stations = create_stations(shot_writer)
+else:
+    daemon_client = DaemonClient(DAEMON_SOCKET)
+    stations = {station_id: RemoteStation(station_id, daemon_client, getattr(settings, 'REAL_TIME_DAEMON_RING', 'realtime'), BROADCAST_RATE)
+                for station_id in station_options()}
@@ -0,0 +1,325 @@
+"""
+Live telemetry WebSocket, served by the ASGI application of the project (see authentification/asgi.py).
+
+The route runs on the event loop of the ASGI server, next to the HTTP requests, so there is no
+other server, port or thread. A client must be logged in: the handshake is refused unless the
+session cookie sent with it belongs to an authenticated user, and unless it comes from a page of
+the same origin. A client watches the station of its path, "/ws/real_time/<station>/" (the
+default station at "/ws/real_time/"). Each connection joins the group of its station, and the
+broadcaster of a station sends its frames to every connection of its group.
+"""
+
+import asyncio
+import json
+import itertools
+import threading
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlparse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from real_time.scripts.telemetry import FrameEncoder, SUBPROTOCOLS
+
+PATH = "/ws/real_time/"
+DEFAULT_STATION = "default"
+# Frames waiting to be sent to a client: at 60 frames per second, a client more than about 66 ms late loses its oldest frames
+QUEUE_SIZE = 4
+
+# Close codes sent before the handshake is accepted (the client sees a refused handshake)
+CLOSE_UNAUTHENTICATED = 4401
+CLOSE_FORBIDDEN_ORIGIN = 4403
+CLOSE_NOT_FOUND = 4404
+
+def station_group(station):
+    return "station:%s" % station
+
+class Connection:
+    """
+    A WebSocket client connected through the ASGI server.
+
+    The frames of a client are not sent by the broadcaster: they are put in its own bounded
+    queue, and its writer task sends them as fast as the client reads them. A slow client only
+    delays its own frames, and when its queue is full its oldest frame is dropped, as the newest
+    one replaces it on the screen anyway. Must be created on the event loop of the server.
+
+    Attributes:
+    user_id (int): ID of the authenticated user.
+    station (str): Station watched by the client.
+    subprotocol (str or None): Telemetry subprotocol negotiated at the handshake.
+    queue (asyncio.Queue): (time queued, frame) waiting to be sent.
+    sent (int): Number of frames sent.
+    dropped (int): Number of frames dropped because the client was too slow.
+    lag (float): Time the last sent frame waited in the queue, in seconds.
+    max_lag (float): Longest time a frame waited in the queue, in seconds.
+
+    Methods:
+    put(message): Queues a frame without waiting, dropping the oldest one if the queue is full.
+    start(): Starts the writer task.
+    stop(): Stops the writer task.
+    send(message): Sends a frame, binary (bytes) or text (str).
+    stats(): Returns the counters of the client.
+    """
+
+    numbers = itertools.count(1)
+
+    def __init__(self, send, user_id, station, subprotocol, size=QUEUE_SIZE):
+        self.asgi_send = send
+        self.user_id = user_id
+        self.station = station
+        self.subprotocol = subprotocol
+        self.number = next(self.numbers)
+        self.queue = asyncio.Queue(size)
+        self.sent = 0
+        self.dropped = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.writer = None
+
+    def put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((time.monotonic(), message))
+
+    async def write(self):
+        try:
+            while True:
+                queued, message = await self.queue.get()
+                await self.send(message)
+                self.lag = time.monotonic() - queued
+                self.max_lag = max(self.max_lag, self.lag)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("Error sending to WebSocket client %d:" % self.number, e)
+
+    def start(self):
+        self.writer = asyncio.ensure_future(self.write())
+
+    def stop(self):
+        if self.writer is not None:
+            self.writer.cancel()
+            self.writer = None
+
+    async def send(self, message):
+        if isinstance(message, bytes):
+            await self.asgi_send({'type': 'websocket.send', 'bytes': message})
+        else:
+            await self.asgi_send({'type': 'websocket.send', 'text': message})
+
+    def stats(self):
+        """
+        Returns the counters of the client.
+
+        Returns:
+        dict: number, station, subprotocol, sent and dropped frames, pending frames in the queue,
+        and lag and max_lag in seconds.
+        """
+
+        return {
+            'number': self.number,
+            'station': self.station,
+            'subprotocol': self.subprotocol,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'pending': self.queue.qsize(),
+            'lag': self.lag,
+            'max_lag': self.max_lag,
+        }
+
+class TelemetryHub:
+    """
+    The connected WebSocket clients, by group, and the event loop of the ASGI server.
+
+    The loop is only known once the server runs (at its lifespan startup, or when the first
+    client connects): the callbacks registered with when_ready are called with it then.
+
+    Attributes:
+    groups (dict): Connections of each group ("station:<id>").
+    sequences (dict): Sequence number of the last frame sent to each group.
+    loop (asyncio.AbstractEventLoop or None): Event loop of the ASGI server.
+    ready (threading.Event): Set once `loop` is known.
+    stations (set): IDs of the stations a client can watch.
+    on_message (callable or None): Called as on_message(connection, value) for every JSON message of a client.
+
+    Methods:
+    attach(loop): Records the event loop of the server and calls the waiting callbacks.
+    when_ready(callback): Calls callback(loop) once the loop is known.
+    join(connection): Adds a connection to the group of its station.
+    leave(connection): Removes a connection from its group.
+    connections(group): Returns the connections of a group.
+    send(group, data): Encodes a frame once per subprotocol and queues it for every connection of a group.
+    """
+
+    def __init__(self):
+        self.groups = defaultdict(set)
+        self.sequences = defaultdict(int)
+        self.loop = None
+        self.ready = threading.Event()
+        self.callbacks = []
+        self.on_message = None
+        self.stations = {DEFAULT_STATION}
+        self.lock = threading.Lock()
+
+    def attach(self, loop):
+        with self.lock:
+            if self.loop is not None:
+                return
+            self.loop = loop
+            callbacks, self.callbacks = self.callbacks, []
+        self.ready.set()
+        for callback in callbacks:
+            callback(loop)
+
+    def when_ready(self, callback):
+        """
+        Calls callback(loop) once the event loop of the server is known (at once if it is).
+
+        A callback already waiting is not registered twice.
+        """
+
+        with self.lock:
+            if self.loop is None:
+                if callback not in self.callbacks:
+                    self.callbacks.append(callback)
+                return
+        callback(self.loop)
+
+    def join(self, connection):
+        with self.lock:
+            self.groups[station_group(connection.station)].add(connection)
+
+    def leave(self, connection):
+        with self.lock:
+            group = station_group(connection.station)
+            self.groups[group].discard(connection)
+            if not self.groups[group]:
+                del self.groups[group]
+
+    def connections(self, group):
+        """
+        Returns the connections of a group, from any thread.
+        """
+
+        with self.lock:
+            return list(self.groups.get(group, ()))
+
+    async def send(self, group, data):
+        """
+        Queues a frame for every connection of a group, without waiting for any client.
+
+        Args:
+        group (str): The group.
+        data (dict): Frame built by update_Measure, encoded at most once per subprotocol (see FrameEncoder).
+        """
+
+        connections = self.connections(group)
+        if connections:
+            self.sequences[group] += 1
+            encoder = FrameEncoder(data, self.sequences[group])
+            for connection in connections:
+                connection.put(encoder.encode(connection.subprotocol))
+
+hub = TelemetryHub()
+
+def station_of(path):
+    """
+    Returns the station watched by a client from the path of its handshake.
+
+    Returns:
+    str or None: The ID of the station, None if the path is not a telemetry route.
+    """
+
+    if path == PATH:
+        return DEFAULT_STATION
+    if path.startswith(PATH) and path.endswith("/") and len(path) > len(PATH) + 1:
+        station = path[len(PATH):-1]
+        if "/" not in station:
+            return station
+    return None
+
+def header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin1')
+    return None
+
+def same_origin(scope):
+    """
+    Checks that the handshake comes from a page of this site, so that another site cannot open
+    the stream with the cookies of a logged-in user. Clients that are not browsers send no Origin.
+    """
+
+    origin = header(scope, b'origin')
+    if origin is None:
+        return True
+    return urlparse(origin).netloc == header(scope, b'host')
+
+def authenticated_user(scope):
+    """
+    Returns the user of the session cookie sent with the handshake.
+
+    Returns:
+    User or AnonymousUser: The user, anonymous when there is no valid session.
+    """
+
+    cookies = SimpleCookie(header(scope, b'cookie') or "")
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    session = import_module(settings.SESSION_ENGINE).SessionStore(morsel.value if morsel else None)
+    return get_user(SimpleNamespace(session=session))
+
+async def application(scope, receive, send):
+    """
+    ASGI application of the live telemetry route.
+
+    Accepts the handshake of an authenticated client of the same origin on the route of a known
+    station (see station_of), with the first telemetry subprotocol it offers, then passes its JSON messages to `hub.on_message` until it
+    disconnects. Meanwhile, its writer task sends it the frames of its station queued by the broadcaster.
+
+    Args:
+    scope (dict): ASGI scope of the connection, of type "websocket".
+    receive, send (callables): ASGI channels of the connection.
+    """
+
+    hub.attach(asyncio.get_running_loop())
+
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    station = station_of(scope['path'])
+    if station not in hub.stations:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    if not same_origin(scope):
+        await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN_ORIGIN})
+        return
+    user = await sync_to_async(authenticated_user)(scope)
+    if not user.is_authenticated:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHENTICATED})
+        return
+
+    offered = scope.get('subprotocols', [])
+    subprotocol = next((protocol for protocol in SUBPROTOCOLS if protocol in offered), None)
+    await send({'type': 'websocket.accept', 'subprotocol': subprotocol})
+
+    connection = Connection(send, user.pk, station, subprotocol)
+    connection.start()
+    hub.join(connection)
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            if message['type'] == 'websocket.receive' and message.get('text') and hub.on_message is not None:
+                try:
+                    hub.on_message(connection, json.loads(message['text']))
+                except ValueError as e:
+                    print("Invalid message from a WebSocket client:", e)
+    finally:
+        hub.leave(connection)
+        connection.stop()
@@ -0,0 +1,145 @@
+import queue
+from collections import deque
+import threading
+import time
+from django.db import transaction, close_old_connections
+from real_time.models import ShotSummary
+
+class ShotWriter:
+    """
+    Writes the captured shots to the database from a dedicated thread.
+
+    The acquisition thread only puts finished shots in a bounded queue and never waits for
+    the database. The writer thread commits them by batches, in one transaction per batch.
+
+    Attributes:
+    queue (queue.Queue): Shots waiting to be written, as (submit time, Data, trigger index, sample period).
+    batch_size (int): Maximum number of shots committed in one transaction.
+    attempts (int): Number of times a batch is tried before its shots are given up.
+    written (int): Number of shots written.
+    dropped (int): Number of shots lost because the queue was full or the batch kept failing.
+    last_write (float): Duration of the last transaction, in seconds.
+    max_write (float): Longest transaction, in seconds.
+    last_latency (float): Time between the submission and the commit of the last written shot, in seconds.
+    max_latency (float): Longest time between the submission and the commit of a shot, in seconds.
+    latencies (collections.deque): Time between the submission and the commit of the last written shots, in seconds.
+
+    Methods:
+    start(): Starts the writer thread if it is not running.
+    submit(data, trigger_index, sample_period): Queues a shot without blocking.
+    stats(): Returns the queue depth and the write statistics.
+    run(): Loop of the writer thread.
+    """
+
+    def __init__(self, maxsize=64, batch_size=16, attempts=3):
+        self.queue = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.attempts = attempts
+        self.thread = None
+        self.lock = threading.Lock()
+
+        self.written = 0
+        self.dropped = 0
+        self.last_write = 0.0
+        self.max_write = 0.0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.latencies = deque(maxlen=1024)
+
+    def start(self):
+        """
+        Starts the writer thread if it is not running.
+        """
+
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def submit(self, data, trigger_index=None, sample_period=0.01):
+        """
+        Queues a shot without blocking.
+
+        Args:
+        data (Data): The unsaved shot, with its series set.
+        trigger_index (int or None): Index of the gravity center sample at the trigger instant (see ShotSummary.from_data).
+        sample_period (float): Time between two samples of the gravity center, in seconds.
+
+        Returns:
+        bool: True if the shot was queued, False if the queue was full and the shot was dropped.
+        """
+
+        try:
+            self.queue.put_nowait((time.monotonic(), data, trigger_index, sample_period))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print("Shot writer queue full, shot %d dropped" % data.shot_id)
+            return False
+
+    def stats(self):
+        """
+        Returns the queue depth and the write statistics.
+
+        Returns:
+        dict: queue_depth, written, dropped, last_write, max_write, last_latency and max_latency.
+        """
+
+        return {
+            'queue_depth': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'last_write': self.last_write,
+            'max_write': self.max_write,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+        }
+
+    def run(self):
+        """
+        Waits for shots and commits them by batches.
+
+        Each shot is saved with its ShotSummary. A batch that fails (for example because the
+        SQLite file is locked by a page load) is tried again after a short pause.
+        """
+
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for attempt in range(self.attempts):
+                start = time.monotonic()
+                try:
+                    with transaction.atomic():
+                        for submitted, data, trigger_index, sample_period in batch:
+                            data.save()
+                            ShotSummary.from_data(data, trigger_index, sample_period).save()
+                    break
+                except Exception as e:
+                    print("Error writing %d shots (attempt %d):" % (len(batch), attempt + 1), e)
+                    for submitted, data, trigger_index, sample_period in batch:
+                        data.pk = None
+                        data._state.adding = True
+                    close_old_connections()
+                    time.sleep(0.1 * (attempt + 1))
+            else:
+                self.dropped += len(batch)
+                for _ in batch:
+                    self.queue.task_done()
+                continue
+
+            end = time.monotonic()
+            self.written += len(batch)
+            self.last_write = end - start
+            self.max_write = max(self.max_write, self.last_write)
+            self.last_latency = end - batch[-1][0]
+            self.max_latency = max(self.max_latency, end - batch[0][0])
+            self.latencies.extend(end - submitted for submitted, data, trigger_index, sample_period in batch)
+
+            for _ in batch:
+                self.queue.task_done()
+            close_old_connections()
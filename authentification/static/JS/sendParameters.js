@@ -6,9 +6,24 @@
 // Global variables
 var q0=1, q1=0, q2=0, q3=0; //Quaternion components 
 var X = 0, Y = 0, CoG = 0, shotID = -1, sessionID;  // Variables for data storage
+var stale = 0; // STALE_* bits: the link to the device is down and its values are its last known ones
 
-// WebSocket connection setup
-const socket = new WebSocket('ws://localhost:8765');
+// Telemetry subprotocols (see real_time/scripts/telemetry.py)
+const PROTOCOL_BINARY = 'rt.binary.v1';
+const PROTOCOL_JSON = 'rt.json';
+const FRAME_MAGIC = 0x5254, FRAME_VERSION = 1, FRAME_BATCH = 2;
+const FRAME_HEADER_SIZE = 28, SAMPLE_SIZE = 7; // Bytes in the header, values per sample (t, x, y, q0, q1, q2, q3)
+const STALE_WIIBOARD = 1, STALE_SENSORS = 2;
+
+// Functions called with every received sample: listener(t, x, y, q0, q1, q2, q3)
+var sampleListeners = [];
+
+// WebSocket connection setup, on the server of the page (the session cookie authenticates the client),
+// for the station of the page, the server picks the binary format if it supports it
+const STATION = document.body.dataset.station || 'default';
+const WEBSOCKET_URL = (location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws/real_time/' + encodeURIComponent(STATION) + '/';
+const socket = new WebSocket(WEBSOCKET_URL, [PROTOCOL_BINARY, PROTOCOL_JSON]);
+socket.binaryType = 'arraybuffer';
 
 /**
  * Function called when WebSocket connection is successfully established.
@@ -17,7 +32,7 @@ const socket = new WebSocket('ws://localhost:8765');
  */
 socket.onopen = function(event) 
 {
-    console.log('WebSocket is connected.');
+    console.log('WebSocket is connected (' + (socket.protocol || PROTOCOL_JSON) + ').');
 
     // Send data at regular intervals
     setInterval(() => 
@@ -40,24 +55,80 @@ socket.onopen = function(event)
     }, 1000); // Interval: 1 second
 }
 
+/**
+ * Decodes a binary batch frame into an object with the same fields as the JSON frame.
+ * @param {ArrayBuffer} buffer - The received frame.
+ * @returns {Object|null} The decoded frame, or null if the header is not recognised.
+ */
+function decodeFrame(buffer)
+{
+    const view = new DataView(buffer);
+    if (view.getUint16(0, true) != FRAME_MAGIC || view.getUint8(2) != FRAME_VERSION || view.getUint8(3) != FRAME_BATCH)
+    {
+        return null;
+    }
+    const count = view.getUint16(18, true);
+    const t0 = view.getFloat64(20, true);
+    const samples = new Array(count);
+    for (let i = 0, offset = FRAME_HEADER_SIZE; i < count; i++)
+    {
+        const sample = new Array(SAMPLE_SIZE);
+        for (let k = 0; k < SAMPLE_SIZE; k++, offset += 4)
+        {
+            sample[k] = view.getFloat32(offset, true);
+        }
+        sample[0] += t0;
+        samples[i] = sample;
+    }
+    return {
+        seq: view.getUint32(4, true),
+        sessionID: view.getUint32(8, true),
+        shotID: view.getUint32(12, true),
+        CoG: view.getUint8(16),
+        stale: view.getUint8(17),
+        samples: samples,
+    };
+}
+
 /**
  * Function called when a message is received from the WebSocket server.
- * Updates variables with received data.
+ * Each message carries every sample measured since the previous one, sent either as a binary frame or as JSON text.
+ * Passes the samples to the listeners and updates variables with the latest one.
  * @param {MessageEvent} event - The event object containing received data.
  */
 socket.onmessage = function(event) 
 {
-    const receivedData = JSON.parse(event.data);
-    X = receivedData.x; // Update X coordinate 
-    Y = receivedData.y; // Update Y coordinate 
+    const receivedData = (event.data instanceof ArrayBuffer) ? decodeFrame(event.data) : JSON.parse(event.data);
+    if (receivedData === null)
+    {
+        return;
+    }
+    for (const sample of receivedData.samples)
+    {
+        for (const listener of sampleListeners)
+        {
+            listener(...sample);
+        }
+    }
+    if (receivedData.samples.length > 0)
+    {
+        const latest = receivedData.samples[receivedData.samples.length - 1];
+        X = latest[1]; // Update X coordinate 
+        Y = latest[2]; // Update Y coordinate 
+        q0 = latest[3];   // Update quaternion component 0
+        q1 = latest[4];   // Update quaternion component 1
+        q2 = latest[5];   // update quaternion component 2
+        q3 = latest[6];   // Update quarernion component 3
+    }
     if(receivedData.CoG == 1)
     {
         CoG = 1 // Update center of gravity flag
     }
-    q0 = receivedData.q0;   // Update quaternion component 0
-    q1 = receivedData.q1;   // Update quaternion component 1
-    q2 = receivedData.q2;   // update quaternion component 2
-    q3 = receivedData.q3;   // Update quarernion component 3
+    if ((receivedData.stale || 0) != stale)
+    {
+        stale = receivedData.stale || 0; // Update the state of the links
+        console.warn('Wiiboard ' + (stale & STALE_WIIBOARD ? 'reconnecting' : 'live') + ', sensors ' + (stale & STALE_SENSORS ? 'reconnecting' : 'live'));
+    }
     sessionID = receivedData.sessionID; // Update session ID
     shotID = receivedData.shotID; // Update shot ID
 };
@@ -12,7 +12,11 @@
 
 document.addEventListener("DOMContentLoaded", function() 
 {
+    const STABILITY_POINTS = 600;   // Number of samples shown on the chart (about 6 seconds at 100 Hz)
+    const STABILITY_INTERVAL = 0.1; // Stability is expressed as the change of orientation over 100 ms
+
     let previousQuaternion = new Array(4);  // Array to store previous quaternion values. 
+    let previousTime = null;    // Time of the previous sample, in seconds
     var chart1; // Chart.js instance for stability visualisation 
 
     const canvas = document.getElementById('chart1');
@@ -26,9 +30,9 @@ document.addEventListener("DOMContentLoaded", function()
     function initChart() 
     {
 
-        stability = new Array(60); // Array to store stability values
+        stability = new Array(STABILITY_POINTS); // Array to store stability values
         var labels = [];    
-        for (var i = 0; i < 60; i++) 
+        for (var i = 0; i < STABILITY_POINTS; i++) 
         {
             labels.push(i.toString());
             stability[i] = 0;
@@ -44,7 +48,8 @@ document.addEventListener("DOMContentLoaded", function()
                     fill: false,
                     backgroundColor: 'rgba(255, 140, 0, 1)',
                     borderColor: 'rgba(255, 140, 0, 1)',
-                    borderWidth: 1
+                    borderWidth: 1,
+                    pointRadius: 0
                 },
     
             ]
@@ -79,39 +84,64 @@ document.addEventListener("DOMContentLoaded", function()
     }
 
     /**
-     * @brief Calculates the stability change based on quaternion updates.
+     * @brief Calculates the stability change between the previous sample and this one.
+     * 
+     * The change is scaled to STABILITY_INTERVAL so that the value does not depend on the sample rate.
+     * @param {number} t - Time of the sample, in seconds.
+     * @param {number} s0 - Quaternion component 0.
+     * @param {number} s1 - Quaternion component 1.
+     * @param {number} s2 - Quaternion component 2.
+     * @param {number} s3 - Quaternion component 3.
      * @returns {number} Stability change value.
      */
-    function calculateStability() 
+    function calculateStability(t, s0, s1, s2, s3) 
     {
         
-        let dq0 = q0 - previousQuaternion[0];
-        let dq1 = q1 - previousQuaternion[1];
-        let dq2 = q2 - previousQuaternion[2];
-        let dq3 = q3 - previousQuaternion[3];
-
-        previousQuaternion[0] = q0;
-        previousQuaternion[1] = q1;
-        previousQuaternion[2] = q2;
-        previousQuaternion[3] = q3;
+        let dq0 = s0 - previousQuaternion[0];
+        let dq1 = s1 - previousQuaternion[1];
+        let dq2 = s2 - previousQuaternion[2];
+        let dq3 = s3 - previousQuaternion[3];
+        let dt = (previousTime === null) ? 0 : t - previousTime;
+
+        previousQuaternion[0] = s0;
+        previousQuaternion[1] = s1;
+        previousQuaternion[2] = s2;
+        previousQuaternion[3] = s3;
+        previousTime = t;
+
+        if (dt <= 0)
+        {
+            return 0;
+        }
     
         let sumOfSquares = (dq0 * dq0 + dq1 * dq1 + dq2 * dq2 + dq3 * dq3);
     
-        let stabilityChange = Math.sqrt(sumOfSquares) * sliderSensitivityStability.value();
+        let stabilityChange = Math.sqrt(sumOfSquares) * (STABILITY_INTERVAL / dt) * sliderSensitivityStability.value();
     
         return stabilityChange;
     }
 
     /**
-     * @brief Updates the stability chart with the latest stability value.
+     * @brief Adds the stability of a received sample to the chart data.
+     * @param {number} t - Time of the sample, in seconds.
+     * @param {number} x - X coordinate of the center of gravity (unused).
+     * @param {number} y - Y coordinate of the center of gravity (unused).
+     * @param {number} s0 - Quaternion component 0.
+     * @param {number} s1 - Quaternion component 1.
+     * @param {number} s2 - Quaternion component 2.
+     * @param {number} s3 - Quaternion component 3.
      */
-    function updateStability()
+    function addSample(t, x, y, s0, s1, s2, s3)
     {
-        var stabilityValue = calculateStability();
-
         stability.pop();
-        stability.unshift(stabilityValue);
+        stability.unshift(calculateStability(t, s0, s1, s2, s3));
+    }
 
+    /**
+     * @brief Redraws the stability chart with the latest stability values.
+     */
+    function updateStability()
+    {
         chart1.data.datasets[0].data = stability;
        
         chart1.update();
@@ -133,7 +163,10 @@ document.addEventListener("DOMContentLoaded", function()
     // Initialize the stability chart 
     initChart();
 
-    // Update stability periodicaly 
+    // Compute the stability of every received sample
+    sampleListeners.push(addSample);
+
+    // Redraw the chart periodicaly 
     setInterval(updateStability, 100);
 });
 
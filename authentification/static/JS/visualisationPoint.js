@@ -16,12 +16,12 @@ document.addEventListener("DOMContentLoaded", function()
      * @brief Fetches visualization data from the server using AJAX.
      * 
      * Retrieves X_tab, Y_tab, X_total_points, Y_total_points, sessionID, and shotID
-     * from the 'visu_gravityCenter' endpoint.
+     * from the 'visu_gravityCenter' endpoint for the shot of the page.
      */
     function getVisualisationData() 
     {
         $.ajax({
-            url: 'visu_gravityCenter',
+            url: 'visu_gravityCenter?' + shotParameters,
             type: 'GET',
             success: function(data) 
             {
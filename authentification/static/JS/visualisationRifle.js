@@ -12,12 +12,12 @@ document.addEventListener("DOMContentLoaded", function() {
      * @brief Fetches rifle visualization data from the server using AJAX.
      * 
      * Retrieves q0, q1, q2, q3, sliderSensitivityValue, and sliderStabilitySensitivityValue
-     * from the 'visu_Rifle' endpoint.
+     * from the 'visu_Rifle' endpoint for the shot of the page.
      */
     function getVisualisationRifle() 
     {
         $.ajax({
-            url: 'visu_Rifle',
+            url: 'visu_Rifle?' + shotParameters,
             type: 'GET',
             success: function(data) 
             {
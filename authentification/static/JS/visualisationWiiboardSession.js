@@ -305,7 +305,7 @@ var wiiboardSketch = function(p)
     function addTail(ind)
     {
         $.ajax({
-            url: `/data_visualisation/addTail/?ind=${ind}`,
+            url: `/data_visualisation/addTail/?sessionID=${sessionID}&ind=${ind}`,
             type: 'GET',
 
             success: function(data)